@@ -0,0 +1,53 @@
+"""Measure the memory footprint of a parsed test suite.
+
+Run as ``python benchmarks/memory.py [cases]``.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gc
+import sys
+import tracemalloc
+
+from calico.parse import parse_spec
+
+
+CASE = """
+- case_%(n)d:
+    run: ./circle
+    script:
+      - expect: "%%(prompt)s"             # timeout: 1
+      - send: "%(n)d"
+      - expect: 'Area: (\\d+)\\.(\\d*)\\r\\n'  # timeout: 1
+      - expect: _EOF_                    # timeout: 1
+    points: 1
+"""
+
+
+def make_spec(cases):
+    """Generate a specification with the given number of cases."""
+    header = '- _define:\n    vars:\n      prompt: "Enter radius(.*?):\\\\s+"\n'
+    return header + "".join(CASE % {"n": n} for n in range(cases))
+
+
+def main():
+    """Parse a generated suite and report the memory it holds."""
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    content = make_spec(cases)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    runner = parse_spec(content)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    print("cases: %(c)d" % {"c": len(runner)})
+    print("suite: %(k).1f KiB" % {"k": size / 1024})
+    print("per case: %(b)d bytes" % {"b": size // len(runner)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure the per-case overhead of running scripts.
+
+The times are compared with the earlier way of running scripts, which used
+pexpect's fixed delays before every send and when closing the program.
+
+Run as ``python benchmarks/overhead.py [runs]``.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+import time
+
+import pexpect
+
+from calico import GLOBAL_TIMEOUT
+from calico.base import Action, ActionType, expect_output, run_script, with_eof
+
+
+SENDS = 20
+
+
+def run_pexpect(command, script):
+    """Run a script like before, with pexpect's delays before sends and on close."""
+    process = pexpect.spawn(command, timeout=GLOBAL_TIMEOUT)
+    process.setecho(False)
+    pending = b""
+    for action in with_eof(script):
+        if action.type_ == ActionType.SEND:
+            process.sendline(action.data)
+        else:
+            matcher = action.get_matcher({})
+            pending = expect_output(process, matcher, GLOBAL_TIMEOUT, pending=pending)
+    process.close(force=True)
+
+
+def measure(run, command, script, runs):
+    """Get the average time to run a script, in seconds."""
+    start_time = time.time()
+    for _ in range(runs):
+        run(command, script)
+    return (time.time() - start_time) / runs
+
+
+def report(label, command, script, runs):
+    """Print the average times of both ways of running a script."""
+    current = measure(run_script, command, script, runs)
+    earlier = measure(run_pexpect, command, script, runs)
+    print(
+        "%(l)s: %(c).1f ms (pexpect delays: %(e).1f ms)"
+        % {"l": label, "c": 1000 * current, "e": 1000 * earlier}
+    )
+
+
+def main():
+    """Report the average times for a few typical cases."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    report("no script", "true", [], runs)
+
+    script = []
+    for n in range(SENDS):
+        script.append(Action(ActionType.SEND, str(n)))
+        script.append(Action(ActionType.EXPECT, str(n), match="literal"))
+    command = "bash -c 'for i in $(seq %(n)d); do read x; echo -n $x; done'" % {"n": SENDS}
+    report("%(n)d sends" % {"n": SENDS}, command, script, runs)
+
+
+if __name__ == "__main__":
+    main()
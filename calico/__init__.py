@@ -17,6 +17,8 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import os
+import socket
 from distutils.spawn import find_executable
 
 
@@ -25,5 +27,14 @@ __version__ = "1.2.0"  # sig: str
 GLOBAL_TIMEOUT = 2  # sig: int
 """Default timeout for tests, in seconds."""
 
+WALL_TIMEOUT_FACTOR = 10  # sig: int
+"""Ratio of the wall clock limit to the timeout when timing by CPU time."""
+
 SUPPORTS_JAIL = find_executable("fakechroot") is not None  # sig: bool
 """Whether this system supports changing root directory for a process."""
+
+SUPPORTS_AFFINITY = hasattr(os, "sched_setaffinity")  # sig: bool
+"""Whether this system supports pinning processes to CPUs."""
+
+SUPPORTS_ZYGOTE = hasattr(socket.socket, "sendmsg")  # sig: bool
+"""Whether this system supports running programs in warm interpreters."""
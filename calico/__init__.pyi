@@ -2,4 +2,7 @@
 
 __version__ = ...  # type: str
 GLOBAL_TIMEOUT = ...  # type: int
+WALL_TIMEOUT_FACTOR = ...  # type: int
 SUPPORTS_JAIL = ...  # type: bool
+SUPPORTS_AFFINITY = ...  # type: bool
+SUPPORTS_ZYGOTE = ...  # type: bool
@@ -17,22 +17,57 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import errno
+import fcntl
+import hashlib
 import logging
 import os
+import re
+import select
+import signal
 import sys
-from collections import OrderedDict
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
 from enum import Enum
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
 import pexpect
 
-from . import GLOBAL_TIMEOUT, SUPPORTS_JAIL
+from . import (
+    GLOBAL_TIMEOUT,
+    SUPPORTS_AFFINITY,
+    SUPPORTS_JAIL,
+    SUPPORTS_ZYGOTE,
+    WALL_TIMEOUT_FACTOR,
+)
+from .match import Mismatch, compile_matcher, format_digest
+from .metrics import metrics
+from .replay import Recording
+from .transcript import TranscriptLogger, start_transcript, stop_transcript
+from .zygote import Zygote, ZygoteProcess
+
+
+try:
+    from queue import Queue
+except ImportError:  # Python 2
+    from Queue import Queue
 
 
 PY2 = sys.version_info < (3,)  # sig: bool
 
 MAX_LEN = 40
 
-_logger = logging.getLogger("calico")
+READ_SIZE = 65536
+
+TERMINATE_GRACE = 0.1
+
+CPU_POLL_INTERVAL = 0.05
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+_logger = TranscriptLogger(logging.getLogger("calico"))
 
 
 class ActionType(Enum):
@@ -43,25 +78,153 @@ class ActionType(Enum):
 
 
 class Action:
-    """An action in a test script."""
+    """An action in a test script.
+
+    Actions are not modified after they are created
+    so they can be shared between runs.
+    """
+
+    __slots__ = (
+        "type_",
+        "data",
+        "timeout",
+        "match",
+        "tolerance",
+        "branches",
+        "encoding",
+        "matcher",
+        "payload",
+    )
 
-    def __init__(self, type_, data, timeout=-1):
+    def __init__(
+        self,
+        type_,
+        data,
+        timeout=-1,
+        match="regex",
+        tolerance=None,
+        branches=None,
+        encoding="utf-8",
+    ):
         """Initialize this action.
 
-        :sig: (ActionType, str, Optional[int]) -> None
+        An expectation can have several alternatives, and a script
+        for each of them to continue with when it's matched.
+
+        Data without substitutions is encoded here once, so that running
+        the action only deals with bytes.
+
+        :sig:
+            (
+                ActionType,
+                Union[str, Tuple[str, ...]],
+                Optional[int],
+                Optional[str],
+                Optional[Tuple[float, float]],
+                Optional[Tuple[Tuple[Action, ...], ...]],
+                Optional[str]
+            ) -> None
         :param type_: Expect or send.
-        :param data: Data to expect or send.
+        :param data: Data to expect or send, or alternatives to expect.
         :param timeout: Timeout duration, in seconds.
+        :param match: How to match the expected output.
+        :param tolerance: Absolute and relative tolerances for numeric matching.
+        :param branches: Scripts to continue with after each alternative.
+        :param encoding: Encoding of the input and output of the program.
         """
         self.type_ = type_  # sig: ActionType
         """Type of this action, expect or send."""
 
-        self.data = data if data != "_EOF_" else pexpect.EOF  # sig: str
+        self.data = data if data != "_EOF_" else pexpect.EOF  # sig: Union[str, Tuple[str, ...]]
         """Data description of this action, what to expect or send."""
 
         self.timeout = timeout  # sig: Optional[int]
         """Timeout duration of this action."""
 
+        self.match = match  # sig: str
+        """How to match the expected output of this action."""
+
+        self.tolerance = tolerance  # sig: Optional[Tuple[float, float]]
+        """Absolute and relative tolerances for numeric matching."""
+
+        self.branches = branches  # sig: Optional[Tuple[Tuple[Action, ...], ...]]
+        """Scripts to continue with after each alternative of the expected output."""
+
+        self.encoding = encoding  # sig: str
+        """Encoding of the input and output of the program."""
+
+        self.matcher = None  # sig: Optional[EOFMatcher]
+        """Compiled matcher for the expected output, if it has no substitutions."""
+
+        self.payload = None  # sig: Optional[bytes]
+        """Encoded input to send, if it has no substitutions."""
+
+        if self.data is pexpect.EOF:
+            substituted = False
+        elif isinstance(data, tuple):
+            substituted = any("%" in d for d in data)
+        else:
+            substituted = "%" in data
+        if substituted:
+            pass
+        elif type_ == ActionType.EXPECT:
+            self.matcher = compile_matcher(
+                self.data, mode=match, tolerance=tolerance, encoding=encoding
+            )
+        else:
+            self.payload = data.encode(encoding) + b"\n"
+
+    def substitute(self, defs):
+        """Get the data of this action with the variables substituted.
+
+        :sig: (Mapping) -> Union[str, Tuple[str, ...], Type[pexpect.EOF]]
+        :param defs: Variable substitutions.
+        :return: Substituted data, or alternatives, or EOF marker.
+        """
+        if self.data is pexpect.EOF:
+            return self.data
+        if isinstance(self.data, tuple):
+            return tuple(d % defs for d in self.data)
+        return self.data % defs
+
+    def get_matcher(self, defs):
+        """Get a matcher for the expected output of this action.
+
+        :sig: (Mapping) -> EOFMatcher
+        :param defs: Variable substitutions.
+        :return: Matcher with a clear state.
+        """
+        matcher = self.matcher
+        if matcher is None:
+            data = self.substitute(defs)
+            matcher = compile_matcher(
+                data, mode=self.match, tolerance=self.tolerance, encoding=self.encoding
+            )
+        return matcher.start()
+
+    def get_input(self, defs):
+        """Get the encoded input to send for this action.
+
+        :sig: (Mapping) -> bytes
+        :param defs: Variable substitutions.
+        :return: Input, terminated with a newline.
+        """
+        payload = self.payload
+        if payload is None:
+            payload = (self.data % defs).encode(self.encoding) + b"\n"
+        return payload
+
+    def follow(self, matcher):
+        """Get the script to continue with after this action has been matched.
+
+        :sig: (EOFMatcher) -> Tuple[Action, ...]
+        :param matcher: Matcher that has matched the expected output.
+        :return: Actions of the branch of the matched alternative.
+        """
+        if self.branches is None:
+            return ()
+        return self.branches[matcher.index]
+
     def __iter__(self):
         """Get components of this action as a sequence."""
         yield self.type_.value[0]
@@ -69,76 +232,776 @@ class Action:
         yield self.timeout
 
 
-def run_script(command, script, defs=None, g_timeout=None):
+_EOF_ACTION = Action(ActionType.EXPECT, "_EOF_")
+
+
+def expect_output(process, matcher, timeout, pending=b"", cpu_time=False):
+    """Read the output of a process until it satisfies a matcher.
+
+    The output is fed to the matcher in chunks as it arrives,
+    so the matcher decides how much of it needs to be kept.
+
+    If timing by CPU time, the timeout is charged for the CPU time
+    consumed by the processes in the session of the process, so that
+    the load on the system doesn't affect it. Programs that are blocked
+    are still limited by wall clock time, scaled up by a generous factor.
+
+    :sig:
+        (
+            pexpect.spawn,
+            EOFMatcher,
+            Optional[int],
+            Optional[bytes],
+            Optional[bool]
+        ) -> bytes
+    :param process: Process to read the output of.
+    :param matcher: Matcher to check the output with.
+    :param timeout: Timeout duration, in seconds.
+    :param pending: Output that was read but not consumed yet.
+    :param cpu_time: Whether to time by consumed CPU time instead of wall clock.
+    :return: Output that was read but not consumed by the matcher.
+    :raise pexpect.EOF: When the process terminates before a match.
+    :raise pexpect.TIMEOUT: When the timeout expires before a match.
+    :raise Mismatch: When the output can not match anymore.
+    """
+    cpu_time = cpu_time and (timeout is not None)
+    if cpu_time:
+        cpu_start = session_cpu_time(process.pid)
+        end_time = time.time() + timeout * WALL_TIMEOUT_FACTOR
+    else:
+        end_time = time.time() + timeout if timeout is not None else None
+    next_check = time.time() + CPU_POLL_INTERVAL
+    data = pending
+    while True:
+        rest = matcher.feed(data)
+        if rest is not None:
+            return rest
+        # a program that keeps writing never lets a read time out,
+        # so the limits are checked whether or not output arrives
+        now = time.time()
+        if (end_time is not None) and (now >= end_time):
+            raise pexpect.TIMEOUT("Timeout exceeded.")
+        if cpu_time and (now >= next_check):
+            if session_cpu_time(process.pid) - cpu_start >= timeout:
+                raise pexpect.TIMEOUT("Timeout exceeded.")
+            next_check = now + CPU_POLL_INTERVAL
+        remaining = end_time - now if end_time is not None else None
+        try:
+            wait = min(remaining, CPU_POLL_INTERVAL) if cpu_time else remaining
+            data = process.read_nonblocking(READ_SIZE, timeout=wait)
+        except pexpect.EOF:
+            if matcher.eof():
+                return b""
+            raise
+        except pexpect.TIMEOUT:
+            if not cpu_time:
+                raise
+            data = b""
+
+
+def send_input(process, data, timeout):
+    """Write input to a process while draining its output.
+
+    The output is read whenever it's available so that a process
+    that writes a lot before reading its input can't block the writing.
+    If the process exits, the rest of the input is dropped.
+
+    :sig: (Union[pexpect.spawn, ZygoteProcess], bytes, Optional[float]) -> bytes
+    :param process: Process to write the input to.
+    :param data: Input to write.
+    :param timeout: How long to wait without any progress, in seconds.
+    :return: Output that was read while writing.
+    :raise pexpect.TIMEOUT: When the process neither reads nor writes in time.
+    """
+    fd = process.child_fd
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    received = []
+    try:
+        view = memoryview(data)
+        end_time = time.time() + timeout if timeout is not None else None
+        while len(view) > 0:
+            remaining = max(end_time - time.time(), 0) if end_time is not None else None
+            readable, writable, _ = select.select([fd], [fd], [], remaining)
+            if (len(readable) == 0) and (len(writable) == 0):
+                raise pexpect.TIMEOUT("Timeout exceeded.")
+            try:
+                if len(readable) > 0:
+                    chunk = os.read(fd, READ_SIZE)
+                    if len(chunk) == 0:
+                        break
+                    received.append(chunk)
+                if len(writable) > 0:
+                    view = view[os.write(fd, view) :]
+                if end_time is not None:
+                    end_time = time.time() + timeout
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    if (end_time is not None) and (time.time() >= end_time):
+                        raise pexpect.TIMEOUT("Timeout exceeded.")
+                    time.sleep(0.001)
+                    continue
+                if e.errno in (errno.EIO, errno.EPIPE):  # process has exited
+                    break
+                raise
+    finally:
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+    return b"".join(received)
+
+
+def describe_output(output, encoding="utf-8"):
+    """Get a description of received output for log messages.
+
+    :sig: (Optional[bytes], Optional[str]) -> str
+    :param output: Received output, ``None`` for end of file.
+    :param encoding: Encoding of the output.
+    :return: Description of output.
+    """
+    if output is None:
+        return "_EOF_"
+    return '"%(o)s"' % {"o": output.decode(encoding, "replace")}
+
+
+def describe_expected(data):
+    """Get a description of expected output for log messages.
+
+    :sig: (Union[str, Tuple[str, ...], Type[pexpect.EOF]]) -> str
+    :param data: Expected output, alternatives for the output, or EOF marker.
+    :return: Description of expected output.
+    """
+    if data is pexpect.EOF:
+        return "_EOF_"
+    if isinstance(data, tuple):
+        return " | ".join('"%(a)s"' % {"a": d} for d in data)
+    return '"%(a)s"' % {"a": data}
+
+
+class _Received:
+    """Received output that is described only if the log message is formatted."""
+
+    __slots__ = ("output", "encoding")
+
+    def __init__(self, output, encoding):
+        self.output = output
+        self.encoding = encoding
+
+    def __str__(self):
+        return describe_output(self.output, encoding=self.encoding)
+
+
+def has_exited(pid):
+    """Check whether a child process has exited, without reaping it.
+
+    :sig: (int) -> bool
+    :param pid: Id of the child process.
+    :return: Whether the process has exited.
+    """
+    if hasattr(os, "waitid"):
+        return os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    # Python 2 has no waitid, but an exited child stays a zombie until it's reaped
+    try:
+        with open("/proc/%(p)d/stat" % {"p": pid}) as f:
+            stat = f.read()
+    except (IOError, OSError):  # process has been reaped
+        return True
+    return stat[stat.rindex(")") + 2 :].split()[0] == "Z"
+
+
+def wait_exit(pid, timeout):
+    """Wait for a child process to exit, without reaping it.
+
+    The wait is driven by a process file descriptor where the system
+    supports it, so it returns as soon as the process exits.
+
+    :sig: (int, Optional[float]) -> bool
+    :param pid: Id of the child process.
+    :param timeout: How long to wait, in seconds.
+    :return: Whether the process has exited.
+    """
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            pidfd = None
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                return len(poller.poll(timeout * 1000 if timeout is not None else None)) > 0
+            finally:
+                os.close(pidfd)
+
+    end_time = time.time() + timeout if timeout is not None else None
+    delay = 0.001
+    while True:
+        if has_exited(pid):
+            return True
+        if (end_time is not None) and (time.time() >= end_time):
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+
+def session_processes(sid, include_zombies=False):
+    """Find the processes in a session.
+
+    :sig: (int, Optional[bool]) -> List[int]
+    :param sid: Id of the session.
+    :param include_zombies: Whether to include processes that have exited.
+    :return: Ids of the processes in the session.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%(p)s/stat" % {"p": entry}) as f:
+                stat = f.read()
+        except (IOError, OSError):  # process has exited
+            continue
+        fields = stat[stat.rindex(")") + 2 :].split()
+        state, session = fields[0], int(fields[3])
+        if (session == sid) and (include_zombies or (state != "Z")):
+            pids.append(int(entry))
+    return pids
+
+
+def session_cpu_time(sid):
+    """Get the CPU time consumed by the processes in a session.
+
+    This includes the time of the descendants that have exited
+    and have been waited for.
+
+    :sig: (int) -> float
+    :param sid: Id of the session.
+    :return: Consumed CPU time, in seconds.
+    """
+    ticks = 0
+    for pid in session_processes(sid, include_zombies=True):
+        try:
+            with open("/proc/%(p)d/stat" % {"p": pid}) as f:
+                stat = f.read()
+        except (IOError, OSError):  # process has exited
+            continue
+        fields = stat[stat.rindex(")") + 2 :].split()
+        ticks += sum(int(t) for t in fields[11:15])  # utime, stime, cutime, cstime
+    return ticks / CLOCK_TICKS
+
+
+def kill_session(sid):
+    """Kill all processes that are left over in a session.
+
+    A spawned program is the leader of its own session and process group,
+    and the processes it starts stay in them unless they explicitly leave.
+
+    :sig: (int) -> int
+    :param sid: Id of the session, same as the id of its leader.
+    :return: Number of processes that were killed.
+    """
+    try:
+        os.killpg(sid, 0)
+    except OSError:  # no processes left in the group
+        return 0
+    pids = session_processes(sid) if os.path.isdir("/proc") else None
+    for pid in pids if pids is not None else []:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:  # process has exited
+            pass
+    try:
+        os.killpg(sid, signal.SIGKILL)
+    except OSError:
+        pass
+    return len(pids) if pids is not None else 1
+
+
+def close_process(process):
+    """Terminate a process and its descendants, and release its resources.
+
+    This replaces the fixed delays of pexpect with waits that end
+    as soon as the process exits.
+
+    :sig: (Union[pexpect.spawn, ZygoteProcess]) -> int
+    :param process: Process to close.
+    :return: Number of descendant processes that had to be killed.
+    """
+    if isinstance(process, ZygoteProcess):
+        exited = process.wait_exit
+    else:
+        exited = lambda timeout: wait_exit(process.pid, timeout)  # noqa: E731
+    if process.isalive():
+        # the process isn't reaped until it's closed, so its id stays valid,
+        # except for zygote children which can exit at any time
+        try:
+            os.kill(process.pid, signal.SIGHUP)
+            os.kill(process.pid, signal.SIGCONT)
+            if not exited(TERMINATE_GRACE):
+                os.kill(process.pid, signal.SIGINT)
+                if not exited(TERMINATE_GRACE):
+                    os.kill(process.pid, signal.SIGKILL)
+                    exited(None)
+        except OSError:  # process has exited
+            exited(None)
+    if not isinstance(process, ZygoteProcess):
+        process.ptyproc.delayafterclose = 0
+    process.close(force=True)
+    return kill_session(process.pid)
+
+
+def with_eof(script):
+    """Make sure that a script ends by expecting the program to terminate.
+
+    :sig: (Sequence[Action]) -> List[Action]
+    :param script: Script to check.
+    :return: Script that ends with an EOF expectation.
+    """
+    last = script[-1] if len(script) > 0 else None
+    if (last is None) or (last.type_ != ActionType.EXPECT) or (last.data is not pexpect.EOF):
+        return list(script) + [_EOF_ACTION]
+    return list(script)
+
+
+def script_inputs(script, defs):
+    """Get the data of the send actions in a script, including its branches.
+
+    :sig: (Sequence[Action], Mapping) -> List[str]
+    :param script: Script to get the inputs of.
+    :param defs: Variable substitutions.
+    :return: Data of the send actions, in order.
+    """
+    inputs = []
+    for action in script:
+        if action.type_ == ActionType.SEND:
+            inputs.append(action.data % defs)
+        for branch in action.branches or ():
+            inputs.extend(script_inputs(branch, defs))
+    return inputs
+
+
+def _failure(error, matcher, encoding="utf-8"):
+    """Log a failed expectation and get its error message.
+
+    :sig: (Exception, EOFMatcher, Optional[str]) -> str
+    :param error: Error raised while expecting.
+    :param matcher: Matcher of the expectation.
+    :param encoding: Encoding of the output.
+    :return: Error message for the report.
+    """
+    _logger.debug("  received: %s", _Received(matcher.received, encoding))
+    if isinstance(error, pexpect.EOF):
+        message = "Expected output not received."
+    elif isinstance(error, pexpect.TIMEOUT):
+        metrics.inc("timeouts_total")
+        message = "Timeout exceeded."
+    elif error.offset is None:
+        message = "Output differs from expected."
+    else:
+        message = "Output differs from expected at offset %(o)d." % {"o": error.offset}
+    _logger.debug("FAILED: %s", message)
+    return message
+
+
+def finish_recording(process, script, defs, timeout, recording):
+    """Send the rest of the input to a program and record the rest of its output.
+
+    :sig: (Union[pexpect.spawn, ZygoteProcess], List[Action], Mapping, int, Recording) -> bool
+    :param process: Process of the program.
+    :param script: Rest of the script.
+    :param defs: Variable substitutions.
+    :param timeout: How long to wait for the program, in seconds.
+    :param recording: Recording to add the input and output to.
+    :return: Whether the program has terminated in time.
+    """
+    data = b"".join(a.get_input(defs) for a in script if a.type_ == ActionType.SEND)
+    try:
+        if len(data) > 0:
+            recording.add_input(data)
+            recording.add_output(send_input(process, data, timeout))
+        expect_output(process, _EOF_ACTION.get_matcher(defs), timeout)
+    except pexpect.TIMEOUT:
+        return False
+    return True
+
+
+def run_script(
+    command,
+    script,
+    defs=None,
+    g_timeout=None,
+    stats=None,
+    cpu_time=False,
+    cpus=None,
+    zygote=None,
+    cwd=None,
+    env=None,
+    recording=None,
+):
     """Run a command and check whether it follows a script.
 
-    :sig: (str, List[Action], Optional[Mapping], Optional[int]) -> Tuple[int, int, List[str]]
+    When recording, a program that fails an expectation is not stopped
+    right away. It gets the rest of its input so that the recording covers
+    the whole run, in case the expectation gets changed later.
+
+    :sig:
+        (
+            str,
+            List[Action],
+            Optional[Mapping],
+            Optional[int],
+            Optional[MutableMapping[str, Any]],
+            Optional[bool],
+            Optional[Set[int]],
+            Optional[Zygote],
+            Optional[str],
+            Optional[Mapping[str, str]],
+            Optional[Recording]
+        ) -> Tuple[int, int, List[str]]
     :param command: Command to run.
     :param script: Script to check against.
     :param defs: Variable substitutions.
     :param g_timeout: Global timeout value for the spawn class
+    :param stats: Mapping to collect statistics about the run into.
+    :param cpu_time: Whether to time by consumed CPU time instead of wall clock.
+    :param cpus: CPUs to pin the program to.
+    :param zygote: Warm interpreter to run the command in, if it can.
+    :param cwd: Directory to run the command in, the current directory if not given.
+    :param env: Environment of the command, the current environment if not given.
+    :param recording: Recording to fill with the input and output of the program.
     :return: Exit status, signal status, and errors.
     """
     defs = defs if defs is not None else {}
     g_timeout = g_timeout if g_timeout is not None else GLOBAL_TIMEOUT
 
-    process = pexpect.spawn(command, timeout=g_timeout)
+    start_time = time.time()
+    if (zygote is not None) and zygote.handles(command):
+        process = zygote.spawn(command, timeout=g_timeout, cpus=cpus, cwd=cwd, env=env)
+    else:
+        pin = (lambda: os.sched_setaffinity(0, cpus)) if cpus is not None else None
+        process = pexpect.spawn(command, timeout=g_timeout, preexec_fn=pin, cwd=cwd, env=env)
     process.setecho(False)
+    process.delaybeforesend = None
+    if recording is not None:
+        process.logfile_read = recording.output_log()
+    metrics.observe("spawn_seconds", time.time() - start_time)
     errors = []
 
-    last = script[-1] if len(script) > 0 else None
-    if (last is None) or ((last.type_ != ActionType.EXPECT) and (last.data != "_EOF_")):
-        script.append(Action(ActionType.EXPECT, "_EOF_"))
+    script = with_eof(script)
 
-    for action in script:
-        if action.data is not pexpect.EOF:
-            action.data = action.data % defs
+    # descriptions are only built if they are going to be logged
+    debug = _logger.isEnabledFor(logging.DEBUG)
+
+    pending = b""
+    outgoing = []
+    unfinished = None
+    index = 0
+    while index < len(script):
+        action = script[index]
         if action.type_ == ActionType.EXPECT:
+            if len(outgoing) > 0:
+                # consecutive sends are written all at once
+                sent = b"".join(outgoing)
+                if recording is not None:
+                    recording.add_input(sent)
+                try:
+                    drained = send_input(process, sent, g_timeout)
+                except pexpect.TIMEOUT:
+                    _logger.debug("FAILED: Timeout exceeded.")
+                    metrics.inc("timeouts_total")
+                    errors.append("Timeout exceeded.")
+                    break
+                if recording is not None:
+                    recording.add_output(drained)
+                pending += drained
+                outgoing = []
+            timeout = action.timeout if action.timeout != -1 else g_timeout
+            if debug:
+                expected = describe_expected(action.substitute(defs))
+                _logger.debug("  expecting (%ds): %s", timeout, expected)
+            matcher = action.get_matcher(defs)
             try:
-                expecting = (
-                    "_EOF_" if action.data is pexpect.EOF else ('"%(a)s"' % {"a": action.data})
-                )
-                timeout = action.timeout if action.timeout != -1 else g_timeout
-                _logger.debug("  expecting (%ds): %s", timeout, expecting)
-                process.expect(action.data, timeout=action.timeout)
-                output = process.after
-                received = (
-                    "_EOF_" if ".EOF" in repr(output) else ('"%(o)s"' % {"o": output.decode()})
-                )
-                _logger.debug("  received: %s", received)
-            except pexpect.EOF:
-                output = process.before
-                received = (
-                    "_EOF_" if ".EOF" in repr(output) else ('"%(o)s"' % {"o": output.decode()})
+                pending = expect_output(
+                    process, matcher, timeout, pending=pending, cpu_time=cpu_time
                 )
-                _logger.debug('  received: "%s"', received)
-                process.close(force=True)
-                _logger.debug("FAILED: Expected output not received.")
-                errors.append("Expected output not received.")
-                break
-            except pexpect.TIMEOUT:
-                output = process.before
-                received = (
-                    "_EOF_" if ".EOF" in repr(output) else ('"%(o)s"' % {"o": output.decode()})
-                )
-                _logger.debug('  received: "%s"', received)
-                process.close(force=True)
-                _logger.debug("FAILED: Timeout exceeded.")
-                errors.append("Timeout exceeded.")
+                if debug:
+                    received = _Received(matcher.received, action.encoding)
+                    _logger.debug("  received: %s", received)
+            except (pexpect.EOF, pexpect.TIMEOUT, Mismatch) as e:
+                errors.append(_failure(e, matcher, encoding=action.encoding))
+                if isinstance(e, pexpect.EOF):
+                    if recording is not None:
+                        recording.complete = True
+                else:
+                    unfinished = index
                 break
+            script[index + 1 : index + 1] = action.follow(matcher)
         elif action.type_ == ActionType.SEND:
-            _logger.debug('  sending: "%s"', action.data)
-            process.sendline(action.data)
+            if debug:
+                _logger.debug('  sending: "%s"', action.substitute(defs))
+            outgoing.append(action.get_input(defs))
+        index += 1
     else:
-        process.close(force=True)
+        if recording is not None:
+            recording.complete = True
+
+    finished = False
+    if (recording is not None) and (unfinished is not None):
+        rest = script[unfinished + 1 :]
+        finished = finish_recording(process, rest, defs, g_timeout, recording)
+        recording.complete = finished
+
+    leaked = close_process(process)
+    if leaked > 0:
+        _logger.debug("killed %d leftover processes", leaked)
+        metrics.inc("leaked_processes_total", leaked)
+    if stats is not None:
+        stats["leaked"] = leaked
+    if recording is not None:
+        recording.exitstatus = process.exitstatus
+        recording.signalstatus = process.signalstatus
+    if finished:
+        # the program would have been stopped at the failure
+        return None, None, errors
     return process.exitstatus, process.signalstatus, errors
 
 
+def replay_script(recording, script, defs=None, g_timeout=None):
+    """Check a recorded run of a program against a script.
+
+    The recorded output is fed to the expectations in the order it was received.
+    An expectation times out if the output that satisfies it was received
+    later than its timeout after the expectation started in the recorded run.
+
+    :sig:
+        (
+            Recording,
+            List[Action],
+            Optional[Mapping],
+            Optional[int]
+        ) -> Tuple[int, int, List[str]]
+    :param recording: Recording of a run that sent the same input as the script.
+    :param script: Script to check against.
+    :param defs: Variable substitutions.
+    :param g_timeout: Global timeout value for the expectations.
+    :return: Exit status, signal status, and errors.
+    """
+    defs = defs if defs is not None else {}
+    g_timeout = g_timeout if g_timeout is not None else GLOBAL_TIMEOUT
+
+    outputs = [(t, d) for t, is_output, d in recording.events if is_output]
+    input_ends, input_times = [], []
+    for t, is_output, d in recording.events:
+        if not is_output:
+            input_ends.append((input_ends[-1] if len(input_ends) > 0 else 0) + len(d))
+            input_times.append(t)
+
+    errors = []
+    killed = False
+    position = 0
+    pending = b""
+    clock = 0.0
+    sent = 0
+    script = with_eof(script)
+    debug = _logger.isEnabledFor(logging.DEBUG)
+    index = 0
+    while index < len(script):
+        action = script[index]
+        if action.type_ == ActionType.EXPECT:
+            # the expectation starts when its input has been sent,
+            # or at the start of the run if nothing has been sent yet
+            sent_index = bisect_left(input_ends, sent)
+            if (sent > 0) and (sent_index < len(input_times)):
+                clock = max(clock, input_times[sent_index])
+            timeout = action.timeout if action.timeout != -1 else g_timeout
+            if debug:
+                expected = describe_expected(action.substitute(defs))
+                _logger.debug("  expecting (%ds): %s", timeout, expected)
+            matcher = action.get_matcher(defs)
+            start, chunk_time, chunk = clock, clock, pending
+            try:
+                while True:
+                    if (timeout is not None) and (chunk_time - start > timeout):
+                        raise pexpect.TIMEOUT("Timeout exceeded.")
+                    rest = matcher.feed(chunk)
+                    if rest is not None:
+                        pending, clock = rest, chunk_time
+                        break
+                    if position == len(outputs):
+                        if not matcher.eof():
+                            raise pexpect.EOF("End of recorded output.")
+                        pending, clock = b"", chunk_time
+                        break
+                    chunk_time, chunk = outputs[position]
+                    position += 1
+                if debug:
+                    received = _Received(matcher.received, action.encoding)
+                    _logger.debug("  received: %s", received)
+            except (pexpect.EOF, pexpect.TIMEOUT, Mismatch) as e:
+                errors.append(_failure(e, matcher, encoding=action.encoding))
+                killed = not isinstance(e, pexpect.EOF)
+                break
+            script[index + 1 : index + 1] = action.follow(matcher)
+        elif action.type_ == ActionType.SEND:
+            if debug:
+                _logger.debug('  sending: "%s"', action.substitute(defs))
+            sent += len(action.get_input(defs))
+        index += 1
+
+    if killed:
+        # the program would have been stopped at the failure
+        return None, None, errors
+    return recording.exitstatus, recording.signalstatus, errors
+
+
+def output_digest(command, data=b"", g_timeout=None, cwd=None, algorithm="sha256"):
+    """Run a command and get the digest of its output for a digest expectation.
+
+    The program is run in a terminal like in test cases, so that the digest
+    covers the same bytes, and its output is hashed as it arrives.
+
+    :sig: (str, Optional[bytes], Optional[int], Optional[str], Optional[str]) -> str
+    :param command: Command to run.
+    :param data: Input to send to the program.
+    :param g_timeout: How long to wait for output, in seconds.
+    :param cwd: Directory to run the command in, the current directory if not given.
+    :param algorithm: Name of the hash algorithm.
+    :return: Expected data for a digest expectation.
+    :raise pexpect.TIMEOUT: When the program doesn't terminate in time.
+    """
+    g_timeout = g_timeout if g_timeout is not None else GLOBAL_TIMEOUT
+    env = dict(os.environ)
+    env["TERM"] = "dumb"
+    process = pexpect.spawn(command, timeout=g_timeout, cwd=cwd, env=env)
+    process.setecho(False)
+    process.delaybeforesend = None
+    digest = hashlib.new(algorithm)
+    length = 0
+    try:
+        output = send_input(process, data, g_timeout) if len(data) > 0 else b""
+        while True:
+            digest.update(output)
+            length += len(output)
+            output = process.read_nonblocking(READ_SIZE, timeout=g_timeout)
+    except pexpect.EOF:
+        pass
+    finally:
+        close_process(process)
+    return format_digest(algorithm, digest.hexdigest(), length)
+
+
+def cpu_slots(jobs):
+    """Divide the available CPUs into slots for running cases concurrently.
+
+    Every slot gets a separate share of the CPUs if there are enough of them,
+    otherwise slots share CPUs in turn.
+
+    :sig: (int) -> List[Optional[Set[int]]]
+    :param jobs: Number of slots.
+    :return: CPUs of each slot, ``None`` if pinning is not supported.
+    """
+    if not SUPPORTS_AFFINITY:
+        return [None] * jobs
+    cpus = sorted(os.sched_getaffinity(0))
+    if jobs >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(jobs)]
+    return [set(cpus[i * len(cpus) // jobs : (i + 1) * len(cpus) // jobs]) for i in range(jobs)]
+
+
+def group_cases(tests):
+    """Group consecutive cases that can run concurrently.
+
+    Only stages named as cases can run alongside each other. A blocker case
+    ends its group since the following cases depend on its outcome.
+
+    :sig: (Iterable[TestCase]) -> Iterator[List[TestCase]]
+    :param tests: Tests to run, in order.
+    :return: Tests in each group.
+    """
+    group = []
+    for test in tests:
+        concurrent = test.name.startswith("case_")
+        if (len(group) > 0) and (not concurrent):
+            yield group
+            group = []
+        group.append(test)
+        if (not concurrent) or test.blocker:
+            yield group
+            group = []
+    if len(group) > 0:
+        yield group
+
+
+def expand_cases(cases, names=None):
+    """Expand tables into the cases of their rows.
+
+    :sig: (Iterable[Union[TestCase, CaseTable]], Optional[List[str]]) -> Iterator[TestCase]
+    :param cases: Cases and tables of cases.
+    :param names: Names of cases to get, all of them if not given.
+    :return: Test cases, in order.
+    """
+    for case in cases:
+        selected = (names is None) or (case.name in names)
+        if isinstance(case, CaseTable):
+            for row_case in case:
+                if selected or (row_case.name in names):
+                    yield row_case
+        elif selected:
+            yield case
+
+
+_PLACEHOLDER = re.compile(
+    r"%\((?P<name>[^)]*)\)(?P<spec>[-#0 +]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])"
+)
+
+
+def substitute_columns(text, values):
+    """Substitute the columns of a table row into a text.
+
+    Only the placeholders of the columns are replaced,
+    any other percent signs are left as they are.
+
+    :sig: (str, Mapping[str, Any]) -> str
+    :param text: Text to substitute the columns into.
+    :param values: Values of the columns.
+    :return: Substituted text.
+    """
+
+    def substitute(match):
+        name = match.group("name")
+        if name not in values:
+            return match.group(0)
+        return ("%" + match.group("spec")) % (values[name],)
+
+    return _PLACEHOLDER.sub(substitute, text)
+
+
 class TestCase:
     """A case in a test suite."""
 
+    __slots__ = (
+        "name",
+        "command",
+        "script",
+        "timeout",
+        "exits",
+        "points",
+        "blocker",
+        "visible",
+        "smoke",
+        "defs",
+    )
+
     def __init__(
-        self, name, command, timeout=-1, exits=0, points=None, blocker=False, visible=True
+        self,
+        name,
+        command,
+        timeout=-1,
+        exits=0,
+        points=None,
+        blocker=False,
+        visible=True,
+        smoke=False,
+        script=(),
+        defs=None,
     ):
         """Initialize this test case.
 
@@ -150,7 +1013,10 @@ class TestCase:
                 Optional[int],
                 Optional[Union[int, float]],
                 Optional[bool],
-                Optional[bool]
+                Optional[bool],
+                Optional[bool],
+                Optional[Sequence[Action]],
+                Optional[Mapping[str, Any]]
             ) -> None
         :param name: Name of the case.
         :param command: Command to run.
@@ -159,6 +1025,9 @@ class TestCase:
         :param points: Contribution to overall points.
         :param blocker: Whether failure blocks subsequent cases.
         :param visible: Whether the test will be visible during the run.
+        :param smoke: Whether the test belongs to the quick first tier of triage.
+        :param script: Sequence of actions to run.
+        :param defs: Variable substitutions specific to this case.
         """
         self.name = name  # sig: str
         """Name of this test case."""
@@ -166,7 +1035,7 @@ class TestCase:
         self.command = command  # sig: str
         """Command to run in this test case."""
 
-        self.script = []  # sig: List[Action]
+        self.script = tuple(script)  # sig: Tuple[Action, ...]
         """Sequence of actions to run in this test case."""
 
         self.timeout = timeout  # sig: Optional[int]
@@ -184,49 +1053,259 @@ class TestCase:
         self.visible = visible  # sig: bool
         """Whether this test will be visible during the run or not."""
 
+        self.smoke = smoke  # sig: bool
+        """Whether this test belongs to the quick first tier of triage or not."""
+
+        self.defs = defs  # sig: Optional[Mapping[str, Any]]
+        """Variable substitutions specific to this case, also applied to its command."""
+
     def add_action(self, action):
         """Append an action to the script of this test case.
 
         :sig: (Action) -> None
         :param action: Action to append to the script.
         """
-        self.script.append(action)
+        self.script += (action,)
+
+    @property
+    def interactive(self):
+        """Whether this test sends input or expects anything but termination.
+
+        :sig: () -> bool
+        """
+        return any(
+            (a.type_ == ActionType.SEND) or (a.data is not pexpect.EOF) for a in self.script
+        )
 
-    def run(self, defs=None, jailed=False, g_timeout=None):
+    def run(
+        self,
+        defs=None,
+        jailed=False,
+        g_timeout=None,
+        cpu_time=False,
+        cpus=None,
+        zygote=None,
+        transcripts=None,
+        cwd=None,
+        env=None,
+        recordings=None,
+        replay=False,
+    ):
         """Run this test and produce a report.
 
+        When replaying, the test is checked against its recording
+        if the recorded run used the same command and input.
+        Otherwise, the program is run and recorded again. Tests that
+        aren't interactive, like build steps, are always run since
+        the later tests can depend on their side effects.
+
         :sig:
             (
                 Optional[Mapping],
                 Optional[bool],
-                Optional[int]
+                Optional[int],
+                Optional[bool],
+                Optional[Set[int]],
+                Optional[Zygote],
+                Optional[str],
+                Optional[str],
+                Optional[Mapping[str, str]],
+                Optional[str],
+                Optional[bool]
             ) -> Mapping[str, Union[str, List[str]]]
         :param defs: Variable substitutions.
         :param jailed: Whether to jail the command to the current directory.
         :param g_timeout: Global timeout for all expects in the test
+        :param cpu_time: Whether to time by consumed CPU time instead of wall clock.
+        :param cpus: CPUs to pin the program to.
+        :param zygote: Warm interpreter to run the command in, if it can.
+        :param transcripts: Directory to write the transcript into if the test fails.
+        :param cwd: Directory to run the command in, the current directory if not given.
+        :param env: Environment of the command, the current environment if not given.
+        :param recordings: Directory to keep the recording of the run in.
+        :param replay: Whether to check against the recording instead of running.
         :return: Result report of the test.
         """
         report = {"errors": []}
+        start_time = time.time()
+        metrics.inc("cases_running")
 
-        jail_prefix = ("fakechroot chroot %(d)s " % {"d": os.getcwd()}) if jailed else ""
-        command = "%(j)s%(c)s" % {"j": jail_prefix, "c": self.command}
-        _logger.debug("running command: %s", command)
+        run_command = self.command
+        if self.defs is not None:
+            defs = dict(defs) if defs is not None else {}
+            defs.update(self.defs)
+            run_command = substitute_columns(self.command, self.defs)
 
-        exit_status, signal_status, errors = run_script(
-            self.command, self.script, defs=defs, g_timeout=g_timeout
-        )
+        jail_dir = cwd if cwd is not None else os.getcwd()
+        jail_prefix = ("fakechroot chroot %(d)s " % {"d": jail_dir}) if jailed else ""
+        command = "%(j)s%(c)s" % {"j": jail_prefix, "c": run_command}
+
+        recording = replayed = None
+        if recordings is not None:
+            recording_path = os.path.join(recordings, self.name + ".rec.gz")
+            inputs = script_inputs(self.script, defs if defs is not None else {})
+            if replay and self.interactive and os.path.exists(recording_path):
+                replayed = Recording.load(recording_path)
+                if (replayed is not None) and (not replayed.replayable(run_command, inputs)):
+                    replayed = None
+            if replayed is None:
+                recording = Recording(run_command, inputs)
+
+        stats = {}
+        transcript = start_transcript() if transcripts is not None else None
+        try:
+            _logger.debug("running command: %s", command)
+            if replayed is not None:
+                _logger.debug("replaying recorded run")
+                metrics.inc("cases_replayed_total")
+                stats["leaked"] = 0
+                exit_status, signal_status, errors = replay_script(
+                    replayed, self.script, defs=defs, g_timeout=g_timeout
+                )
+            else:
+                exit_status, signal_status, errors = run_script(
+                    run_command,
+                    self.script,
+                    defs=defs,
+                    g_timeout=g_timeout,
+                    stats=stats,
+                    cpu_time=cpu_time,
+                    cpus=cpus,
+                    zygote=zygote,
+                    cwd=cwd,
+                    env=env,
+                    recording=recording,
+                )
+
+            if exit_status is not None:
+                _logger.debug("exit status: %d (expected %d)", exit_status, self.exits)
+            if signal_status is not None:
+                _logger.debug("program terminated with signal %d", signal_status)
+            if exit_status != self.exits:
+                _logger.debug("FAILED: Incorrect exit status.")
+                errors.append("Incorrect exit status.")
+        finally:
+            metrics.inc("cases_running", -1)
+            if transcript is not None:
+                stop_transcript()
         report["errors"].extend(errors)
+        report["leaked"] = stats["leaked"]
+        if recording is not None:
+            recording.save(recording_path)
+        if recordings is not None:
+            report["replayed"] = replayed is not None
 
-        if exit_status is not None:
-            _logger.debug("exit status: %d (expected %d)", exit_status, self.exits)
-        if signal_status is not None:
-            _logger.debug("program terminated with signal %d", signal_status)
-        if exit_status != self.exits:
-            report["errors"].append("Incorrect exit status.")
+        report["duration"] = time.time() - start_time
+        metrics.inc("cases_total")
+        passed = len(report["errors"]) == 0
+        metrics.inc("cases_passed_total" if passed else "cases_failed_total")
+        metrics.observe("case_duration_seconds", report["duration"])
 
+        if (transcript is not None) and (not passed):
+            report["transcript"] = os.path.join(transcripts, self.name + ".log.gz")
+            transcript.write(report["transcript"])
         return report
 
 
+class CaseTable:
+    """A case that is repeated for every row of a table of substitutions.
+
+    The cases of the rows are created only when needed,
+    and they all share the script of the template case.
+    """
+
+    __slots__ = ("template", "columns", "rows")
+
+    def __init__(self, template, columns, rows):
+        """Initialize this table.
+
+        :sig: (TestCase, Sequence[str], Sequence[Sequence[Any]]) -> None
+        :param template: Case to repeat, the names of rows are derived from its name.
+        :param columns: Names of substitution variables.
+        :param rows: Values of variables for each row.
+        """
+        self.template = template  # sig: TestCase
+        """Case to repeat for every row."""
+
+        self.columns = tuple(columns)  # sig: Tuple[str, ...]
+        """Names of substitution variables."""
+
+        self.rows = rows  # sig: Sequence[Sequence[Any]]
+        """Values of variables for each row."""
+
+    @property
+    def name(self):
+        """Name of this table, same as its template."""
+        return self.template.name
+
+    @property
+    def points(self):
+        """Total points of the rows in this table."""
+        points = self.template.points
+        return points * len(self.rows) if points is not None else None
+
+    @property
+    def smoke(self):
+        """Whether the rows of this table belong to the quick first tier of triage."""
+        return self.template.smoke
+
+    def __len__(self):
+        """Get the number of rows."""
+        return len(self.rows)
+
+    def case(self, index):
+        """Get the case of a row.
+
+        :sig: (int) -> TestCase
+        :param index: Number of the row, starting from 1.
+        :return: Case for the row.
+        """
+        template = self.template
+        return TestCase(
+            "%(n)s_%(i)d" % {"n": template.name, "i": index},
+            template.command,
+            timeout=template.timeout,
+            exits=template.exits,
+            points=template.points,
+            blocker=template.blocker,
+            visible=template.visible,
+            smoke=template.smoke,
+            script=template.script,
+            defs=dict(zip(self.columns, self.rows[index - 1])),
+        )
+
+    def __iter__(self):
+        """Get the cases of all rows."""
+        for index in range(1, len(self.rows) + 1):
+            yield self.case(index)
+
+
+class Config:
+    """Suite-wide settings of a test suite."""
+
+    __slots__ = ("vars", "encoding", "zygote", "preload", "extras")
+
+    def __init__(self):
+        """Initialize these settings.
+
+        :sig: () -> None
+        """
+        self.vars = {}  # sig: Mapping[str, str]
+        """Variable substitutions for the scripts."""
+
+        self.encoding = "utf-8"  # sig: str
+        """Encoding of the input and output of the programs."""
+
+        self.zygote = None  # sig: Optional[str]
+        """Interpreter to keep warm for running the programs."""
+
+        self.preload = []  # sig: List[str]
+        """Modules to import into the warm interpreter."""
+
+        self.extras = OrderedDict()  # sig: Mapping[str, Any]
+        """Unrecognized settings, keyed by section and setting name."""
+
+
 class Calico(OrderedDict):
     """A suite containing a collection of ordered test cases."""
 
@@ -243,11 +1322,14 @@ class Calico(OrderedDict):
         self.points = 0  # sig: Union[int, float]
         """Total points in this test suite."""
 
+        self.config = Config()  # sig: Config
+        """Suite-wide settings of this test suite."""
+
     def add_case(self, case):
         """Add a test case to this suite.
 
-        :sig: (TestCase) -> None
-        :param case: Test case to add.
+        :sig: (Union[TestCase, CaseTable]) -> None
+        :param case: Test case or table of cases to add.
         """
         if PY2:
             OrderedDict.__setitem__(self, case.name, case)
@@ -255,47 +1337,235 @@ class Calico(OrderedDict):
             super().__setitem__(case.name, case)
         self.points += case.points if case.points is not None else 0
 
-    def run(self, tests=None, quiet=False, g_timeout=None):
+    def get_case(self, name):
+        """Get a test case by name, including the cases of table rows.
+
+        :sig: (str) -> Optional[Union[TestCase, CaseTable]]
+        :param name: Name of the case.
+        :return: Case or table with the given name, ``None`` if there is none.
+        """
+        case = self.get(name)
+        if case is None:
+            table_name, _, index = name.rpartition("_")
+            table = self.get(table_name)
+            if isinstance(table, CaseTable) and index.isdigit():
+                if 1 <= int(index) <= len(table):
+                    case = table.case(int(index))
+        return case
+
+    def cases(self, names=None):
+        """Get the test cases to run, expanding tables into their rows.
+
+        :sig: (Optional[List[str]]) -> Iterator[TestCase]
+        :param names: Names of cases to get, all of them if not given.
+        :return: Test cases, in order.
+        """
+        for name in names if names is not None else self.keys():
+            case = self.get_case(name)
+            if isinstance(case, CaseTable):
+                for row_case in case:
+                    yield row_case
+            else:
+                yield case
+
+    def run(
+        self,
+        tests=None,
+        quiet=False,
+        g_timeout=None,
+        cpu_time=False,
+        jobs=1,
+        transcripts=None,
+        cwd=None,
+        env=None,
+        threshold=None,
+        recordings=None,
+        replay=False,
+        cases=None,
+    ):
         """Run this test suite.
 
-        :sig: (Optional[bool], Optional[List[str]], Optional[int]) -> Mapping[str, Any]
+        Consecutive cases can be run concurrently, each of them pinned
+        to its own share of the CPUs so that they don't disturb each other.
+        Progress messages are still printed in order.
+
+        The working directory and the environment are given to every
+        spawned program, so neither is changed for the calling process
+        and several suites can be run from different threads at once.
+
+        If a threshold is given, the cases with points are skipped as soon as
+        the remaining cases can no longer change whether the earned points
+        reach it. The stages without points, like cleaning up, are still run.
+
+        If a directory for recordings is given, the interactions of the cases
+        are recorded there. When replaying, the cases whose command and input
+        haven't changed are checked against their recordings without running.
+
+        If cases are given, they are run instead of the ones in this suite,
+        as they are produced. This way, a specification can still be parsed
+        while its first cases are running. Since the points of the cases
+        that are not yet produced are not known, a threshold can only
+        be decided by reaching it.
+
+        :sig:
+            (
+                Optional[bool],
+                Optional[List[str]],
+                Optional[int],
+                Optional[bool],
+                Optional[int],
+                Optional[str],
+                Optional[str],
+                Optional[Mapping[str, str]],
+                Optional[Union[int, float]],
+                Optional[str],
+                Optional[bool],
+                Optional[Iterable[Union[TestCase, CaseTable]]]
+            ) -> Mapping[str, Any]
         :param tests: Tests to include in the run.
         :param quiet: Whether to suppress progress messages.
         :param g_timeout: Global timeout value for the all tests
+        :param cpu_time: Whether to time by consumed CPU time instead of wall clock.
+        :param jobs: Number of cases to run concurrently.
+        :param transcripts: Directory to write the transcripts of failed cases into.
+        :param cwd: Directory to run the programs in, the current directory if not given.
+        :param env: Environment of the programs, the current environment if not given.
+        :param threshold: Points that decide the result of the run.
+        :param recordings: Directory to keep the recordings of the cases in.
+        :param replay: Whether to check cases against their recordings when possible.
+        :param cases: Cases to run instead of the ones in this suite.
         :return: A report containing the results.
         """
         report = OrderedDict()
         earned_points = 0
 
-        os.environ["TERM"] = "dumb"  # disable color output in terminal
+        if cases is not None:
+            remaining_points = None
+        elif tests is None:
+            remaining_points = self.points
+        else:
+            selected = [self.get_case(name) for name in tests]
+            remaining_points = sum(
+                c.points for c in selected if (c is not None) and (c.points is not None)
+            )
 
-        test_names = tests if tests is not None else [n for n in self.keys() if n[0] != "_"]
-        for test_name in test_names:
-            test = self.get(test_name)
+        def is_decided():
+            if threshold is None:
+                return False
+            reached = earned_points >= threshold
+            if remaining_points is None:
+                return reached
+            unreachable = earned_points + remaining_points < threshold
+            return reached or unreachable
 
-            _logger.debug("starting test %s", test_name)
-            if (not quiet) and test.visible:
-                dots = "." * (MAX_LEN - len(test_name) + 1)
-                print("%(t)s %(d)s" % {"t": test_name, "d": dots}, end=" ")
+        cwd = os.path.abspath(cwd) if cwd is not None else os.getcwd()
+        env = dict(env if env is not None else os.environ)
+        env["TERM"] = "dumb"  # disable color output in terminal
 
-            jailed = SUPPORTS_JAIL and test_name.startswith("case_")
-            report[test_name] = test.run(
-                defs=self.get("_define_vars"), jailed=jailed, g_timeout=g_timeout
-            )
-            passed = len(report[test_name]["errors"]) == 0
+        slots = Queue()
+        for cpus in cpu_slots(jobs) if jobs > 1 else [None]:
+            slots.put(cpus)
 
-            if test.points is None:
-                if (not quiet) and test.visible:
-                    print("PASSED" if passed else "FAILED")
+        zygote = None
+        if self.config.zygote is not None:
+            if SUPPORTS_ZYGOTE:
+                zygote = Zygote(self.config.zygote, preload=self.config.preload)
+                zygote.start()
             else:
-                report[test_name]["points"] = test.points if passed else 0
-                earned_points += report[test_name]["points"]
-                if (not quiet) and test.visible:
-                    scored = report[test_name]["points"]
-                    print("%(s)s / %(p)s" % {"s": scored, "p": test.points})
+                _logger.debug("warm interpreters are not supported, starting programs cold")
 
-            if test.blocker and (not passed):
-                break
+        def run_test(test):
+            cpus = slots.get()
+            try:
+                _logger.debug("starting test %s", test.name)
+                jailed = SUPPORTS_JAIL and test.name.startswith("case_")
+                return test.run(
+                    defs=self.config.vars,
+                    jailed=jailed,
+                    g_timeout=g_timeout,
+                    cpu_time=cpu_time,
+                    cpus=cpus,
+                    zygote=zygote,
+                    transcripts=transcripts,
+                    cwd=cwd,
+                    env=env,
+                    recordings=recordings,
+                    replay=replay,
+                )
+            finally:
+                slots.put(cpus)
+
+        if cases is not None:
+            to_run = expand_cases(cases, tests)
+        else:
+            to_run = self.cases(tests)
+
+        def needed(test):
+            # once the result is decided, only the stages without points,
+            # like cleaning up, are still run
+            return (test.points is None) or (not is_decided())
+
+        def run_group(group):
+            if pool is None:
+                for test in group:
+                    if needed(test):
+                        yield test, partial(run_test, test)
+                return
+            # tests are submitted only a few at a time,
+            # so that they are not started after the result is decided
+            submitted = deque()
+            upcoming = iter(group)
+            while True:
+                while len(submitted) < jobs:
+                    test = next(upcoming, None)
+                    if test is None:
+                        break
+                    if needed(test):
+                        submitted.append((test, pool.apply_async(run_test, (test,))))
+                if len(submitted) == 0:
+                    return
+                test, result = submitted.popleft()
+                if needed(test):
+                    yield test, result.get
+                else:
+                    _logger.debug("result decided, discarding test %s", test.name)
+
+        pool = ThreadPool(jobs) if jobs > 1 else None
+        try:
+            for group in group_cases(to_run):
+                blocked = False
+                for test, get_result in run_group(group):
+                    test_name = test.name
+
+                    if (not quiet) and test.visible:
+                        dots = "." * (MAX_LEN - len(test_name) + 1)
+                        print("%(t)s %(d)s" % {"t": test_name, "d": dots}, end=" ")
+
+                    report[test_name] = get_result()
+                    passed = len(report[test_name]["errors"]) == 0
+
+                    if test.points is None:
+                        if (not quiet) and test.visible:
+                            print("PASSED" if passed else "FAILED")
+                    else:
+                        report[test_name]["points"] = test.points if passed else 0
+                        earned_points += report[test_name]["points"]
+                        if remaining_points is not None:
+                            remaining_points -= test.points
+                        if (not quiet) and test.visible:
+                            scored = report[test_name]["points"]
+                            print("%(s)s / %(p)s" % {"s": scored, "p": test.points})
+
+                    blocked = test.blocker and (not passed)
+
+                if blocked:
+                    break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            if zygote is not None:
+                zygote.stop()
 
         report["points"] = earned_points
         return report
@@ -1,9 +1,26 @@
 # THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
 
-from typing import Any, List, Mapping, Optional, Tuple, Union
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
+import pexpect
 from collections import OrderedDict
 from enum import Enum
+from .match import EOFMatcher
+from .replay import Recording
+from .zygote import Zygote, ZygoteProcess
 
 PY2 = ...  # type: bool
 
@@ -14,28 +31,101 @@ class ActionType(Enum):
 
 class Action:
     type_ = ...  # type: ActionType
-    data = ...  # type: str
+    data = ...  # type: Union[str, Tuple[str, ...]]
     timeout = ...  # type: Optional[int]
+    match = ...  # type: str
+    tolerance = ...  # type: Optional[Tuple[float, float]]
+    branches = ...  # type: Optional[Tuple[Tuple[Action, ...], ...]]
+    encoding = ...  # type: str
+    matcher = ...  # type: Optional[EOFMatcher]
+    payload = ...  # type: Optional[bytes]
     def __init__(
-        self, type_: ActionType, data: str, timeout: Optional[int] = ...
+        self,
+        type_: ActionType,
+        data: Union[str, Tuple[str, ...]],
+        timeout: Optional[int] = ...,
+        match: Optional[str] = ...,
+        tolerance: Optional[Tuple[float, float]] = ...,
+        branches: Optional[Tuple[Tuple[Action, ...], ...]] = ...,
+        encoding: Optional[str] = ...,
     ) -> None: ...
+    def substitute(self, defs: Mapping) -> Union[str, Tuple[str, ...], Type[pexpect.EOF]]: ...
+    def get_matcher(self, defs: Mapping) -> EOFMatcher: ...
+    def get_input(self, defs: Mapping) -> bytes: ...
+    def follow(self, matcher: EOFMatcher) -> Tuple[Action, ...]: ...
 
+def expect_output(
+    process: pexpect.spawn,
+    matcher: EOFMatcher,
+    timeout: Optional[int],
+    pending: Optional[bytes] = ...,
+    cpu_time: Optional[bool] = ...,
+) -> bytes: ...
+def send_input(
+    process: Union[pexpect.spawn, ZygoteProcess], data: bytes, timeout: Optional[float]
+) -> bytes: ...
+def describe_output(output: Optional[bytes], encoding: Optional[str] = ...) -> str: ...
+def describe_expected(data: Union[str, Tuple[str, ...], Type[pexpect.EOF]]) -> str: ...
+
+def has_exited(pid: int) -> bool: ...
+def wait_exit(pid: int, timeout: Optional[float]) -> bool: ...
+def session_processes(sid: int, include_zombies: Optional[bool] = ...) -> List[int]: ...
+def session_cpu_time(sid: int) -> float: ...
+def kill_session(sid: int) -> int: ...
+def close_process(process: Union[pexpect.spawn, ZygoteProcess]) -> int: ...
+def with_eof(script: Sequence[Action]) -> List[Action]: ...
+def script_inputs(script: Sequence[Action], defs: Mapping) -> List[str]: ...
+def finish_recording(
+    process: Union[pexpect.spawn, ZygoteProcess],
+    script: List[Action],
+    defs: Mapping,
+    timeout: int,
+    recording: Recording,
+) -> bool: ...
 def run_script(
     command: str,
     script: List[Action],
     defs: Optional[Mapping] = ...,
     g_timeout: Optional[int] = ...,
+    stats: Optional[MutableMapping[str, Any]] = ...,
+    cpu_time: Optional[bool] = ...,
+    cpus: Optional[Set[int]] = ...,
+    zygote: Optional[Zygote] = ...,
+    cwd: Optional[str] = ...,
+    env: Optional[Mapping[str, str]] = ...,
+    recording: Optional[Recording] = ...,
+) -> Tuple[int, int, List[str]]: ...
+def replay_script(
+    recording: Recording,
+    script: List[Action],
+    defs: Optional[Mapping] = ...,
+    g_timeout: Optional[int] = ...,
 ) -> Tuple[int, int, List[str]]: ...
+def output_digest(
+    command: str,
+    data: Optional[bytes] = ...,
+    g_timeout: Optional[int] = ...,
+    cwd: Optional[str] = ...,
+    algorithm: Optional[str] = ...,
+) -> str: ...
+def cpu_slots(jobs: int) -> List[Optional[Set[int]]]: ...
+def group_cases(tests: Iterable[TestCase]) -> Iterator[List[TestCase]]: ...
+def expand_cases(
+    cases: Iterable[Union[TestCase, CaseTable]], names: Optional[List[str]] = ...
+) -> Iterator[TestCase]: ...
+def substitute_columns(text: str, values: Mapping[str, Any]) -> str: ...
 
 class TestCase:
     name = ...  # type: str
     command = ...  # type: str
-    script = ...  # type: List[Action]
+    script = ...  # type: Tuple[Action, ...]
     timeout = ...  # type: Optional[int]
     exits = ...  # type: Optional[int]
     points = ...  # type: Optional[Union[int, float]]
     blocker = ...  # type: bool
     visible = ...  # type: bool
+    smoke = ...  # type: bool
+    defs = ...  # type: Optional[Mapping[str, Any]]
     def __init__(
         self,
         name: str,
@@ -45,22 +135,72 @@ class TestCase:
         points: Optional[Union[int, float]] = ...,
         blocker: Optional[bool] = ...,
         visible: Optional[bool] = ...,
+        smoke: Optional[bool] = ...,
+        script: Optional[Sequence[Action]] = ...,
+        defs: Optional[Mapping[str, Any]] = ...,
     ) -> None: ...
     def add_action(self, action: Action) -> None: ...
+    @property
+    def interactive(self) -> bool: ...
     def run(
         self,
         defs: Optional[Mapping] = ...,
         jailed: Optional[bool] = ...,
         g_timeout: Optional[int] = ...,
+        cpu_time: Optional[bool] = ...,
+        cpus: Optional[Set[int]] = ...,
+        zygote: Optional[Zygote] = ...,
+        transcripts: Optional[str] = ...,
+        cwd: Optional[str] = ...,
+        env: Optional[Mapping[str, str]] = ...,
+        recordings: Optional[str] = ...,
+        replay: Optional[bool] = ...,
     ) -> Mapping[str, Union[str, List[str]]]: ...
 
+class CaseTable:
+    template = ...  # type: TestCase
+    columns = ...  # type: Tuple[str, ...]
+    rows = ...  # type: Sequence[Sequence[Any]]
+    def __init__(
+        self, template: TestCase, columns: Sequence[str], rows: Sequence[Sequence[Any]]
+    ) -> None: ...
+    @property
+    def name(self) -> str: ...
+    @property
+    def points(self) -> Optional[Union[int, float]]: ...
+    @property
+    def smoke(self) -> bool: ...
+    def __len__(self) -> int: ...
+    def case(self, index: int) -> TestCase: ...
+    def __iter__(self) -> Iterator[TestCase]: ...
+
+class Config:
+    vars = ...  # type: Mapping[str, str]
+    encoding = ...  # type: str
+    zygote = ...  # type: Optional[str]
+    preload = ...  # type: List[str]
+    extras = ...  # type: Mapping[str, Any]
+    def __init__(self) -> None: ...
+
 class Calico(OrderedDict):
     points = ...  # type: Union[int, float]
+    config = ...  # type: Config
     def __init__(self) -> None: ...
-    def add_case(self, case: TestCase) -> None: ...
+    def add_case(self, case: Union[TestCase, CaseTable]) -> None: ...
+    def get_case(self, name: str) -> Optional[Union[TestCase, CaseTable]]: ...
+    def cases(self, names: Optional[List[str]] = ...) -> Iterator[TestCase]: ...
     def run(
         self,
         tests: Optional[bool] = ...,
         quiet: Optional[List[str]] = ...,
         g_timeout: Optional[int] = ...,
+        cpu_time: Optional[bool] = ...,
+        jobs: Optional[int] = ...,
+        transcripts: Optional[str] = ...,
+        cwd: Optional[str] = ...,
+        env: Optional[Mapping[str, str]] = ...,
+        threshold: Optional[Union[int, float]] = ...,
+        recordings: Optional[str] = ...,
+        replay: Optional[bool] = ...,
+        cases: Optional[Iterable[Union[TestCase, CaseTable]]] = ...,
     ) -> Mapping[str, Any]: ...
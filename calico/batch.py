@@ -0,0 +1,97 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Grading of submissions in batches.
+
+Most broken submissions fail in their first few cases. In triage,
+the cases that are marked as smoke tests are run first for every submission,
+and the full suite is run only for the submissions that pass all of them.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import logging
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+
+_logger = logging.getLogger("calico")
+
+
+def smoke_tests(runner):
+    """Get the names of the cases in the first tier of triage.
+
+    :sig: (Calico) -> List[str]
+    :param runner: Test suite to get the cases from.
+    :return: Names of the smoke cases, in order.
+    """
+    return [name for name, case in runner.items() if case.smoke]
+
+
+def passed_all(report, count):
+    """Check whether all cases in a report have passed.
+
+    :sig: (Mapping[str, Any], int) -> bool
+    :param report: Report of a run.
+    :param count: Number of cases that should be in the report.
+    :return: Whether all cases have been run and none of them has failed.
+    """
+    results = [r for n, r in report.items() if n != "points"]
+    return (len(results) == count) and all(len(r["errors"]) == 0 for r in results)
+
+
+def triage(runner, directories, workers=1, g_timeout=None, cpu_time=False):
+    """Grade a batch of submissions in two tiers.
+
+    :sig:
+        (
+            Calico,
+            Sequence[str],
+            Optional[int],
+            Optional[int],
+            Optional[bool]
+        ) -> Mapping[str, Mapping[str, Optional[Mapping[str, Any]]]]
+    :param runner: Test suite to run.
+    :param directories: Directories of the submissions.
+    :param workers: Number of submissions to grade at the same time.
+    :param g_timeout: Default timeout for the tests, in seconds.
+    :param cpu_time: Whether to time by consumed CPU time instead of wall clock.
+    :return: Reports of the smoke and full tiers for every submission, keyed by directory.
+        The full report is ``None`` if the submission has failed the smoke tier.
+    """
+    smoke = smoke_tests(runner)
+    smoke_count = sum(1 for _ in runner.cases(smoke))
+
+    def run_tier(tests, directory):
+        return runner.run(
+            tests=tests, quiet=True, g_timeout=g_timeout, cpu_time=cpu_time, cwd=directory
+        )
+
+    pool = ThreadPool(workers)
+    try:
+        smoke_reports = pool.map(lambda d: run_tier(smoke, d), directories)
+        passed = [d for d, r in zip(directories, smoke_reports) if passed_all(r, smoke_count)]
+        _logger.debug("%d of %d submissions passed smoke tests", len(passed), len(directories))
+        full_reports = dict(zip(passed, pool.map(lambda d: run_tier(None, d), passed)))
+    finally:
+        pool.close()
+        pool.join()
+
+    reports = OrderedDict()
+    for directory, smoke_report in zip(directories, smoke_reports):
+        reports[directory] = OrderedDict(
+            [("smoke", smoke_report), ("full", full_reports.get(directory))]
+        )
+    return reports
@@ -0,0 +1,15 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, List, Mapping, Optional, Sequence
+
+from .base import Calico
+
+def smoke_tests(runner: Calico) -> List[str]: ...
+def passed_all(report: Mapping[str, Any], count: int) -> bool: ...
+def triage(
+    runner: Calico,
+    directories: Sequence[str],
+    workers: Optional[int] = ...,
+    g_timeout: Optional[int] = ...,
+    cpu_time: Optional[bool] = ...,
+) -> Mapping[str, Mapping[str, Optional[Mapping[str, Any]]]]: ...
@@ -17,15 +17,37 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import errno
+import io
 import logging
 import os
 import sys
 from argparse import ArgumentParser
+from multiprocessing import Pool
 
-from calico import __version__
-from calico.parse import parse_spec
+from calico import GLOBAL_TIMEOUT, __version__
+from calico.base import output_digest
+from calico.batch import triage
+from calico.convert import TARGET_FORMATS, convert_spec
+from calico.daemon import serve
+from calico.metrics import StatsWriter, serve_metrics
+from calico.parse import (
+    SPEC_FORMATS,
+    parse_spec,
+    parse_spec_file,
+    spec_format,
+    stream_spec,
+    validate_spec,
+)
+from calico.store import ResultStore
 
 
+try:
+    from logging.handlers import QueueHandler, QueueListener
+    from queue import Queue
+except ImportError:  # Python 2
+    QueueHandler = QueueListener = None
+
 _logger = logging.getLogger("calico")
 
 LOG_FILENAME = "calico.log"
@@ -53,15 +75,138 @@ def make_parser(prog):
     parser.add_argument(
         "--timeout", type=int, help="default timeout value for all test cases (seconds)"
     )
+    parser.add_argument(
+        "--cpu-time", action="store_true", help="charge timeouts by CPU time, not wall clock"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="number of cases to run concurrently"
+    )
+    parser.add_argument(
+        "--transcripts", help="write transcripts of failed cases into directory"
+    )
+    parser.add_argument("--recordings", help="record interactions of cases into directory")
+    parser.add_argument(
+        "--replay", action="store_true", help="check cases against recordings when possible"
+    )
+    parser.add_argument(
+        "--threshold", type=float, help="stop when it's decided whether points reach this"
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="start running cases while parsing the spec"
+    )
+    parser.add_argument("--store", help="record results into database file")
+    parser.add_argument("--metrics-port", type=int, help="serve metrics over http on port")
+    parser.add_argument("--stats-file", help="write metrics to file periodically")
+    parser.add_argument(
+        "--submission", help="name of submission in database (default: directory name)"
+    )
+    return parser
+
+
+def make_serve_parser(prog):
+    """Build a parser for the command line arguments of the daemon.
+
+    :sig: (str) -> ArgumentParser
+    :param prog: Name of program.
+    :return: Created argument parser.
+    """
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument("--socket", required=True, help="path of unix socket to listen on")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of submissions to grade at once"
+    )
+    parser.add_argument(
+        "--backlog", type=int, default=16, help="number of waiting requests to accept"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=32, help="number of parsed specs to keep"
+    )
+    parser.add_argument("--log", action="store_true", help="log messages to file")
+    parser.add_argument("--debug", action="store_true", help="enable debug messages")
+    return parser
+
+
+def make_triage_parser(prog):
+    """Build a parser for the command line arguments of batch triage.
+
+    :sig: (str) -> ArgumentParser
+    :param prog: Name of program.
+    :return: Created argument parser.
+    """
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument("spec", help="test specifications file")
+    parser.add_argument("directories", nargs="+", help="directories of submissions")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="number of submissions to grade at once"
+    )
+    parser.add_argument(
+        "--timeout", type=int, help="default timeout value for all test cases (seconds)"
+    )
+    parser.add_argument(
+        "--cpu-time", action="store_true", help="charge timeouts by CPU time, not wall clock"
+    )
+    parser.add_argument("--log", action="store_true", help="log messages to file")
+    parser.add_argument("--debug", action="store_true", help="enable debug messages")
+    return parser
+
+
+def make_validate_parser(prog):
+    """Build a parser for the command line arguments of bulk validation.
+
+    :sig: (str) -> ArgumentParser
+    :param prog: Name of program.
+    :return: Created argument parser.
+    """
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument("specs", nargs="+", help="test specifications files")
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of files to check at once (default: all cores)"
+    )
     return parser
 
 
-def setup_logging(debug, log):
+def make_convert_parser(prog):
+    """Build a parser for the command line arguments of spec conversion.
+
+    :sig: (str) -> ArgumentParser
+    :param prog: Name of program.
+    :return: Created argument parser.
+    """
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument("spec", help="test specifications file")
+    parser.add_argument("-o", "--output", help="file to write (default: standard output)")
+    parser.add_argument(
+        "--to", choices=TARGET_FORMATS, help="target format (default: from output file name)"
+    )
+    return parser
+
+
+def make_digest_parser(prog):
+    """Build a parser for the command line arguments of output digests.
+
+    :sig: (str) -> ArgumentParser
+    :param prog: Name of program.
+    :return: Created argument parser.
+    """
+    parser = ArgumentParser(prog=prog)
+    parser.add_argument("command", help="command that runs the reference solution")
+    parser.add_argument("-i", "--input", help="file to send to the program as input")
+    timeout_help = "seconds to wait for output (default: %(t)d)" % {"t": GLOBAL_TIMEOUT}
+    parser.add_argument("--timeout", type=int, help=timeout_help)
+    return parser
+
+
+def setup_logging(debug, log, directory=None):
     """Set up logging levels and handlers.
 
-    :sig: (bool, bool) -> None
+    Messages are written to the log file in a background thread
+    so that the tests don't wait for the file.
+
+    :sig: (bool, bool, Optional[str]) -> Optional[QueueListener]
     :param debug: Whether to activate debugging.
     :param log: Whether to log messages to a file.
+    :param directory: Directory to write the log file into, the current one if not given.
+    :return: Listener that writes to the log file, to be stopped when done.
     """
     _logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
@@ -75,9 +220,19 @@ def setup_logging(debug, log):
         _logger.setLevel(logging.DEBUG)
 
         # file handler for logging messages
-        file_handler = logging.FileHandler(LOG_FILENAME)
+        if directory is not None:
+            file_handler = logging.FileHandler(os.path.join(directory, LOG_FILENAME))
+        else:
+            file_handler = logging.FileHandler(LOG_FILENAME)
         file_handler.setLevel(logging.DEBUG)
+        if QueueHandler is not None:
+            log_queue = Queue()
+            listener = QueueListener(log_queue, file_handler)
+            listener.start()
+            _logger.addHandler(QueueHandler(log_queue))
+            return listener
         _logger.addHandler(file_handler)
+    return None
 
 
 def main(argv=None):
@@ -87,26 +242,254 @@ def main(argv=None):
     :param argv: Command line arguments.
     """
     argv = argv if argv is not None else sys.argv
+    if (len(argv) > 1) and (argv[1] == "serve"):
+        serve_main(argv[1:])
+        return
+    if (len(argv) > 1) and (argv[1] == "triage"):
+        triage_main(argv[1:])
+        return
+    if (len(argv) > 1) and (argv[1] == "validate"):
+        validate_main(argv[1:])
+        return
+    if (len(argv) > 1) and (argv[1] == "convert"):
+        convert_main(argv[1:])
+        return
+    if (len(argv) > 1) and (argv[1] == "digest"):
+        digest_main(argv[1:])
+        return
     parser = make_parser(prog="calico")
     arguments = parser.parse_args(argv[1:])
+    log_listener = None
     try:
         spec_filename = os.path.abspath(arguments.spec)
+        if arguments.store is not None:
+            store_filename = os.path.abspath(arguments.store)
+        if arguments.stats_file is not None:
+            stats_filename = os.path.abspath(arguments.stats_file)
+        if arguments.transcripts is not None:
+            transcripts_dir = os.path.abspath(arguments.transcripts)
+            if not os.path.isdir(transcripts_dir):
+                os.makedirs(transcripts_dir)
+        else:
+            transcripts_dir = None
+        if arguments.recordings is not None:
+            recordings_dir = os.path.abspath(arguments.recordings)
+            if not os.path.isdir(recordings_dir):
+                os.makedirs(recordings_dir)
+        else:
+            assert not arguments.replay, "Replaying requires a recordings directory"
+            recordings_dir = None
         with open(spec_filename) as f:
             content = f.read()
 
-        if arguments.directory is not None:
-            os.chdir(arguments.directory)
+        work_dir = os.path.abspath(
+            arguments.directory if arguments.directory is not None else os.curdir
+        )
+        if not os.path.isdir(work_dir):
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), arguments.directory)
 
-        setup_logging(debug=arguments.debug, log=arguments.log)
+        log_listener = setup_logging(
+            debug=arguments.debug, log=arguments.log, directory=work_dir
+        )
 
-        runner = parse_spec(content)
+        spec_dir = os.path.dirname(spec_filename)
+        errors = []
+        cases = None
+        if arguments.stream and (not arguments.validate):
+            runner, cases = stream_spec(
+                content, base_dir=spec_dir, errors=errors, format=spec_format(spec_filename)
+            )
+        else:
+            runner = parse_spec(content, base_dir=spec_dir, format=spec_format(spec_filename))
 
         if not arguments.validate:
-            report = runner.run(
-                tests=arguments.tests, quiet=arguments.quiet, g_timeout=arguments.timeout
-            )
+            server = None
+            if arguments.metrics_port is not None:
+                server = serve_metrics(arguments.metrics_port)
+            stats_writer = None
+            if arguments.stats_file is not None:
+                stats_writer = StatsWriter(stats_filename)
+                stats_writer.start()
+            try:
+                report = runner.run(
+                    tests=arguments.tests,
+                    quiet=arguments.quiet,
+                    g_timeout=arguments.timeout,
+                    cpu_time=arguments.cpu_time,
+                    jobs=arguments.jobs,
+                    transcripts=transcripts_dir,
+                    cwd=work_dir,
+                    threshold=arguments.threshold,
+                    recordings=recordings_dir,
+                    replay=arguments.replay,
+                    cases=cases,
+                )
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+                if stats_writer is not None:
+                    stats_writer.stop()
+            if cases is not None:
+                for _ in cases:  # parse the rest for the total points and the errors
+                    pass
             score = report["points"]
             print("Grade: %(s)s / %(p)s" % {"s": score, "p": runner.points})
+
+            if arguments.store is not None:
+                submission = arguments.submission
+                if submission is None:
+                    submission = os.path.basename(work_dir)
+                store = ResultStore(store_filename)
+                store.add_report(submission, report)
+                store.close()
+
+            for error in errors:
+                print(error, file=sys.stderr)
+            if len(errors) > 0:
+                sys.exit(1)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
+
+
+def serve_main(argv):
+    """Entry point of the grading daemon.
+
+    :sig: (List[str]) -> None
+    :param argv: Command line arguments, starting with the subcommand.
+    """
+    parser = make_serve_parser(prog="calico serve")
+    arguments = parser.parse_args(argv[1:])
+    log_listener = setup_logging(debug=arguments.debug, log=arguments.log)
+    try:
+        serve(
+            arguments.socket,
+            workers=arguments.workers,
+            backlog=arguments.backlog,
+            cache_size=arguments.cache_size,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
+
+
+def triage_main(argv):
+    """Entry point of batch triage.
+
+    :sig: (List[str]) -> None
+    :param argv: Command line arguments, starting with the subcommand.
+    """
+    parser = make_triage_parser(prog="calico triage")
+    arguments = parser.parse_args(argv[1:])
+    log_listener = setup_logging(debug=arguments.debug, log=arguments.log)
+    try:
+        runner = parse_spec_file(arguments.spec)
+        directories = [os.path.abspath(d) for d in arguments.directories]
+        reports = triage(
+            runner,
+            directories,
+            workers=arguments.workers,
+            g_timeout=arguments.timeout,
+            cpu_time=arguments.cpu_time,
+        )
+        for directory, report in reports.items():
+            name = os.path.basename(directory)
+            if report["full"] is None:
+                print("%(n)s: failed smoke tests" % {"n": name})
+            else:
+                score = report["full"]["points"]
+                print("%(n)s: %(s)s / %(p)s" % {"n": name, "s": score, "p": runner.points})
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
+
+
+def validate_main(argv):
+    """Entry point of bulk validation.
+
+    All errors of every file are printed, and the exit status
+    is nonzero if any file has errors.
+
+    :sig: (List[str]) -> None
+    :param argv: Command line arguments, starting with the subcommand.
+    """
+    parser = make_validate_parser(prog="calico validate")
+    arguments = parser.parse_args(argv[1:])
+    specs = arguments.specs
+    pool = Pool(arguments.jobs) if (len(specs) > 1) and (arguments.jobs != 1) else None
+    try:
+        if pool is not None:
+            results = pool.imap(validate_spec, specs, 4)
+        else:
+            results = map(validate_spec, specs)
+        invalid = 0
+        for spec, errors in zip(specs, results):
+            for error in errors:
+                print("%(f)s: %(e)s" % {"f": spec, "e": error})
+            invalid += 1 if len(errors) > 0 else 0
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if invalid > 0:
+        sys.exit(1)
+
+
+def convert_main(argv):
+    """Entry point of spec conversion.
+
+    :sig: (List[str]) -> None
+    :param argv: Command line arguments, starting with the subcommand.
+    """
+    parser = make_convert_parser(prog="calico convert")
+    arguments = parser.parse_args(argv[1:])
+    target = arguments.to
+    if (target is None) and (arguments.output is not None):
+        target = SPEC_FORMATS.get(os.path.splitext(arguments.output)[1].lower())
+    target = target if target in TARGET_FORMATS else "json"
+    try:
+        spec_filename = os.path.abspath(arguments.spec)
+        with io.open(spec_filename, encoding="utf-8") as f:
+            content = f.read()
+        converted = convert_spec(
+            content,
+            target,
+            source=spec_format(spec_filename),
+            base_dir=os.path.dirname(spec_filename),
+        )
+        if arguments.output is not None:
+            with io.open(arguments.output, "w", encoding="utf-8") as f:
+                f.write(converted)
+        else:
+            print(converted, end="")
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+def digest_main(argv):
+    """Entry point of output digests.
+
+    :sig: (List[str]) -> None
+    :param argv: Command line arguments, starting with the subcommand.
+    """
+    parser = make_digest_parser(prog="calico digest")
+    arguments = parser.parse_args(argv[1:])
+    try:
+        data = b""
+        if arguments.input is not None:
+            with io.open(arguments.input, "rb") as f:
+                data = f.read()
+        print(output_digest(arguments.command, data=data, g_timeout=arguments.timeout))
     except Exception as e:
         print(e, file=sys.stderr)
         sys.exit(1)
@@ -3,7 +3,20 @@
 from typing import List, Optional
 
 from argparse import ArgumentParser
+from logging.handlers import QueueListener
 
 def make_parser(prog: str) -> ArgumentParser: ...
-def setup_logging(debug: bool, log: bool) -> None: ...
+def make_serve_parser(prog: str) -> ArgumentParser: ...
+def make_triage_parser(prog: str) -> ArgumentParser: ...
+def make_validate_parser(prog: str) -> ArgumentParser: ...
+def make_convert_parser(prog: str) -> ArgumentParser: ...
+def make_digest_parser(prog: str) -> ArgumentParser: ...
+def setup_logging(
+    debug: bool, log: bool, directory: Optional[str] = ...
+) -> Optional[QueueListener]: ...
 def main(argv: Optional[List[str]] = ...) -> None: ...
+def serve_main(argv: List[str]) -> None: ...
+def triage_main(argv: List[str]) -> None: ...
+def validate_main(argv: List[str]) -> None: ...
+def convert_main(argv: List[str]) -> None: ...
+def digest_main(argv: List[str]) -> None: ...
@@ -0,0 +1,176 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Conversion of specifications between formats.
+
+Timeouts that are given in comments in YAML specifications
+are turned into ``timeout`` fields, so that the converted specifications
+can be loaded by parsers that don't keep comments.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import datetime
+import json
+import re
+from collections import OrderedDict
+
+from .parse import ACTION_TYPES, build_spec, get_comment_value, load_document
+
+
+TARGET_FORMATS = ("json", "toml")  # sig: Tuple[str, ...]
+"""Formats that specifications can be converted into."""
+
+_BARE_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def with_timeout_fields(spec):
+    """Copy the stages of a specification, turning timeout comments into fields.
+
+    :sig: (List[Mapping[str, Any]]) -> List[Mapping[str, Any]]
+    :param spec: Loaded stages of a valid specification.
+    :return: Stages with timeout fields.
+    """
+    stages = []
+    for stage in spec:
+        converted = OrderedDict()
+        for name, body in stage.items():
+            if name[0] == "_":
+                converted[name] = body
+                continue
+            case = OrderedDict(body)
+            timeout = get_comment_value(body, name="run", field="timeout")
+            if (timeout is not None) and ("timeout" not in case):
+                case["timeout"] = int(timeout)
+            if body.get("script") is not None:
+                case["script"] = script_with_timeout_fields(body["script"])
+            converted[name] = case
+        stages.append(converted)
+    return stages
+
+
+def script_with_timeout_fields(script):
+    """Copy the steps of a script, turning timeout comments into fields.
+
+    :sig: (List[Mapping[str, Any]]) -> List[Mapping[str, Any]]
+    :param script: Steps of a valid script.
+    :return: Steps with timeout fields, also in the branches of alternatives.
+    """
+    steps = []
+    for step in script:
+        action = OrderedDict(step)
+        action_type = next((k for k in step if k in ACTION_TYPES), None)
+        timeout = get_comment_value(step, name=action_type, field="timeout")
+        if (timeout is not None) and ("timeout" not in action):
+            action["timeout"] = int(timeout)
+        data = step.get(action_type)
+        if isinstance(data, dict):
+            action[action_type] = OrderedDict(
+                (a, script_with_timeout_fields(b if b is not None else []))
+                for a, b in data.items()
+            )
+        steps.append(action)
+    return steps
+
+
+def dump_json(spec):
+    """Write the stages of a specification in JSON.
+
+    :sig: (List[Mapping[str, Any]]) -> str
+    :param spec: Stages to write.
+    :return: JSON text.
+    """
+    return json.dumps(spec, indent=2, ensure_ascii=False, default=str) + "\n"
+
+
+def _toml_key(key):
+    """Write a key in TOML, quoting it if necessary."""
+    return key if _BARE_KEY.match(key) else json.dumps(key, ensure_ascii=False)
+
+
+def _toml_value(value):
+    """Write a value inline in TOML."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:
+            return "nan"
+        if value in (float("inf"), float("-inf")):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        pairs = [(k, v) for k, v in value.items() if v is not None]
+        return "{%s}" % ", ".join("%s = %s" % (_toml_key(k), _toml_value(v)) for k, v in pairs)
+    if isinstance(value, list):
+        return "[%s]" % ", ".join(_toml_value(v) for v in value if v is not None)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _is_table_array(value):
+    """Check whether a value has to be written as an array of tables."""
+    if (not isinstance(value, list)) or (len(value) == 0):
+        return False
+    return all(isinstance(v, dict) for v in value)
+
+
+def _toml_table(table, path, lines):
+    """Write the contents of a table in TOML, followed by its subtables."""
+    for key, value in table.items():
+        if (value is None) or isinstance(value, dict) or _is_table_array(value):
+            continue
+        lines.append("%(k)s = %(v)s" % {"k": _toml_key(key), "v": _toml_value(value)})
+    for key, value in table.items():
+        subpath = path + [_toml_key(key)]
+        if isinstance(value, dict):
+            lines.extend(["", "[%(p)s]" % {"p": ".".join(subpath)}])
+            _toml_table(value, subpath, lines)
+        elif _is_table_array(value):
+            for item in value:
+                lines.extend(["", "[[%(p)s]]" % {"p": ".".join(subpath)}])
+                _toml_table(item, subpath, lines)
+
+
+def dump_toml(spec):
+    """Write the stages of a specification in TOML.
+
+    :sig: (List[Mapping[str, Any]]) -> str
+    :param spec: Stages to write.
+    :return: TOML text.
+    """
+    lines = []
+    _toml_table({"stages": spec}, [], lines)
+    return "\n".join(lines).lstrip("\n") + "\n"
+
+
+def convert_spec(content, target, source="yaml", base_dir=None):
+    """Convert a specification into another format.
+
+    :sig: (str, str, Optional[str], Optional[str]) -> str
+    :param content: Specification to convert.
+    :param target: Format to convert into, ``json`` or ``toml``.
+    :param source: Format of the specification.
+    :param base_dir: Directory to resolve relative file paths against.
+    :return: Converted specification.
+    :raise AssertionError: When given specification is invalid.
+    """
+    assert target in TARGET_FORMATS, "Unknown target format"
+    spec = load_document(content, format=source)
+    build_spec(spec, base_dir=base_dir)  # make sure that it's valid
+    stages = with_timeout_fields(spec)
+    return dump_json(stages) if target == "json" else dump_toml(stages)
@@ -0,0 +1,13 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, List, Mapping, Optional, Tuple
+
+TARGET_FORMATS = ...  # type: Tuple[str, ...]
+
+def with_timeout_fields(spec: List[Mapping[str, Any]]) -> List[Mapping[str, Any]]: ...
+def script_with_timeout_fields(script: List[Mapping[str, Any]]) -> List[Mapping[str, Any]]: ...
+def dump_json(spec: List[Mapping[str, Any]]) -> str: ...
+def dump_toml(spec: List[Mapping[str, Any]]) -> str: ...
+def convert_spec(
+    content: str, target: str, source: Optional[str] = ..., base_dir: Optional[str] = ...
+) -> str: ...
@@ -0,0 +1,243 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Grading daemon.
+
+The daemon listens on a Unix socket for grading requests, so that
+a submission system doesn't have to start a new Calico for every submission.
+Parsed specifications are cached and reused as long as their files
+don't change.
+
+A request is a JSON object on a single line, with the path of the spec file,
+the directory of the submission, and optionally the tests to run,
+the default timeout, the number of concurrent cases and the points threshold
+that decides the result. The response
+is a JSON object on a single line with a status of ``ok``, ``busy`` or
+``error``, and the report of the run if the status is ``ok``.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+from collections import OrderedDict
+from threading import BoundedSemaphore
+
+from .parse import parse_spec, spec_format
+
+
+try:
+    from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+except ImportError:  # Python 2
+    from SocketServer import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+
+
+_logger = logging.getLogger("calico")
+
+
+class SpecCache:
+    """A least recently used cache of parsed specifications."""
+
+    def __init__(self, size=32):
+        """Initialize this cache.
+
+        :sig: (Optional[int]) -> None
+        :param size: Maximum number of specifications to keep.
+        """
+        self.size = size  # sig: int
+        """Maximum number of specifications to keep."""
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Get the parsed specification in a file.
+
+        The file is parsed again only if its modification time or size
+        has changed and its contents are different.
+
+        :sig: (str) -> Calico
+        :param path: Path of the specification file.
+        :return: Parsed specification.
+        :raise AssertionError: When the specification is invalid.
+        """
+        stat = os.stat(path)
+        key = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if (entry is not None) and (entry[0] == key):
+                self._entries.pop(path)
+                self._entries[path] = entry
+                return entry[2]
+        with open(path, "rb") as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        if (entry is not None) and (entry[1] == digest):
+            runner = entry[2]
+        else:
+            runner = parse_spec(
+                content.decode("utf-8"),
+                base_dir=os.path.dirname(path),
+                format=spec_format(path),
+            )
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = (key, digest, runner)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return runner
+
+
+class GradingHandler(StreamRequestHandler):
+    """A handler that grades a submission for every request."""
+
+    def handle(self):
+        """Read a request and write the response."""
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line.decode("utf-8"))
+            assert isinstance(request, dict), "Request must be an object"
+        except (ValueError, AssertionError) as e:
+            self.respond({"status": "error", "message": str(e)})
+            return
+        if not self.server.admitted.acquire(False):
+            self.respond({"status": "busy"})
+            return
+        try:
+            with self.server.workers:
+                response = self.server.grade(request)
+        finally:
+            self.server.admitted.release()
+        self.respond(response)
+
+    def respond(self, response):
+        """Write a response.
+
+        :sig: (Mapping[str, Any]) -> None
+        :param response: Response to write.
+        """
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class GradingServer(ThreadingMixIn, UnixStreamServer):
+    """A server that grades submissions on a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, path, workers=1, backlog=16, cache_size=32):
+        """Initialize this server.
+
+        :sig: (str, Optional[int], Optional[int], Optional[int]) -> None
+        :param path: Path of the socket.
+        :param workers: Number of submissions to grade at the same time.
+        :param backlog: Number of requests that can wait for a worker.
+        :param cache_size: Number of specifications to keep parsed.
+        """
+        UnixStreamServer.__init__(self, path, GradingHandler)
+
+        self.cache = SpecCache(size=cache_size)  # sig: SpecCache
+        """Cache of parsed specifications."""
+
+        self.workers = BoundedSemaphore(workers)  # sig: BoundedSemaphore
+        """Slots for submissions being graded."""
+
+        self.admitted = BoundedSemaphore(workers + backlog)  # sig: BoundedSemaphore
+        """Slots for submissions being graded or waiting."""
+
+    def grade(self, request):
+        """Grade a submission.
+
+        :sig: (Mapping[str, Any]) -> Mapping[str, Any]
+        :param request: Grading request.
+        :return: Response containing the report.
+        """
+        try:
+            runner = self.cache.get(os.path.abspath(request["spec"]))
+            report = runner.run(
+                tests=request.get("tests"),
+                quiet=True,
+                g_timeout=request.get("timeout"),
+                jobs=request.get("jobs", 1),
+                cwd=request["directory"],
+                threshold=request.get("threshold"),
+            )
+        except Exception as e:
+            _logger.debug("grading failed: %s", e)
+            return {"status": "error", "message": str(e)}
+        return {"status": "ok", "report": report, "total": runner.points}
+
+
+def serve(path, workers=1, backlog=16, cache_size=32):
+    """Serve grading requests until interrupted.
+
+    :sig: (str, Optional[int], Optional[int], Optional[int]) -> None
+    :param path: Path of the socket.
+    :param workers: Number of submissions to grade at the same time.
+    :param backlog: Number of requests that can wait for a worker.
+    :param cache_size: Number of specifications to keep parsed.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = GradingServer(path, workers=workers, backlog=backlog, cache_size=cache_size)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def request_grading(path, spec, directory, tests=None, timeout=None, jobs=None, threshold=None):
+    """Send a grading request to a daemon and wait for the response.
+
+    :sig:
+        (
+            str,
+            str,
+            str,
+            Optional[List[str]],
+            Optional[int],
+            Optional[int],
+            Optional[Union[int, float]]
+        ) -> Mapping[str, Any]
+    :param path: Path of the socket of the daemon.
+    :param spec: Path of the specification file.
+    :param directory: Directory of the submission.
+    :param tests: Tests to run, all of them if not given.
+    :param timeout: Default timeout for the tests, in seconds.
+    :param jobs: Number of cases to run concurrently.
+    :param threshold: Points that decide the result, to stop early.
+    :return: Response of the daemon.
+    """
+    request = {"spec": os.path.abspath(spec), "directory": os.path.abspath(directory)}
+    if tests is not None:
+        request["tests"] = tests
+    if timeout is not None:
+        request["timeout"] = timeout
+    if jobs is not None:
+        request["jobs"] = jobs
+    if threshold is not None:
+        request["threshold"] = threshold
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        response = client.makefile("rb").readline()
+    finally:
+        client.close()
+    return json.loads(response.decode("utf-8"), object_pairs_hook=OrderedDict)
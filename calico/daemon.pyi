@@ -0,0 +1,44 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, List, Mapping, Optional, Union
+
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from threading import BoundedSemaphore
+from .base import Calico
+
+class SpecCache:
+    size = ...  # type: int
+    def __init__(self, size: Optional[int] = ...) -> None: ...
+    def get(self, path: str) -> Calico: ...
+
+class GradingHandler(StreamRequestHandler):
+    def respond(self, response: Mapping[str, Any]) -> None: ...
+
+class GradingServer(ThreadingMixIn, UnixStreamServer):
+    cache = ...  # type: SpecCache
+    workers = ...  # type: BoundedSemaphore
+    admitted = ...  # type: BoundedSemaphore
+    def __init__(
+        self,
+        path: str,
+        workers: Optional[int] = ...,
+        backlog: Optional[int] = ...,
+        cache_size: Optional[int] = ...,
+    ) -> None: ...
+    def grade(self, request: Mapping[str, Any]) -> Mapping[str, Any]: ...
+
+def serve(
+    path: str,
+    workers: Optional[int] = ...,
+    backlog: Optional[int] = ...,
+    cache_size: Optional[int] = ...,
+) -> None: ...
+def request_grading(
+    path: str,
+    spec: str,
+    directory: str,
+    tests: Optional[List[str]] = ...,
+    timeout: Optional[int] = ...,
+    jobs: Optional[int] = ...,
+    threshold: Optional[Union[int, float]] = ...,
+) -> Mapping[str, Any]: ...
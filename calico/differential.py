@@ -0,0 +1,466 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Differential testing against a reference solution.
+
+A differential case runs the program on many inputs, given as files
+or produced by a generator, and compares its output with the output
+of a reference solution on the same input. The programs are not
+interactive, they get the whole input at once and run to completion.
+Reference outputs are cached by the hash of the input, so they are computed
+only once when many submissions are graded.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import io
+import logging
+import os
+import shlex
+import subprocess
+import time
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from threading import Event, Thread, Timer
+
+from . import GLOBAL_TIMEOUT
+from .base import TestCase, kill_session
+from .match import Mismatch, build_matcher
+from .metrics import metrics
+
+
+MAX_FAILURES = 3  # sig: int
+"""Number of failing inputs to report before stopping."""
+
+_logger = logging.getLogger("calico")
+
+
+def run_batch(command, data, timeout=None, cwd=None, env=None, cpus=None):
+    """Run a command on an input and collect its output.
+
+    The program is the leader of its own session. Its leftover processes
+    are killed before it's reaped, so that its id can't be taken
+    by another program in the meantime.
+
+    :sig:
+        (
+            str,
+            bytes,
+            Optional[float],
+            Optional[str],
+            Optional[Mapping[str, str]],
+            Optional[Set[int]]
+        ) -> Tuple[bytes, int, bool]
+    :param command: Command to run.
+    :param data: Input to give to the program.
+    :param timeout: How long to wait for the program, in seconds.
+    :param cwd: Directory to run the command in, the current directory if not given.
+    :param env: Environment of the command, the current environment if not given.
+    :param cpus: CPUs to pin the program to.
+    :return: Output, exit status, and whether the program was killed for timing out.
+    """
+
+    def prepare():
+        os.setsid()
+        if cpus is not None:
+            os.sched_setaffinity(0, cpus)
+
+    with io.open(os.devnull, "wb") as devnull:
+        process = subprocess.Popen(
+            shlex.split(command),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=devnull,
+            cwd=cwd,
+            env=env,
+            preexec_fn=prepare,
+        )
+    expired = Event()
+
+    def expire():
+        expired.set()
+        kill_session(process.pid)
+
+    def feed():
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except (IOError, OSError):  # program has exited without reading all input
+            pass
+
+    timer = Timer(timeout, expire) if timeout is not None else None
+    writer = Thread(target=feed)
+    writer.start()
+    if timer is not None:
+        timer.start()
+    try:
+        # not waiting for the program, so that it isn't reaped before its session is killed
+        output = process.stdout.read()
+    finally:
+        if timer is not None:
+            timer.cancel()
+            timer.join()
+        kill_session(process.pid)
+        writer.join()
+        process.stdout.close()
+        process.wait()
+    return output, process.returncode, expired.is_set()
+
+
+def same_output(expected, output, mode="literal", tolerance=None):
+    """Check whether an output matches an expected output as a whole.
+
+    :sig: (bytes, bytes, Optional[str], Optional[Tuple[float, float]]) -> bool
+    :param expected: Expected output.
+    :param output: Received output.
+    :param mode: How to match the output.
+    :param tolerance: Absolute and relative tolerances for numeric matching.
+    :return: Whether the outputs match.
+    """
+    matcher = build_matcher(expected, mode=mode, tolerance=tolerance).start()
+    try:
+        rest = matcher.feed(output)
+    except Mismatch:
+        return False
+    if rest is None:
+        return matcher.eof()
+    return (rest == b"") or ((mode != "literal") and (rest.strip() == b""))
+
+
+class ReferenceCache:
+    """Outputs of a reference solution, keyed by the hash of their inputs.
+
+    The outputs are kept in memory, and also in files in a directory if given
+    so that they survive between runs.
+    """
+
+    def __init__(self, directory=None):
+        """Initialize this cache.
+
+        :sig: (Optional[str]) -> None
+        :param directory: Directory to keep the outputs in.
+        """
+        self.directory = directory  # sig: Optional[str]
+        """Directory to keep the outputs in."""
+
+        self.outputs = {}  # sig: Dict[str, bytes]
+        """Cached outputs, keyed by the hash of the input."""
+
+    def path(self, key):
+        """Get the path of the file of a cached output.
+
+        :sig: (str) -> str
+        :param key: Hash of the input.
+        :return: Path of the file.
+        """
+        return os.path.join(self.directory, key + ".out")
+
+    def get(self, key):
+        """Get a cached output.
+
+        :sig: (str) -> Optional[bytes]
+        :param key: Hash of the input.
+        :return: Cached output, ``None`` if not cached.
+        """
+        output = self.outputs.get(key)
+        if (output is None) and (self.directory is not None):
+            try:
+                with io.open(self.path(key), "rb") as f:
+                    output = f.read()
+            except IOError:
+                return None
+            self.outputs[key] = output
+        return output
+
+    def put(self, key, output):
+        """Add an output to the cache.
+
+        :sig: (str, bytes) -> None
+        :param key: Hash of the input.
+        :param output: Output of the reference solution.
+        """
+        self.outputs[key] = output
+        if self.directory is not None:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            partial = self.path(key) + ".%(p)d" % {"p": os.getpid()}
+            with io.open(partial, "wb") as f:
+                f.write(output)
+            os.rename(partial, self.path(key))
+
+
+class DifferentialCase(TestCase):
+    """A case that compares the outputs of a program with a reference solution."""
+
+    __slots__ = (
+        "reference",
+        "inputs",
+        "generator",
+        "count",
+        "match",
+        "tolerance",
+        "base_dir",
+        "cache",
+        "generated",
+    )
+
+    def __init__(
+        self,
+        name,
+        command,
+        reference,
+        inputs=(),
+        generator=None,
+        count=100,
+        match="literal",
+        tolerance=None,
+        base_dir=None,
+        cache=None,
+        **kwargs
+    ):
+        """Initialize this differential case.
+
+        :sig:
+            (
+                str,
+                str,
+                str,
+                Optional[Sequence[str]],
+                Optional[str],
+                Optional[int],
+                Optional[str],
+                Optional[Tuple[float, float]],
+                Optional[str],
+                Optional[str],
+                **Any
+            ) -> None
+        :param name: Name of the case.
+        :param command: Command to run.
+        :param reference: Command that runs the reference solution.
+        :param inputs: Paths of the input files.
+        :param generator: Command that prints an input, with a ``seed`` substitution.
+        :param count: Number of inputs to generate.
+        :param match: How to match the output with the reference output.
+        :param tolerance: Absolute and relative tolerances for numeric matching.
+        :param base_dir: Directory to run the reference solution and the generator in.
+        :param cache: Directory to keep the reference outputs in.
+        :param kwargs: Other settings of the case.
+        """
+        TestCase.__init__(self, name, command, **kwargs)
+
+        self.reference = reference  # sig: str
+        """Command that runs the reference solution."""
+
+        self.inputs = tuple(inputs)  # sig: Tuple[str, ...]
+        """Paths of the input files."""
+
+        self.generator = generator  # sig: Optional[str]
+        """Command that prints an input, with a ``seed`` substitution."""
+
+        self.count = count if generator is not None else len(self.inputs)  # sig: int
+        """Number of inputs to check the program on."""
+
+        self.match = match  # sig: str
+        """How to match the output with the reference output."""
+
+        self.tolerance = tolerance  # sig: Optional[Tuple[float, float]]
+        """Absolute and relative tolerances for numeric matching."""
+
+        self.base_dir = base_dir  # sig: Optional[str]
+        """Directory to run the reference solution and the generator in."""
+
+        self.cache = ReferenceCache(cache)  # sig: ReferenceCache
+        """Cached outputs of the reference solution."""
+
+        self.generated = {}  # sig: Dict[int, bytes]
+        """Generated inputs, keyed by seed."""
+
+    def get_input(self, index, timeout, env=None):
+        """Get an input to check the program on.
+
+        :sig: (int, float, Optional[Mapping[str, str]]) -> Tuple[str, bytes]
+        :param index: Index of the input.
+        :param timeout: How long to wait for the generator, in seconds.
+        :param env: Environment of the generator.
+        :return: Description and content of the input.
+        :raise AssertionError: When the generator fails.
+        """
+        if self.generator is None:
+            path = self.inputs[index]
+            with io.open(path, "rb") as f:
+                return os.path.basename(path), f.read()
+        label = "seed %(s)d" % {"s": index}
+        data = self.generated.get(index)
+        if data is None:
+            command = self.generator % {"seed": index}
+            data, status, expired = run_batch(command, b"", timeout, cwd=self.base_dir, env=env)
+            assert (status == 0) and (not expired), "Input generator failed for %(i)s." % {
+                "i": label
+            }
+            self.generated[index] = data
+        return label, data
+
+    def get_reference_output(self, label, data, timeout, env=None):
+        """Get the output of the reference solution for an input.
+
+        :sig: (str, bytes, float, Optional[Mapping[str, str]]) -> bytes
+        :param label: Description of the input.
+        :param data: Content of the input.
+        :param timeout: How long to wait for the reference solution, in seconds.
+        :param env: Environment of the reference solution.
+        :return: Output of the reference solution.
+        :raise AssertionError: When the reference solution fails.
+        """
+        key = hashlib.sha256(data).hexdigest()
+        output = self.cache.get(key)
+        if output is None:
+            metrics.inc("reference_runs_total")
+            output, status, expired = run_batch(
+                self.reference, data, timeout, cwd=self.base_dir, env=env
+            )
+            assert (status == 0) and (not expired), "Reference failed for input %(i)s." % {
+                "i": label
+            }
+            self.cache.put(key, output)
+        return output
+
+    def check_input(self, index, timeout, cwd=None, env=None, cpus=None):
+        """Check the program on an input.
+
+        :sig:
+            (
+                int,
+                float,
+                Optional[str],
+                Optional[Mapping[str, str]],
+                Optional[Set[int]]
+            ) -> Tuple[str, Optional[str]]
+        :param index: Index of the input.
+        :param timeout: How long to wait for the programs, in seconds.
+        :param cwd: Directory to run the program in.
+        :param env: Environment of the programs.
+        :param cpus: CPUs to pin the program to.
+        :return: Description of the input, and the error if the check failed.
+        """
+        label = "#%(n)d" % {"n": index + 1}
+        try:
+            label, data = self.get_input(index, timeout, env=env)
+            expected = self.get_reference_output(label, data, timeout, env=env)
+        except (AssertionError, IOError) as e:
+            return label, str(e)
+        output, status, expired = run_batch(
+            self.command, data, timeout, cwd=cwd, env=env, cpus=cpus
+        )
+        metrics.inc("differential_inputs_total")
+        if expired:
+            metrics.inc("timeouts_total")
+            return label, "Timeout exceeded for input %(i)s." % {"i": label}
+        if status != self.exits:
+            return label, "Incorrect exit status for input %(i)s." % {"i": label}
+        if not same_output(expected, output, mode=self.match, tolerance=self.tolerance):
+            return label, "Output differs from reference for input %(i)s." % {"i": label}
+        return label, None
+
+    def run(
+        self,
+        defs=None,
+        jailed=False,
+        g_timeout=None,
+        cpu_time=False,
+        cpus=None,
+        zygote=None,
+        transcripts=None,
+        cwd=None,
+        env=None,
+        recordings=None,
+        replay=False,
+    ):
+        """Run this test on all inputs and produce a report.
+
+        The inputs are checked in a pool of workers, one for every CPU
+        given to the case. The run stops when enough failing inputs
+        have been found. The settings for interactive runs, like jailing,
+        warm interpreters, transcripts and recordings, don't apply
+        and are ignored. The timeout is always measured by wall clock.
+
+        :sig:
+            (
+                Optional[Mapping],
+                Optional[bool],
+                Optional[int],
+                Optional[bool],
+                Optional[Set[int]],
+                Optional[Zygote],
+                Optional[str],
+                Optional[str],
+                Optional[Mapping[str, str]],
+                Optional[str],
+                Optional[bool]
+            ) -> Mapping[str, Union[str, List[str]]]
+        :param defs: Variable substitutions.
+        :param jailed: Ignored.
+        :param g_timeout: Global timeout for the runs on each input.
+        :param cpu_time: Ignored.
+        :param cpus: CPUs to run the program on, all of them if not given.
+        :param zygote: Ignored.
+        :param transcripts: Ignored.
+        :param cwd: Directory to run the command in, the current directory if not given.
+        :param env: Environment of the command, the current environment if not given.
+        :param recordings: Ignored.
+        :param replay: Ignored.
+        :return: Result report of the test.
+        """
+        report = {"errors": [], "leaked": 0}
+        start_time = time.time()
+        metrics.inc("cases_running")
+        _logger.debug("checking %s against %s", self.command, self.reference)
+
+        timeout = self.timeout if self.timeout != -1 else g_timeout
+        timeout = timeout if timeout is not None else GLOBAL_TIMEOUT
+        stopped = Event()
+
+        def check(index):
+            if stopped.is_set():
+                return None
+            return self.check_input(index, timeout, cwd=cwd, env=env, cpus=cpus)
+
+        checked = 0
+        pool = ThreadPool(len(cpus) if cpus is not None else cpu_count())
+        try:
+            for result in pool.imap(check, range(self.count)):
+                if result is None:
+                    continue
+                checked += 1
+                label, error = result
+                if error is not None:
+                    _logger.debug("FAILED: %s", error)
+                    report["errors"].append(error)
+                    if len(report["errors"]) == MAX_FAILURES:
+                        stopped.set()
+                        break
+        finally:
+            stopped.set()
+            pool.close()
+            pool.join()
+            metrics.inc("cases_running", -1)
+        report["inputs"] = checked
+
+        report["duration"] = time.time() - start_time
+        metrics.inc("cases_total")
+        passed = len(report["errors"]) == 0
+        metrics.inc("cases_passed_total" if passed else "cases_failed_total")
+        metrics.observe("case_duration_seconds", report["duration"])
+        return report
@@ -0,0 +1,84 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from .base import TestCase
+from .zygote import Zygote
+
+MAX_FAILURES = ...  # type: int
+
+def run_batch(
+    command: str,
+    data: bytes,
+    timeout: Optional[float] = ...,
+    cwd: Optional[str] = ...,
+    env: Optional[Mapping[str, str]] = ...,
+    cpus: Optional[Set[int]] = ...,
+) -> Tuple[bytes, int, bool]: ...
+def same_output(
+    expected: bytes,
+    output: bytes,
+    mode: Optional[str] = ...,
+    tolerance: Optional[Tuple[float, float]] = ...,
+) -> bool: ...
+
+class ReferenceCache:
+    directory = ...  # type: Optional[str]
+    outputs = ...  # type: Dict[str, bytes]
+    def __init__(self, directory: Optional[str] = ...) -> None: ...
+    def path(self, key: str) -> str: ...
+    def get(self, key: str) -> Optional[bytes]: ...
+    def put(self, key: str, output: bytes) -> None: ...
+
+class DifferentialCase(TestCase):
+    reference = ...  # type: str
+    inputs = ...  # type: Tuple[str, ...]
+    generator = ...  # type: Optional[str]
+    count = ...  # type: int
+    match = ...  # type: str
+    tolerance = ...  # type: Optional[Tuple[float, float]]
+    base_dir = ...  # type: Optional[str]
+    cache = ...  # type: ReferenceCache
+    generated = ...  # type: Dict[int, bytes]
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        reference: str,
+        inputs: Optional[Sequence[str]] = ...,
+        generator: Optional[str] = ...,
+        count: Optional[int] = ...,
+        match: Optional[str] = ...,
+        tolerance: Optional[Tuple[float, float]] = ...,
+        base_dir: Optional[str] = ...,
+        cache: Optional[str] = ...,
+        **kwargs: Any
+    ) -> None: ...
+    def get_input(
+        self, index: int, timeout: float, env: Optional[Mapping[str, str]] = ...
+    ) -> Tuple[str, bytes]: ...
+    def get_reference_output(
+        self, label: str, data: bytes, timeout: float, env: Optional[Mapping[str, str]] = ...
+    ) -> bytes: ...
+    def check_input(
+        self,
+        index: int,
+        timeout: float,
+        cwd: Optional[str] = ...,
+        env: Optional[Mapping[str, str]] = ...,
+        cpus: Optional[Set[int]] = ...,
+    ) -> Tuple[str, Optional[str]]: ...
+    def run(
+        self,
+        defs: Optional[Mapping] = ...,
+        jailed: Optional[bool] = ...,
+        g_timeout: Optional[int] = ...,
+        cpu_time: Optional[bool] = ...,
+        cpus: Optional[Set[int]] = ...,
+        zygote: Optional[Zygote] = ...,
+        transcripts: Optional[str] = ...,
+        cwd: Optional[str] = ...,
+        env: Optional[Mapping[str, str]] = ...,
+        recordings: Optional[str] = ...,
+        replay: Optional[bool] = ...,
+    ) -> Mapping[str, Union[str, List[str]]]: ...
@@ -0,0 +1,667 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Matching of program output against expectations.
+
+A matcher is fed the output of the program chunk by chunk. When the output
+satisfies the expectation, the matcher returns the part of the last chunk
+that it didn't consume so that it can be passed on to the next expectation.
+
+Expectations with several alternatives are compiled into a single automaton
+that looks for all of them at once, reading every byte of the output once.
+
+Very large expected outputs can be given as digests that hold only a hash
+and the length of the output. The received output is hashed as it arrives.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import copy
+import hashlib
+import re
+
+import pexpect
+
+
+MATCH_MODES = ("regex", "literal", "whitespace", "nocase", "tokens", "numeric", "digest")
+"""Supported expectation matching modes."""
+
+_PIECES = re.compile(br"\s+|\S+")
+
+_TOKENS = re.compile(br"\S+")
+
+_MAX_CACHE = 512
+
+_RECEIVED_TAIL = 4096
+
+_cache = {}
+
+
+class Mismatch(Exception):
+    """Received output can not satisfy the expectation anymore."""
+
+    def __init__(self, offset):
+        """Initialize this error.
+
+        :sig: (Optional[int]) -> None
+        :param offset: Offset of the first differing byte in the expected output.
+        """
+        Exception.__init__(self, offset)
+
+        self.offset = offset  # sig: Optional[int]
+        """Offset of the first differing byte in the expected output, if known."""
+
+
+def _diff_offset(data, expected):
+    """Find the offset of the first difference between two byte strings.
+
+    :sig: (bytes, bytes) -> int
+    :param data: Received bytes.
+    :param expected: Expected bytes.
+    :return: Offset of the first differing byte.
+    """
+    index = 0
+    while data[index : index + 1] == expected[index : index + 1]:
+        index += 1
+    return index
+
+
+class EOFMatcher:
+    """A matcher that expects the program to terminate.
+
+    A matcher is compiled once from the expectation and a fresh copy
+    has to be started for every run since matchers keep state
+    about the output they've received so far.
+    """
+
+    def __init__(self):
+        """Initialize this matcher.
+
+        :sig: () -> None
+        """
+        self.received = None  # sig: Optional[bytes]
+        """Output that will be reported as received."""
+
+        self.reset()
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.received = None
+
+    def start(self):
+        """Get a fresh copy of this matcher for a new run.
+
+        :sig: () -> EOFMatcher
+        :return: Copy of this matcher with a clear state.
+        """
+        matcher = copy.copy(self)
+        matcher.reset()
+        return matcher
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        :raise Mismatch: When the output can not match anymore.
+        """
+        return None
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        return True
+
+
+class RegexMatcher(EOFMatcher):
+    """A matcher that searches for a regular expression in the output."""
+
+    def __init__(self, pattern):
+        """Initialize this matcher.
+
+        :sig: (Pattern) -> None
+        :param pattern: Compiled pattern to search for.
+        """
+        self.pattern = pattern  # sig: Pattern
+        EOFMatcher.__init__(self)
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.received = b""
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        """
+        buffer = self.received + data
+        match = self.pattern.search(buffer)
+        if match is None:
+            self.received = buffer
+            return None
+        self.received = match.group()
+        return buffer[match.end() :]
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        return False
+
+
+class LiteralMatcher(EOFMatcher):
+    """A matcher that compares the output with an expected text.
+
+    The comparison is anchored at the current position of the output
+    and only a cursor into the expected text is kept, so the output is
+    checked in linear time without being accumulated in memory.
+    """
+
+    def __init__(self, expected):
+        """Initialize this matcher.
+
+        :sig: (bytes) -> None
+        :param expected: Expected output.
+        """
+        self.expected = expected  # sig: bytes
+        self.cursor = 0  # sig: int
+        EOFMatcher.__init__(self)
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.cursor = 0
+        self.received = b""
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        :raise Mismatch: When the chunk differs from the expected output.
+        """
+        size = min(len(data), len(self.expected) - self.cursor)
+        chunk = data[:size] if size < len(data) else data
+        if not self.expected.startswith(chunk, self.cursor):
+            index = _diff_offset(chunk, self.expected[self.cursor : self.cursor + size])
+            self.received = chunk[index:]
+            raise Mismatch(self.cursor + index)
+        self.cursor += size
+        if self.cursor < len(self.expected):
+            return None
+        self.received = self.expected
+        return data[size:]
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        return self.cursor == len(self.expected)
+
+
+class TextMatcher(LiteralMatcher):
+    """A matcher that compares the output with a normalized text.
+
+    Letter case can be ignored, and runs of whitespace can be treated
+    as a single space where leading and trailing whitespace is ignored.
+    """
+
+    def __init__(self, expected, fold_case=False, collapse_space=False):
+        """Initialize this matcher.
+
+        :sig: (bytes, Optional[bool], Optional[bool]) -> None
+        :param expected: Expected output.
+        :param fold_case: Whether to ignore letter case.
+        :param collapse_space: Whether to treat runs of whitespace as one space.
+        """
+        if fold_case:
+            expected = expected.lower()
+        if collapse_space:
+            expected = b" ".join(expected.split())
+        self.fold_case = fold_case  # sig: bool
+        self.collapse_space = collapse_space  # sig: bool
+        self.spaced = True  # sig: bool
+        LiteralMatcher.__init__(self, expected)
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        LiteralMatcher.reset(self)
+        self.spaced = True
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        :raise Mismatch: When the chunk differs from the expected output.
+        """
+        text = data.lower() if self.fold_case else data
+        if not self.collapse_space:
+            rest = LiteralMatcher.feed(self, text)
+            return data[len(data) - len(rest) :] if rest is not None else None
+
+        if self.cursor == len(self.expected):
+            return data
+        for piece in _PIECES.finditer(text):
+            start, end = piece.span()
+            if text[start : start + 1].isspace():
+                if not self.spaced:
+                    if self.expected[self.cursor : self.cursor + 1] != b" ":
+                        self.received = text[start:]
+                        raise Mismatch(self.cursor)
+                    self.cursor += 1
+                    self.spaced = True
+                continue
+            size = min(end - start, len(self.expected) - self.cursor)
+            if not self.expected.startswith(text[start : start + size], self.cursor):
+                chunk = text[start : start + size]
+                index = _diff_offset(chunk, self.expected[self.cursor : self.cursor + size])
+                self.received = text[start + index :]
+                raise Mismatch(self.cursor + index)
+            self.cursor += size
+            self.spaced = False
+            if self.cursor == len(self.expected):
+                self.received = self.expected
+                return data[start + size :]
+        return None
+
+
+class TokenMatcher(EOFMatcher):
+    """A matcher that compares the output with expected tokens.
+
+    Tokens are separated by whitespace. If a tolerance is given,
+    numeric tokens are compared by value so that differences in formatting
+    and small errors are accepted. The last token has to be followed
+    by whitespace or the end of output.
+    """
+
+    def __init__(self, expected, tolerance=None):
+        """Initialize this matcher.
+
+        :sig: (bytes, Optional[Tuple[float, float]]) -> None
+        :param expected: Expected output.
+        :param tolerance: Absolute and relative tolerances for numeric tokens.
+        """
+        tokens = [(m.group(), m.start()) for m in _TOKENS.finditer(expected)]
+        self.tokens = [t for t, _ in tokens]  # sig: List[bytes]
+        self.offsets = [o for _, o in tokens]  # sig: List[int]
+        self.tolerance = tolerance  # sig: Optional[Tuple[float, float]]
+        self.index = 0  # sig: int
+        self.partial = b""  # sig: bytes
+        EOFMatcher.__init__(self)
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.index = 0
+        self.partial = b""
+        self.received = b""
+
+    def same(self, token, expected):
+        """Check whether a received token matches an expected token.
+
+        :sig: (bytes, bytes) -> bool
+        :param token: Received token.
+        :param expected: Expected token.
+        :return: Whether the tokens match.
+        """
+        if token == expected:
+            return True
+        if self.tolerance is None:
+            return False
+        try:
+            received_value, expected_value = float(token), float(expected)
+        except ValueError:
+            return False
+        abs_tol, rel_tol = self.tolerance
+        margin = max(abs_tol, rel_tol * max(abs(received_value), abs(expected_value)))
+        return abs(received_value - expected_value) <= margin
+
+    def check(self, token):
+        """Check a complete received token against the next expected token.
+
+        :sig: (bytes) -> None
+        :param token: Received token.
+        :raise Mismatch: When the token doesn't match.
+        """
+        if not self.same(token, self.tokens[self.index]):
+            self.received = token
+            raise Mismatch(self.offsets[self.index])
+        self.index += 1
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        :raise Mismatch: When a token differs from the expected one.
+        """
+        if self.index == len(self.tokens):
+            return data
+        for piece in _PIECES.finditer(data):
+            start, end = piece.span()
+            if not data[start : start + 1].isspace():
+                self.partial += data[start:end]
+                expected = self.tokens[self.index]
+                if (self.tolerance is None) and (not expected.startswith(self.partial)):
+                    self.received = self.partial
+                    raise Mismatch(self.offsets[self.index])
+                continue
+            if self.partial:
+                self.check(self.partial)
+                self.partial = b""
+                if self.index == len(self.tokens):
+                    self.received = b" ".join(self.tokens)
+                    return data[start:]
+        return None
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        if self.partial and (self.index < len(self.tokens)):
+            if self.same(self.partial, self.tokens[self.index]):
+                self.index += 1
+        return self.index == len(self.tokens)
+
+
+class AlternativesMatcher(EOFMatcher):
+    """A matcher that searches for any of several texts in the output.
+
+    The texts are compiled into an Aho-Corasick automaton. The alternative
+    whose first occurrence ends earliest in the output is matched,
+    the longest one if several end at the same position. Only the state of
+    the automaton is carried between chunks, along with a bounded tail
+    of the output for reporting.
+    """
+
+    def __init__(self, alternatives):
+        """Initialize this matcher.
+
+        :sig: (Sequence[bytes]) -> None
+        :param alternatives: Texts to search for.
+        """
+        self.alternatives = tuple(alternatives)  # sig: Tuple[bytes, ...]
+        self.goto = [{}]  # sig: List[Dict[int, int]]
+        self.fail = [0]  # sig: List[int]
+        self.output = [None]  # sig: List[Optional[int]]
+        self.build()
+
+        first = b"".join(re.escape(bytes(bytearray([b]))) for b in sorted(self.goto[0]))
+        self.skip = re.compile(b"[" + first + b"]") if first else None  # sig: Optional[Pattern]
+        self.state = 0  # sig: int
+        self.index = None  # sig: Optional[int]
+        EOFMatcher.__init__(self)
+
+    def build(self):
+        """Build the transitions, failure links and outputs of the automaton.
+
+        :sig: () -> None
+        """
+        for index, text in enumerate(self.alternatives):
+            state = 0
+            for byte in bytearray(text):
+                next_state = self.goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                    self.goto[state][byte] = next_state
+                state = next_state
+            if (state > 0) and (self.output[state] is None):
+                self.output[state] = index
+
+        queue = list(self.goto[0].values())
+        for state in queue:  # breadth first, the queue grows while iterating
+            for byte, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while (fallback > 0) and (byte not in self.goto[fallback]):
+                    fallback = self.fail[fallback]
+                link = self.goto[fallback].get(byte, 0)
+                self.fail[next_state] = link if link != next_state else 0
+                if self.output[next_state] is None:
+                    self.output[next_state] = self.output[self.fail[next_state]]
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.state = 0
+        self.index = None
+        self.received = b""
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        """
+        if self.index is not None:
+            return data
+        goto, fail, output = self.goto, self.fail, self.output
+        state = self.state
+        position = 0
+        size = len(data)
+        bytes_ = bytearray(data)
+        while position < size:
+            if state == 0:
+                if self.skip is None:
+                    break
+                found = self.skip.search(data, position)
+                if found is None:
+                    break
+                position = found.start()
+            byte = bytes_[position]
+            while (state > 0) and (byte not in goto[state]):
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            position += 1
+            if output[state] is not None:
+                self.index = output[state]
+                self.received = self.alternatives[self.index]
+                return data[position:]
+        self.state = state
+        self.received = (self.received + data)[-_RECEIVED_TAIL:]
+        return None
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        return False
+
+
+def format_digest(algorithm, hexdigest, length):
+    """Write the digest of an output as expected data.
+
+    :sig: (str, str, int) -> str
+    :param algorithm: Name of the hash algorithm.
+    :param hexdigest: Hash of the output, in hexadecimal.
+    :param length: Length of the output, in bytes.
+    :return: Expected data for a digest expectation.
+    """
+    return "%(a)s:%(h)s:%(n)d" % {"a": algorithm, "h": hexdigest, "n": length}
+
+
+def parse_digest(data):
+    """Read the digest of an output from expected data.
+
+    :sig: (str) -> Tuple[str, str, int]
+    :param data: Expected data of a digest expectation.
+    :return: Name of the hash algorithm, hash in hexadecimal, and length of the output.
+    :raise ValueError: When the data is not a valid digest.
+    """
+    algorithm, hexdigest, length = data.split(":")
+    size = hashlib.new(algorithm).digest_size
+    if (len(hexdigest) != 2 * size) or (int(length) < 0):
+        raise ValueError("Invalid digest")
+    int(hexdigest, 16)
+    return algorithm, hexdigest.lower(), int(length)
+
+
+class DigestMatcher(EOFMatcher):
+    """A matcher that compares the hash of the output with an expected digest.
+
+    Exactly as many bytes as the length of the expected output are hashed,
+    as they arrive. Only the state of the hash is kept, along with a bounded
+    tail of the output for reporting, so the memory use doesn't depend
+    on the size of the output.
+    """
+
+    def __init__(self, algorithm, hexdigest, length):
+        """Initialize this matcher.
+
+        :sig: (str, str, int) -> None
+        :param algorithm: Name of the hash algorithm.
+        :param hexdigest: Expected hash, in hexadecimal.
+        :param length: Expected length, in bytes.
+        """
+        self.algorithm = algorithm  # sig: str
+        self.hexdigest = hexdigest  # sig: str
+        self.length = length  # sig: int
+        self.hash = None  # sig: Any
+        self.count = 0  # sig: int
+        EOFMatcher.__init__(self)
+
+    def reset(self):
+        """Clear the state about the received output.
+
+        :sig: () -> None
+        """
+        self.hash = hashlib.new(self.algorithm)
+        self.count = 0
+        self.received = b""
+
+    def feed(self, data):
+        """Process a chunk of output.
+
+        :sig: (bytes) -> Optional[bytes]
+        :param data: Output chunk to process.
+        :return: Unconsumed part of the chunk if matched, ``None`` otherwise.
+        :raise Mismatch: When the hash of the output differs from the expected one.
+        """
+        size = min(len(data), self.length - self.count)
+        chunk = data[:size] if size < len(data) else data
+        self.hash.update(chunk)
+        self.count += size
+        self.received = (self.received + chunk)[-_RECEIVED_TAIL:]
+        if self.count < self.length:
+            return None
+        if self.hash.hexdigest() != self.hexdigest:
+            raise Mismatch(None)
+        return data[size:]
+
+    def eof(self):
+        """Check whether the end of output satisfies the expectation.
+
+        :sig: () -> bool
+        :return: Whether the expectation is satisfied.
+        """
+        return (self.count == self.length) and (self.hash.hexdigest() == self.hexdigest)
+
+
+def build_matcher(expected, mode="regex", tolerance=None):
+    """Build a matcher for an expected output, without caching it.
+
+    :sig: (bytes, Optional[str], Optional[Tuple[float, float]]) -> EOFMatcher
+    :param expected: Expected output.
+    :param mode: How to match the output.
+    :param tolerance: Absolute and relative tolerances for numeric matching.
+    :return: Matcher for the expected output.
+    """
+    if mode == "literal":
+        return LiteralMatcher(expected)
+    if mode == "whitespace":
+        return TextMatcher(expected, collapse_space=True)
+    if mode == "nocase":
+        return TextMatcher(expected, fold_case=True)
+    if mode == "tokens":
+        return TokenMatcher(expected)
+    if mode == "numeric":
+        return TokenMatcher(expected, tolerance=tolerance or (0, 0))
+    if mode == "digest":
+        return DigestMatcher(*parse_digest(expected.decode("ascii")))
+    return RegexMatcher(re.compile(expected, re.DOTALL))
+
+
+def compile_matcher(data, mode="regex", tolerance=None, encoding="utf-8"):
+    """Compile a matcher for an expectation.
+
+    Compiled matchers are cached and shared, so they have to be started
+    before they're fed any output.
+
+    :sig:
+        (
+            Union[str, Tuple[str, ...], Type[pexpect.EOF]],
+            Optional[str],
+            Optional[Tuple[float, float]],
+            Optional[str]
+        ) -> EOFMatcher
+    :param data: Expected output, alternatives for the output, or EOF marker.
+    :param mode: How to match the output.
+    :param tolerance: Absolute and relative tolerances for numeric matching.
+    :param encoding: Encoding of the output.
+    :return: Matcher for the expectation.
+    """
+    key = (data, mode, tolerance, encoding)
+    matcher = _cache.get(key)
+    if matcher is not None:
+        return matcher
+
+    if data is pexpect.EOF:
+        matcher = EOFMatcher()
+    elif isinstance(data, tuple):
+        matcher = AlternativesMatcher([d.encode(encoding) for d in data])
+    else:
+        matcher = build_matcher(data.encode(encoding), mode=mode, tolerance=tolerance)
+
+    if len(_cache) >= _MAX_CACHE:
+        _cache.clear()
+    _cache[key] = matcher
+    return matcher
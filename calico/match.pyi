@@ -0,0 +1,81 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple, Type, Union
+
+import pexpect
+
+class Mismatch(Exception):
+    offset = ...  # type: Optional[int]
+    def __init__(self, offset: Optional[int]) -> None: ...
+
+class EOFMatcher:
+    received = ...  # type: Optional[bytes]
+    def __init__(self) -> None: ...
+    def reset(self) -> None: ...
+    def start(self) -> EOFMatcher: ...
+    def feed(self, data: bytes) -> Optional[bytes]: ...
+    def eof(self) -> bool: ...
+
+class RegexMatcher(EOFMatcher):
+    pattern = ...  # type: Pattern
+    def __init__(self, pattern: Pattern) -> None: ...
+
+class LiteralMatcher(EOFMatcher):
+    expected = ...  # type: bytes
+    cursor = ...  # type: int
+    def __init__(self, expected: bytes) -> None: ...
+
+class TextMatcher(LiteralMatcher):
+    fold_case = ...  # type: bool
+    collapse_space = ...  # type: bool
+    spaced = ...  # type: bool
+    def __init__(
+        self,
+        expected: bytes,
+        fold_case: Optional[bool] = ...,
+        collapse_space: Optional[bool] = ...,
+    ) -> None: ...
+
+class TokenMatcher(EOFMatcher):
+    tokens = ...  # type: List[bytes]
+    offsets = ...  # type: List[int]
+    tolerance = ...  # type: Optional[Tuple[float, float]]
+    index = ...  # type: int
+    partial = ...  # type: bytes
+    def __init__(
+        self, expected: bytes, tolerance: Optional[Tuple[float, float]] = ...
+    ) -> None: ...
+    def same(self, token: bytes, expected: bytes) -> bool: ...
+    def check(self, token: bytes) -> None: ...
+
+class AlternativesMatcher(EOFMatcher):
+    alternatives = ...  # type: Tuple[bytes, ...]
+    goto = ...  # type: List[Dict[int, int]]
+    fail = ...  # type: List[int]
+    output = ...  # type: List[Optional[int]]
+    skip = ...  # type: Optional[Pattern]
+    state = ...  # type: int
+    index = ...  # type: Optional[int]
+    def __init__(self, alternatives: Sequence[bytes]) -> None: ...
+    def build(self) -> None: ...
+
+def format_digest(algorithm: str, hexdigest: str, length: int) -> str: ...
+def parse_digest(data: str) -> Tuple[str, str, int]: ...
+
+class DigestMatcher(EOFMatcher):
+    algorithm = ...  # type: str
+    hexdigest = ...  # type: str
+    length = ...  # type: int
+    hash = ...  # type: Any
+    count = ...  # type: int
+    def __init__(self, algorithm: str, hexdigest: str, length: int) -> None: ...
+
+def build_matcher(
+    expected: bytes, mode: Optional[str] = ..., tolerance: Optional[Tuple[float, float]] = ...
+) -> EOFMatcher: ...
+def compile_matcher(
+    data: Union[str, Tuple[str, ...], Type[pexpect.EOF]],
+    mode: Optional[str] = ...,
+    tolerance: Optional[Tuple[float, float]] = ...,
+    encoding: Optional[str] = ...,
+) -> EOFMatcher: ...
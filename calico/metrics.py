@@ -0,0 +1,246 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Progress and throughput metrics.
+
+The metrics are collected into a registry and can be exposed
+in the Prometheus text format, either through a local HTTP endpoint
+or through a file that is rewritten periodically.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60)
+"""Upper bounds of histogram buckets for durations, in seconds."""
+
+
+class Histogram:
+    """A distribution of observed values in cumulative buckets."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        """Initialize this histogram.
+
+        :sig: (Optional[Sequence[float]]) -> None
+        :param buckets: Upper bounds of buckets, in increasing order.
+        """
+        self.buckets = tuple(buckets)  # sig: Tuple[float, ...]
+        """Upper bounds of buckets."""
+
+        self.counts = [0] * (len(self.buckets) + 1)  # sig: List[int]
+        """Number of observations per bucket, the last one being unbounded."""
+
+        self.sum = 0  # sig: float
+        """Sum of all observed values."""
+
+    def observe(self, value):
+        """Add an observation to this histogram.
+
+        :sig: (float) -> None
+        :param value: Observed value.
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """A registry of metrics that can be updated from multiple threads."""
+
+    def __init__(self):
+        """Initialize this registry.
+
+        :sig: () -> None
+        """
+        self.counters = OrderedDict(
+            [
+                ("cases_total", ("counter", "Number of cases run.")),
+                ("cases_passed_total", ("counter", "Number of cases passed.")),
+                ("cases_failed_total", ("counter", "Number of cases failed.")),
+                ("timeouts_total", ("counter", "Number of expectations timed out.")),
+                ("leaked_processes_total", ("counter", "Number of leftover processes killed.")),
+                ("cases_replayed_total", ("counter", "Number of cases replayed.")),
+                ("differential_inputs_total", ("counter", "Number of inputs checked.")),
+                ("reference_runs_total", ("counter", "Number of reference outputs computed.")),
+                ("cases_running", ("gauge", "Number of cases currently running.")),
+            ]
+        )  # sig: Mapping[str, Tuple[str, str]]
+        """Types and descriptions of counters."""
+
+        self.histograms = OrderedDict(
+            [
+                ("spawn_seconds", "Time to start a tested program."),
+                ("case_duration_seconds", "Time to run a case."),
+            ]
+        )  # sig: Mapping[str, str]
+        """Descriptions of histograms."""
+
+        self.values = {}  # sig: Mapping[str, Union[int, Histogram]]
+        """Current values of metrics."""
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all metrics to their initial values.
+
+        :sig: () -> None
+        """
+        with self._lock:
+            self.values = {name: 0 for name in self.counters}
+            self.values.update({name: Histogram() for name in self.histograms})
+
+    def inc(self, name, amount=1):
+        """Increment a counter.
+
+        :sig: (str, Optional[int]) -> None
+        :param name: Name of counter.
+        :param amount: Amount to increment by, can be negative for gauges.
+        """
+        with self._lock:
+            self.values[name] += amount
+
+    def observe(self, name, value):
+        """Add an observation to a histogram.
+
+        :sig: (str, float) -> None
+        :param name: Name of histogram.
+        :param value: Observed value.
+        """
+        with self._lock:
+            self.values[name].observe(value)
+
+    def render(self):
+        """Get the current values in Prometheus text format.
+
+        :sig: () -> str
+        :return: Metrics as text.
+        """
+        lines = []
+        with self._lock:
+            for name, (type_, help_) in self.counters.items():
+                metric = "calico_" + name
+                lines.append("# HELP %(m)s %(h)s" % {"m": metric, "h": help_})
+                lines.append("# TYPE %(m)s %(t)s" % {"m": metric, "t": type_})
+                lines.append("%(m)s %(v)d" % {"m": metric, "v": self.values[name]})
+            for name, help_ in self.histograms.items():
+                metric = "calico_" + name
+                histogram = self.values[name]
+                lines.append("# HELP %(m)s %(h)s" % {"m": metric, "h": help_})
+                lines.append("# TYPE %(m)s histogram" % {"m": metric})
+                total = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    total += count
+                    bucket = {"m": metric, "b": bound, "c": total}
+                    lines.append('%(m)s_bucket{le="%(b)s"} %(c)d' % bucket)
+                lines.append("%(m)s_sum %(s)s" % {"m": metric, "s": repr(histogram.sum)})
+                lines.append("%(m)s_count %(c)d" % {"m": metric, "c": total})
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()  # sig: Metrics
+"""Registry of metrics collected by the runner."""
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """A handler that serves the current metrics over HTTP."""
+
+    def do_GET(self):
+        """Respond with the metrics in text format."""
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log requests."""
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve the metrics over HTTP in a background thread.
+
+    :sig: (int, Optional[str]) -> HTTPServer
+    :param port: Port number to listen on.
+    :param host: Address to listen on.
+    :return: Started server, to be shut down when done.
+    """
+    server = HTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def write_metrics(path):
+    """Write the metrics to a file.
+
+    The file is replaced atomically so that readers never see
+    a partially written file.
+
+    :sig: (str) -> None
+    :param path: Path of file to write.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(metrics.render())
+    os.rename(temp_path, path)
+
+
+class StatsWriter(threading.Thread):
+    """A thread that writes the metrics to a file periodically."""
+
+    def __init__(self, path, interval=5):
+        """Initialize this writer.
+
+        :sig: (str, Optional[float]) -> None
+        :param path: Path of file to write.
+        :param interval: Time between writes, in seconds.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.path = path  # sig: str
+        """Path of file to write."""
+
+        self.interval = interval  # sig: float
+        """Time between writes, in seconds."""
+
+        self._stopped = threading.Event()
+
+    def run(self):
+        """Write the metrics until stopped."""
+        while not self._stopped.wait(self.interval):
+            write_metrics(self.path)
+
+    def stop(self):
+        """Stop writing and write the final values.
+
+        :sig: () -> None
+        """
+        self._stopped.set()
+        self.join()
+        write_metrics(self.path)
@@ -0,0 +1,38 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import List, Mapping, Optional, Sequence, Tuple, Union
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+DURATION_BUCKETS = ...  # type: Tuple[float, ...]
+
+class Histogram:
+    buckets = ...  # type: Tuple[float, ...]
+    counts = ...  # type: List[int]
+    sum = ...  # type: float
+    def __init__(self, buckets: Optional[Sequence[float]] = ...) -> None: ...
+    def observe(self, value: float) -> None: ...
+
+class Metrics:
+    counters = ...  # type: Mapping[str, Tuple[str, str]]
+    histograms = ...  # type: Mapping[str, str]
+    values = ...  # type: Mapping[str, Union[int, Histogram]]
+    def __init__(self) -> None: ...
+    def reset(self) -> None: ...
+    def inc(self, name: str, amount: Optional[int] = ...) -> None: ...
+    def observe(self, name: str, value: float) -> None: ...
+    def render(self) -> str: ...
+
+metrics = ...  # type: Metrics
+
+class MetricsHandler(BaseHTTPRequestHandler): ...
+
+def serve_metrics(port: int, host: Optional[str] = ...) -> HTTPServer: ...
+def write_metrics(path: str) -> None: ...
+
+class StatsWriter(threading.Thread):
+    path = ...  # type: str
+    interval = ...  # type: float
+    def __init__(self, path: str, interval: Optional[float] = ...) -> None: ...
+    def stop(self) -> None: ...
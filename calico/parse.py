@@ -13,17 +13,336 @@
 # You should have received a copy of the GNU General Public License
 # along with Calico.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Specification parsing."""
+"""Specification parsing.
+
+Specifications are loaded with the C accelerated YAML parser if it's available.
+Instead of keeping all comments like a round-trip loader, only the comments
+at the ends of lines are collected by a simple scanner, since these are
+the only ones that can carry settings.
+
+Specifications can also be written in JSON or TOML, where timeouts are given
+as ``timeout`` fields instead of comments. All formats are built into
+test suites by the same code.
+
+A specification can also be streamed: its stages are loaded one at a time
+in a background thread while the cases parsed so far are being run.
+"""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import codecs
+import csv
+import glob
+import io
+import json
+import os
+from collections import OrderedDict
+from itertools import chain
+from threading import Event, Thread
+
 from ruamel import yaml
-from ruamel.yaml import comments
+from ruamel.yaml.composer import Composer
+from ruamel.yaml.constructor import ConstructorError, SafeConstructor
+from ruamel.yaml.events import SequenceEndEvent, SequenceStartEvent, StreamEndEvent
+from ruamel.yaml.nodes import MappingNode, ScalarNode
+from ruamel.yaml.resolver import VersionedResolver
 
-from .base import Action, ActionType, Calico, TestCase
+from .base import Action, ActionType, Calico, CaseTable, TestCase
+from .differential import DifferentialCase
+from .match import MATCH_MODES, parse_digest
 
 
-# sigalias: SpecNode = comments.CommentedMap
+try:
+    from ruamel.yaml.cyaml import CParser
+except ImportError:  # C extension not available
+    CParser = None
+
+try:
+    from tomllib import loads as load_toml
+except ImportError:  # Python < 3.11
+    try:
+        from tomli import loads as load_toml
+    except ImportError:  # not installed, or Python < 3.6
+        try:
+            from toml import loads as _toml_loads
+        except ImportError:  # TOML support not installed
+            load_toml = None
+        else:
+
+            def load_toml(content):
+                """Load a TOML document, keeping the order of the keys."""
+                return _toml_loads(content, _dict=OrderedDict)
+
+try:
+    from queue import Empty, Full, Queue
+except ImportError:  # Python 2
+    from Queue import Empty, Full, Queue
+
+# sigalias: SpecNode = Mapping[str, Any]
+
+
+SPEC_FORMATS = OrderedDict(
+    [(".yaml", "yaml"), (".yml", "yaml"), (".json", "json"), (".toml", "toml")]
+)
+"""Supported specification formats, keyed by file extension."""
+
+PREFETCH_SIZE = 16  # sig: int
+"""Number of stages to parse ahead of the running case when streaming."""
+
+PREFETCH_POLL = 0.1
+
+
+CASE_ATTRIBUTES = [
+    (
+        "command",
+        {
+            "names": ("r", "run"),
+            "val_func": isinstance,
+            "val_args": str,
+            "err_message": "%s: Run command must be a string",
+        },
+    ),
+    (
+        "points",
+        {
+            "names": ("p", "points"),
+            "val_func": isinstance,
+            "val_args": (int, float),
+            "err_message": "%s: Points value must be numeric",
+        },
+    ),
+    (
+        "blocker",
+        {
+            "names": ("b", "blocker"),
+            "val_func": isinstance,
+            "val_args": bool,
+            "err_message": "%s: Blocker value must be true or false",
+        },
+    ),
+    (
+        "exits",
+        {
+            "names": ("x", "exit", "return"),
+            "val_func": isinstance,
+            "val_args": int,
+            "err_message": "%s: Exit status value must be an integer",
+        },
+    ),
+    (
+        "visible",
+        {
+            "names": ("v", "visible"),
+            "val_func": isinstance,
+            "val_args": bool,
+            "err_message": "%s: Visibility value must be true or false",
+        },
+    ),
+    (
+        "smoke",
+        {
+            "names": ("smoke",),
+            "val_func": isinstance,
+            "val_args": bool,
+            "err_message": "%s: Smoke value must be true or false",
+        },
+    ),
+]
+"""Validation rules of case attributes, keyed by constructor parameter."""
+
+DIFFERENTIAL_ATTRIBUTES = [
+    (
+        "reference",
+        {
+            "names": ("reference",),
+            "val_func": isinstance,
+            "val_args": str,
+            "err_message": "%s: Reference command must be a string",
+        },
+    ),
+    (
+        "generator",
+        {
+            "names": ("generate",),
+            "val_func": isinstance,
+            "val_args": str,
+            "err_message": "%s: Generator command must be a string",
+        },
+    ),
+    (
+        "count",
+        {
+            "names": ("count",),
+            "val_func": lambda v: isinstance(v, int) and (v > 0),
+            "val_args": None,
+            "err_message": "%s: Input count must be a positive integer",
+        },
+    ),
+    (
+        "cache",
+        {
+            "names": ("cache",),
+            "val_func": isinstance,
+            "val_args": str,
+            "err_message": "%s: Cache directory must be a string",
+        },
+    ),
+]
+"""Validation rules of differential case attributes, keyed by constructor parameter."""
+
+ACTION_TYPES = {i: m for m in ActionType for i in m.value}
+"""Action types, keyed by their long and short names."""
+
+
+class SpecMap(OrderedDict):
+    """A mapping in a specification, with the comments at the ends of its lines."""
+
+    def __init__(self):
+        """Initialize this mapping.
+
+        :sig: () -> None
+        """
+        OrderedDict.__init__(self)
+
+        self.comments = {}  # sig: Dict[str, str]
+        """Texts of comments after the scalar values, keyed by the names of settings."""
+
+
+def scan_comments(content):
+    """Find the comments at the ends of lines.
+
+    Quotes are only tracked within a line, which is enough
+    for the comments after scalar values.
+
+    :sig: (str) -> Dict[int, str]
+    :param content: Text to scan.
+    :return: Texts of comments without the leading hash, keyed by line number.
+    """
+    found = {}
+    for number, line in enumerate(content.splitlines()):
+        if "#" not in line:
+            continue
+        quote = None
+        index = 0
+        while index < len(line):
+            char = line[index]
+            if quote is not None:
+                if (quote == '"') and (char == "\\"):
+                    index += 1
+                elif char == quote:
+                    quote = None
+            elif char in "'\"":
+                quote = char
+            elif (char == "#") and ((index == 0) or line[index - 1].isspace()):
+                found[number] = line[index + 1 :].strip()
+                break
+            index += 1
+    return found
+
+
+class SpecConstructor(SafeConstructor):
+    """A constructor that keeps the comments after the values in mappings."""
+
+    def construct_spec_map(self, node):
+        """Construct a mapping along with its comments.
+
+        :sig: (MappingNode) -> Iterator[SpecMap]
+        :param node: Node to construct the mapping from.
+        :return: Constructed mapping.
+        """
+        data = SpecMap()
+        yield data
+        self.flatten_mapping(node)
+        for key_node, value_node in node.value:
+            key = self.construct_object(key_node)
+            if key in data:
+                raise ConstructorError(
+                    "while constructing a mapping",
+                    node.start_mark,
+                    "found duplicate key %(k)r" % {"k": key},
+                    key_node.start_mark,
+                )
+            data[key] = self.construct_object(value_node)
+            if isinstance(value_node, ScalarNode):
+                block = value_node.style in ("|", ">")
+                mark = value_node.start_mark if block else value_node.end_mark
+                comment = self.comment_lines.get(mark.line)
+                if comment is not None:
+                    data.comments[key] = comment
+
+    def construct_untagged(self, node):
+        """Construct a node with an unknown tag as if it had no tag.
+
+        :sig: (Node) -> Any
+        :param node: Node to construct.
+        :return: Constructed value.
+        """
+        if isinstance(node, ScalarNode):
+            return self.construct_scalar(node)
+        if isinstance(node, MappingNode):
+            return next(self.construct_spec_map(node))
+        return self.construct_sequence(node)
+
+
+SpecConstructor.add_constructor("tag:yaml.org,2002:map", SpecConstructor.construct_spec_map)
+SpecConstructor.add_constructor(None, SpecConstructor.construct_untagged)
+
+
+if CParser is not None:
+
+    class SpecLoader(CParser, SpecConstructor, VersionedResolver):
+        """A loader for specifications that uses the C parser."""
+
+        def __init__(self, content):
+            """Initialize this loader.
+
+            :sig: (str) -> None
+            :param content: Specification to load.
+            """
+            CParser.__init__(self, content)
+            self._parser = self._composer = self
+            SpecConstructor.__init__(self, loader=self)
+            VersionedResolver.__init__(self, loader=self)
+            self.comment_lines = scan_comments(content)
+
+
+else:
+    from ruamel.yaml.parser import Parser
+    from ruamel.yaml.reader import Reader
+    from ruamel.yaml.scanner import Scanner
+
+    class SpecLoader(Reader, Scanner, Parser, Composer, SpecConstructor, VersionedResolver):
+        """A loader for specifications that uses the pure Python parser."""
+
+        def __init__(self, content):
+            """Initialize this loader.
+
+            :sig: (str) -> None
+            :param content: Specification to load.
+            """
+            self.comment_handling = None
+            Reader.__init__(self, content, loader=self)
+            Scanner.__init__(self, loader=self)
+            Parser.__init__(self, loader=self)
+            Composer.__init__(self, loader=self)
+            SpecConstructor.__init__(self, loader=self)
+            VersionedResolver.__init__(self, loader=self)
+            self.comment_lines = scan_comments(content)
+
+
+def load_spec(content):
+    """Load the structure of a specification.
+
+    :sig: (str) -> Any
+    :param content: Specification to load.
+    :return: Loaded structure, with mappings as spec maps.
+    :raise yaml.YAMLError: When the content is not valid YAML.
+    """
+    loader = SpecLoader(content)
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
 
 
 def get_comment_value(node, name, field):
@@ -35,10 +354,7 @@ def get_comment_value(node, name, field):
     :param field: Name of comment field.
     :return: Value of comment field.
     """
-    try:
-        comment = node.ca.items[name][2].value[1:].strip()  # remove the leading hash
-    except KeyError:
-        comment = None
+    comment = getattr(node, "comments", {}).get(name)
     if comment is not None:
         delim = field + ":"
         if comment.startswith(delim):
@@ -46,6 +362,28 @@ def get_comment_value(node, name, field):
     return None
 
 
+def get_timeout(node, name, test_name):
+    """Get the timeout of a node, given either as a field or as a comment.
+
+    :sig: (SpecNode, str, str) -> Optional[int]
+    :param node: Node to get the timeout of.
+    :param name: Name of the setting that the comment would follow.
+    :param test_name: Name of the test.
+    :return: Timeout value, ``None`` if there is none.
+    """
+    message = "%(t)s: Timeout value must be an integer" % {"t": test_name}
+    timeout = node.get("timeout")
+    if timeout is not None:
+        assert isinstance(timeout, int) and (not isinstance(timeout, bool)), message
+        assert timeout >= 0, message
+        return timeout
+    comment = get_comment_value(node, name=name, field="timeout")
+    if comment is not None:
+        assert comment.isdigit(), message
+        return int(comment)
+    return None
+
+
 def get_attribute(node, test_name, names, val_func, val_args, err_message):
     """Get the value of a test attribute.
 
@@ -68,128 +406,553 @@ def get_attribute(node, test_name, names, val_func, val_args, err_message):
     return attr
 
 
-def parse_spec(content):
-    """Parse a test specification.
+def get_table(node, test_name, base_dir):
+    """Get the substitution table of a parameterized case.
 
-    :sig: (str) -> Calico
-    :param content: Specification to parse.
-    :return: Created Calico runner.
+    The table is either given as a sequence of mappings, or as the path
+    of a CSV file where the first line contains the column names.
+
+    :sig: (Union[SpecNode, str], str, str) -> Tuple[List[str], List[Tuple[Any, ...]]]
+    :param node: Node of the table.
+    :param test_name: Name of the test.
+    :param base_dir: Directory to resolve relative file paths against.
+    :return: Column names and rows of values.
+    """
+    if isinstance(node, str):
+        path = os.path.join(base_dir, node)
+        assert os.path.isfile(path), "%(t)s: Table file not found" % {"t": test_name}
+        with io.open(path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            columns = next(reader, [])
+            rows = [tuple(r) for r in reader if len(r) > 0]
+        assert all(
+            len(r) == len(columns) for r in rows
+        ), "%(t)s: Table rows must have the same columns" % {"t": test_name}
+    else:
+        assert isinstance(node, list) and all(
+            isinstance(r, dict) for r in node
+        ), "%(t)s: Table must be a list of mappings or a file name" % {"t": test_name}
+        columns = list(node[0].keys()) if len(node) > 0 else []
+        assert all(
+            set(r.keys()) == set(columns) for r in node
+        ), "%(t)s: Table rows must have the same columns" % {"t": test_name}
+        rows = [tuple(r[c] for c in columns) for r in node]
+    assert len(rows) > 0, "%(t)s: Table has no rows" % {"t": test_name}
+    return columns, rows
+
+
+def parse_settings(config, name, node):
+    """Parse a section of suite-wide settings.
+
+    :sig: (Config, str, SpecNode) -> None
+    :param config: Settings to update.
+    :param name: Name of the section.
+    :param node: Specification of the settings.
     :raise AssertionError: When given specification is invalid.
     """
-    try:
-        spec = yaml.round_trip_load(content)
-    except yaml.YAMLError as e:
-        raise AssertionError(str(e))
+    for section, section_value in node.items():
+        if (name == "_define") and (section == "vars"):
+            config.vars = dict(section_value)
+        elif (name == "_define") and (section == "zygote"):
+            assert isinstance(section_value, str), "Zygote interpreter must be a string"
+            config.zygote = section_value
+        elif (name == "_define") and (section == "preload"):
+            assert isinstance(section_value, list) and all(
+                isinstance(m, str) for m in section_value
+            ), "Preload modules must be a list of names"
+            config.preload = list(section_value)
+        elif (name == "_define") and (section == "encoding"):
+            assert isinstance(section_value, str), "Encoding must be a string"
+            try:
+                codecs.lookup(section_value)
+            except LookupError:
+                raise AssertionError("Unknown encoding: %(e)s" % {"e": section_value})
+            config.encoding = section_value
+        else:
+            config.extras[name + "_" + section] = section_value
+
+
+def get_tolerance(node, test_name):
+    """Get the tolerances for numeric matching.
+
+    :sig: (SpecNode, str) -> Optional[Tuple[float, float]]
+    :param node: Node to get the tolerances of.
+    :param test_name: Name of the test.
+    :return: Absolute and relative tolerances, ``None`` if not given.
+    """
+    tolerance = [node.get(t) for t in ("abs_tol", "rel_tol")]
+    if tolerance == [None, None]:
+        return None
+    tolerance = [t if t is not None else 0 for t in tolerance]
+    assert all(
+        isinstance(t, (int, float)) for t in tolerance
+    ), "%(t)s: Tolerance value must be numeric" % {"t": test_name}
+    return tuple(tolerance)
+
+
+def parse_differential(test_name, test, base_dir, kwargs):
+    """Parse the specification of a differential case.
+
+    :sig: (str, SpecNode, str, Mapping[str, Any]) -> DifferentialCase
+    :param test_name: Name of the case.
+    :param test: Specification of the case.
+    :param base_dir: Directory to resolve relative file paths against.
+    :param kwargs: Common settings of the case.
+    :return: Created case.
+    :raise AssertionError: When given specification is invalid.
+    """
+    options = dict(kwargs)
+    for kwarg, attr in DIFFERENTIAL_ATTRIBUTES:
+        attr_ = get_attribute(test, test_name, **attr)
+        if attr_ is not None:
+            options[kwarg] = attr_
+
+    message = "%(t)s: Differential cases can't have scripts or tables" % {"t": test_name}
+    assert (test.get("script") is None) and (test.get("table") is None), message
+
+    inputs = test.get("inputs")
+    message = "%(t)s: Differential cases need either inputs or a generator" % {"t": test_name}
+    assert (inputs is None) == ("generator" in options), message
+    if inputs is not None:
+        patterns = [inputs] if isinstance(inputs, str) else inputs
+        assert isinstance(patterns, list) and all(
+            isinstance(p, str) for p in patterns
+        ), "%(t)s: Inputs must be file name patterns" % {"t": test_name}
+        paths = {p for i in patterns for p in glob.glob(os.path.join(base_dir, i))}
+        assert len(paths) > 0, "%(t)s: No input files found" % {"t": test_name}
+        options["inputs"] = sorted(paths)
+
+    match = test.get("match")
+    if match is not None:
+        assert match in MATCH_MODES, "%(t)s: Unknown match mode" % {"t": test_name}
+        message = "%(t)s: Reference outputs can't be matched as patterns" % {"t": test_name}
+        assert match not in ("regex", "digest"), message
+        options["match"] = match
+
+    tolerance = get_tolerance(test, test_name)
+    if tolerance is not None:
+        options["tolerance"] = tolerance
+
+    if "cache" in options:
+        options["cache"] = os.path.join(base_dir, options["cache"])
+
+    return DifferentialCase(test_name, base_dir=base_dir, **options)
+
+
+def parse_alternatives(test_name, data, encoding="utf-8"):
+    """Parse the alternatives of an expectation, and their branches.
+
+    Alternatives are given as a list of texts, or as a mapping from texts
+    to the scripts to continue with when they're matched.
+
+    :sig:
+        (
+            str,
+            Any,
+            Optional[str]
+        ) -> Tuple[Tuple[str, ...], Optional[Tuple[Tuple[Action, ...], ...]]]
+    :param test_name: Name of the test.
+    :param data: Alternatives in the specification.
+    :param encoding: Encoding of the input and output of the program.
+    :return: Alternatives, and their branches if given.
+    :raise AssertionError: When given alternatives are invalid.
+    """
+    alternatives = tuple(data)
+    assert len(alternatives) > 0, "%(t)s: No alternatives" % {"t": test_name}
+    assert all(
+        isinstance(a, str) and (len(a) > 0) for a in alternatives
+    ), "%(t)s: Alternatives must be nonempty strings" % {"t": test_name}
+    if not isinstance(data, dict):
+        return alternatives, None
+    scripts = [data[a] if data[a] is not None else [] for a in alternatives]
+    branches = tuple(tuple(parse_script(test_name, s, encoding=encoding)) for s in scripts)
+    return alternatives, branches
+
+
+def parse_script(test_name, script, encoding="utf-8"):
+    """Parse the script of a case.
+
+    :sig: (str, List[SpecNode], Optional[str]) -> List[Action]
+    :param test_name: Name of the test.
+    :param script: Steps of the script.
+    :param encoding: Encoding of the input and output of the program.
+    :return: Created actions.
+    :raise AssertionError: When given script is invalid.
+    """
+    assert isinstance(script, list), "%(t)s: Script must be a list of actions" % {
+        "t": test_name
+    }
+    actions = []
+    for step in script:
+        action_type = next(iter(step.keys()), None)
+        if action_type not in ACTION_TYPES:
+            # other formats may not keep the order of fields
+            action_type = next((k for k in step if k in ACTION_TYPES), action_type)
+        assert action_type in ACTION_TYPES, "%(t)s: Unknown action type" % {"t": test_name}
+        data = step[action_type]
+
+        options = {"encoding": encoding}
+
+        timeout = get_timeout(step, action_type, test_name)
+        if timeout is not None:
+            options["timeout"] = timeout
+
+        match = step.get("match")
+        if match is not None:
+            assert match in MATCH_MODES, "%(t)s: Unknown match mode" % {"t": test_name}
+            options["match"] = match
+
+        expecting = ACTION_TYPES[action_type] == ActionType.EXPECT
+        if expecting and isinstance(data, (list, dict)):
+            message = "%(t)s: Alternatives can only be matched literally" % {"t": test_name}
+            assert match in (None, "literal"), message
+            data, options["branches"] = parse_alternatives(test_name, data, encoding=encoding)
+        else:
+            assert isinstance(data, str), "%(t)s: Action data must be a string" % {
+                "t": test_name
+            }
+
+        if expecting and (match == "digest"):
+            try:
+                parse_digest(data)
+            except ValueError:
+                raise AssertionError("%(t)s: Invalid digest" % {"t": test_name})
+
+        tolerance = get_tolerance(step, test_name)
+        if tolerance is not None:
+            options["tolerance"] = tolerance
 
+        actions.append(Action(ACTION_TYPES[action_type], data, **options))
+    return actions
+
+
+def parse_case(test_name, test, base_dir, encoding="utf-8"):
+    """Parse the specification of a case.
+
+    :sig: (str, SpecNode, str, Optional[str]) -> Union[TestCase, CaseTable, DifferentialCase]
+    :param test_name: Name of the case.
+    :param test: Specification of the case.
+    :param base_dir: Directory to resolve relative file paths against.
+    :param encoding: Encoding of the input and output of the program.
+    :return: Created case, or table of cases.
+    :raise AssertionError: When given specification is invalid.
+    """
+    kwargs = {}
+    for kwarg, attr in CASE_ATTRIBUTES:
+        attr_ = get_attribute(test, test_name, **attr)
+        if attr_ is not None:
+            kwargs[kwarg] = attr_
+
+    assert "command" in kwargs, "%(t)s: No run command" % {"t": test_name}
+
+    timeout = get_timeout(test, "run", test_name)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+
+    if test.get("reference") is not None:
+        return parse_differential(test_name, test, base_dir, kwargs)
+
+    script = test.get("script")
+    if script is None:
+        # If there's no script, just expect EOF.
+        actions = [Action(ActionType.EXPECT, "_EOF_", timeout=kwargs.get("timeout", -1))]
+    else:
+        actions = parse_script(test_name, script, encoding=encoding)
+
+    case = TestCase(test_name, script=actions, **kwargs)
+    table = test.get("table")
+    if table is not None:
+        columns, rows = get_table(table, test_name, base_dir)
+        case = CaseTable(case, columns, rows)
+    return case
+
+
+def load_document(content, format="yaml"):
+    """Load the stages of a specification in any of the supported formats.
+
+    A YAML or JSON specification is a sequence of stages, whereas
+    a TOML specification is a table where the stages are under ``stages``.
+
+    :sig: (str, Optional[str]) -> Any
+    :param content: Specification to load.
+    :param format: Format of the specification.
+    :return: Loaded stages, ``None`` if there are none.
+    :raise AssertionError: When the content can't be loaded.
+    """
+    if format == "yaml":
+        try:
+            return load_spec(content)
+        except yaml.YAMLError as e:
+            raise AssertionError(str(e))
+    if content.strip() == "":
+        return None
+    if format == "json":
+        try:
+            return json.loads(content, object_pairs_hook=OrderedDict)
+        except ValueError as e:
+            raise AssertionError(str(e))
+    if format == "toml":
+        message = "TOML specifications require Python 3.11 or later, or the toml package"
+        assert load_toml is not None, message
+        try:
+            document = load_toml(content)
+        except ValueError as e:
+            raise AssertionError(str(e))
+        return document.get("stages") if len(document) > 0 else None
+    raise AssertionError("Unknown specification format")
+
+
+def build_spec(spec, base_dir=None, errors=None):
+    """Build a test suite from the loaded stages of a specification.
+
+    If a list for errors is given, the errors in cases are collected into it
+    and the invalid cases are left out, instead of stopping at the first one.
+
+    :sig: (Any, Optional[str], Optional[List[str]]) -> Calico
+    :param spec: Loaded stages.
+    :param base_dir: Directory to resolve relative file paths against.
+    :param errors: List to collect the errors in cases into.
+    :return: Created Calico runner.
+    :raise AssertionError: When given specification is invalid.
+    """
     if spec is None:
         raise AssertionError("No test specification")
 
-    if not isinstance(spec, comments.CommentedSeq):
+    if not isinstance(spec, list):
         raise AssertionError("Invalid test specification")
 
-    action_types = {i: m for m in ActionType for i in m.value}
-
     runner = Calico()
+    base_dir = base_dir or os.getcwd()
 
     tests = [(n, t) for c in spec for n, t in c.items()]
-    attributes = [
-        (
-            "command",
-            {
-                "names": ("r", "run"),
-                "val_func": isinstance,
-                "val_args": str,
-                "err_message": "%s: Run command must be a string",
-            },
-        ),
-        (
-            "points",
-            {
-                "names": ("p", "points"),
-                "val_func": isinstance,
-                "val_args": (int, float),
-                "err_message": "%s: Points value must be numeric",
-            },
-        ),
-        (
-            "blocker",
-            {
-                "names": ("b", "blocker"),
-                "val_func": isinstance,
-                "val_args": bool,
-                "err_message": "%s: Blocker value must be true or false",
-            },
-        ),
-        (
-            "exits",
-            {
-                "names": ("x", "exit", "return"),
-                "val_func": isinstance,
-                "val_args": int,
-                "err_message": "%s: Exit status value must be an integer",
-            },
-        ),
-        (
-            "visible",
-            {
-                "names": ("v", "visible"),
-                "val_func": isinstance,
-                "val_args": bool,
-                "err_message": "%s: Visibility value must be true or false",
-            },
-        ),
-    ]
+    # settings apply to all cases, wherever they are given
+    settings = [(n, t) for n, t in tests if n[0] == "_"]
+    cases = [(n, t) for n, t in tests if n[0] != "_"]
+    for test_name, test in settings + cases:
+        try:
+            if test_name[0] == "_":
+                parse_settings(runner.config, test_name, test)
+            else:
+                encoding = runner.config.encoding
+                runner.add_case(parse_case(test_name, test, base_dir, encoding=encoding))
+        except AssertionError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
 
-    for test_name, test in tests:
-        if test_name[0] == "_":
-            for section, section_value in test.items():
-                runner[test_name + "_" + section] = section_value
-            continue
+    return runner
 
-        kwargs = {}
-        for kwarg, attr in attributes:
-            attr_ = get_attribute(test, test_name, **attr)
-            if attr_ is not None:
-                kwargs[kwarg] = attr_
 
-        assert "command" in kwargs, "%(t)s: No run command" % {"t": test_name}
+def parse_spec(content, base_dir=None, errors=None, format="yaml"):
+    """Parse a test specification.
+
+    If a list for errors is given, the errors in cases are collected into it
+    and the invalid cases are left out, instead of stopping at the first one.
+
+    :sig: (str, Optional[str], Optional[List[str]], Optional[str]) -> Calico
+    :param content: Specification to parse.
+    :param base_dir: Directory to resolve relative file paths against.
+    :param errors: List to collect the errors in cases into.
+    :param format: Format of the specification, ``yaml``, ``json`` or ``toml``.
+    :return: Created Calico runner.
+    :raise AssertionError: When given specification is invalid.
+    """
+    spec = load_document(content, format=format)
+    return build_spec(spec, base_dir=base_dir, errors=errors)
 
-        timeout = get_comment_value(test, name="run", field="timeout")
-        if timeout is not None:
-            assert timeout.isdigit(), "%(t)s: Timeout value must be an integer" % {
-                "t": test_name
-            }
-            kwargs["timeout"] = int(timeout)
 
-        case = TestCase(test_name, **kwargs)
+def iter_stages(content, format="yaml"):
+    """Load the stages of a specification one at a time.
 
-        script = test.get("script")
-        if script is None:
-            # If there's no script, just expect EOF.
-            action = Action(ActionType.EXPECT, "_EOF_", timeout=case.timeout)
-            case.add_action(action)
+    Only YAML specifications are loaded incrementally, the other formats
+    are loaded as a whole before the first stage is produced.
+
+    :sig: (str, Optional[str]) -> Iterator[SpecNode]
+    :param content: Specification to load.
+    :param format: Format of the specification.
+    :return: Loaded stages, in order.
+    :raise AssertionError: When the content can't be loaded.
+    """
+    if format != "yaml":
+        spec = load_document(content, format=format)
+        assert spec is not None, "No test specification"
+        assert isinstance(spec, list), "Invalid test specification"
+        for stage in spec:
+            yield stage
+        return
+
+    loader = SpecLoader(content)
+    composer = Composer(loader=loader)
+    try:
+        loader.get_event()  # stream start
+        assert not loader.check_event(StreamEndEvent), "No test specification"
+        loader.get_event()  # document start
+        if not loader.check_event(SequenceStartEvent):
+            spec = loader.construct_document(composer.compose_node(None, None))
+            assert spec is not None, "No test specification"
+            raise AssertionError("Invalid test specification")
+        loader.get_event()
+        index = 0
+        while not loader.check_event(SequenceEndEvent):
+            yield loader.construct_document(composer.compose_node(None, index))
+            index += 1
+        loader.get_event()
+        loader.get_event()  # document end
+        assert loader.check_event(StreamEndEvent), "Expected a single document"
+    except yaml.YAMLError as e:
+        raise AssertionError(str(e))
+    finally:
+        loader.dispose()
+
+
+def prefetch(items, size=PREFETCH_SIZE):
+    """Produce items in a background thread, keeping some of them ready.
+
+    The producing thread stops when the consumer stops asking for items.
+    Errors in producing items are raised when the item would be consumed.
+
+    :sig: (Iterable[Any], Optional[int]) -> Iterator[Any]
+    :param items: Items to produce.
+    :param size: Maximum number of items to keep ready.
+    :return: Produced items, in order.
+    """
+    queue = Queue(size)
+    stopped = Event()
+    done = object()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                queue.put(entry, timeout=PREFETCH_POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((None, e))
         else:
-            for step in script:
-                action_type, data = [(k, v) for k, v in step.items()][0]
-                assert action_type in action_types, "%(t)s: Unknown action type" % {
-                    "t": test_name
-                }
-                assert isinstance(data, str), "%(t)s: Action data must be a string" % {
-                    "t": test_name
-                }
+            put((done, None))
+
+    thread = Thread(target=produce, name="calico-prefetch")
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stopped.set()
+        try:
+            while True:  # unblock the producer
+                queue.get_nowait()
+        except Empty:
+            pass
+        thread.join()
+
+
+def stream_spec(content, base_dir=None, errors=None, format="yaml"):
+    """Parse a test specification while its cases are being run.
+
+    The settings stages, which have to come before the cases, are parsed
+    before returning. The cases are parsed in the background as they are
+    consumed, and they are not kept in the returned suite, which only
+    collects their points. The cases can be given to :meth:`Calico.run`.
+
+    If a list for errors is given, the errors in cases are collected into it
+    and the invalid cases are left out, instead of stopping at the first one.
+
+    :sig:
+        (
+            str,
+            Optional[str],
+            Optional[List[str]],
+            Optional[str]
+        ) -> Tuple[Calico, Iterator[Union[TestCase, CaseTable]]]
+    :param content: Specification to parse.
+    :param base_dir: Directory to resolve relative file paths against.
+    :param errors: List to collect the errors in cases into.
+    :param format: Format of the specification, ``yaml``, ``json`` or ``toml``.
+    :return: Suite with the settings, and the cases to run.
+    :raise AssertionError: When given specification is invalid.
+    """
+    runner = Calico()
+    base_dir = base_dir or os.getcwd()
+
+    tests = ((n, t) for c in iter_stages(content, format=format) for n, t in c.items())
+    first = []
+    for test_name, test in tests:
+        if test_name[0] != "_":
+            first.append((test_name, test))
+            break
+        try:
+            parse_settings(runner.config, test_name, test)
+        except AssertionError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
+
+    def parse_cases():
+        for test_name, test in chain(first, tests):
+            try:
+                message = "%(t)s: Settings must come before the cases" % {"t": test_name}
+                assert test_name[0] != "_", message
+                case = parse_case(test_name, test, base_dir, encoding=runner.config.encoding)
+            except AssertionError as e:
+                if errors is None:
+                    raise
+                errors.append(str(e))
+                continue
+            runner.points += case.points if case.points is not None else 0
+            yield case
+
+    return runner, prefetch(parse_cases())
+
+
+def spec_format(path):
+    """Get the format of a specification file from its extension.
+
+    :sig: (str) -> str
+    :param path: Path of the specification file.
+    :return: Format of the specification, YAML if the extension is not known.
+    """
+    return SPEC_FORMATS.get(os.path.splitext(path)[1].lower(), "yaml")
+
 
-                kwargs = {}
+def parse_spec_file(path, errors=None):
+    """Parse a test specification file.
 
-                timeout = get_comment_value(step, name=action_type, field="timeout")
-                if timeout is not None:
-                    assert timeout.isdigit(), "%(t)s: Timeout value must be an integer" % {
-                        "t": test_name
-                    }
-                    kwargs["timeout"] = int(timeout)
+    :sig: (str, Optional[List[str]]) -> Calico
+    :param path: Path of the specification file.
+    :param errors: List to collect the errors in cases into.
+    :return: Created Calico runner.
+    :raise AssertionError: When given specification is invalid.
+    """
+    with io.open(path, encoding="utf-8") as f:
+        content = f.read()
+    base_dir = os.path.dirname(os.path.abspath(path))
+    return parse_spec(content, base_dir=base_dir, errors=errors, format=spec_format(path))
 
-                action = Action(action_types[action_type], data, **kwargs)
-                case.add_action(action)
 
-        runner.add_case(case)
+def validate_spec(path):
+    """Check a specification file for errors.
 
-    return runner
+    :sig: (str) -> List[str]
+    :param path: Path of the specification file.
+    :return: Errors in the specification, empty if it's valid.
+    """
+    errors = []
+    try:
+        parse_spec_file(path, errors=errors)
+    except (AssertionError, IOError, UnicodeDecodeError) as e:
+        errors.append(str(e))
+    return errors
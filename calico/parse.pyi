@@ -1,13 +1,49 @@
 # THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
 
-from typing import Any, Callable, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from ruamel.yaml import comments
-from .base import Calico
+from collections import OrderedDict
+from ruamel.yaml.constructor import SafeConstructor
+from ruamel.yaml.nodes import MappingNode, Node
+from .base import Action, ActionType, Calico, CaseTable, Config, TestCase
+from .differential import DifferentialCase
 
-SpecNode = comments.CommentedMap
+SPEC_FORMATS = ...  # type: OrderedDict[str, str]
+PREFETCH_SIZE = ...  # type: int
+CASE_ATTRIBUTES = ...  # type: List[Tuple[str, Dict[str, Any]]]
+DIFFERENTIAL_ATTRIBUTES = ...  # type: List[Tuple[str, Dict[str, Any]]]
+ACTION_TYPES = ...  # type: Dict[str, ActionType]
 
+class SpecMap(OrderedDict):
+    comments = ...  # type: Dict[str, str]
+    def __init__(self) -> None: ...
+
+SpecNode = SpecMap
+
+def scan_comments(content: str) -> Dict[int, str]: ...
+
+class SpecConstructor(SafeConstructor):
+    def construct_spec_map(self, node: MappingNode) -> Iterator[SpecMap]: ...
+    def construct_untagged(self, node: Node) -> Any: ...
+
+class SpecLoader(SpecConstructor):
+    comment_lines = ...  # type: Dict[int, str]
+    def __init__(self, content: str) -> None: ...
+
+def load_spec(content: str) -> Any: ...
 def get_comment_value(node: SpecNode, name: str, field: str) -> str: ...
+def get_timeout(node: SpecNode, name: str, test_name: str) -> Optional[int]: ...
 def get_attribute(
     node: SpecNode,
     test_name: str,
@@ -16,4 +52,41 @@ def get_attribute(
     val_args: Any,
     err_message: str,
 ) -> Any: ...
-def parse_spec(content: str) -> Calico: ...
+def get_table(
+    node: Union[SpecNode, str], test_name: str, base_dir: str
+) -> Tuple[List[str], List[Tuple[Any, ...]]]: ...
+def parse_settings(config: Config, name: str, node: SpecNode) -> None: ...
+def get_tolerance(node: SpecNode, test_name: str) -> Optional[Tuple[float, float]]: ...
+def parse_differential(
+    test_name: str, test: SpecNode, base_dir: str, kwargs: Mapping[str, Any]
+) -> DifferentialCase: ...
+def parse_alternatives(
+    test_name: str, data: Any, encoding: Optional[str] = ...
+) -> Tuple[Tuple[str, ...], Optional[Tuple[Tuple[Action, ...], ...]]]: ...
+def parse_script(
+    test_name: str, script: List[SpecNode], encoding: Optional[str] = ...
+) -> List[Action]: ...
+def parse_case(
+    test_name: str, test: SpecNode, base_dir: str, encoding: Optional[str] = ...
+) -> Union[TestCase, CaseTable, DifferentialCase]: ...
+def load_document(content: str, format: Optional[str] = ...) -> Any: ...
+def build_spec(
+    spec: Any, base_dir: Optional[str] = ..., errors: Optional[List[str]] = ...
+) -> Calico: ...
+def parse_spec(
+    content: str,
+    base_dir: Optional[str] = ...,
+    errors: Optional[List[str]] = ...,
+    format: Optional[str] = ...,
+) -> Calico: ...
+def iter_stages(content: str, format: Optional[str] = ...) -> Iterator[SpecNode]: ...
+def prefetch(items: Iterable[Any], size: Optional[int] = ...) -> Iterator[Any]: ...
+def stream_spec(
+    content: str,
+    base_dir: Optional[str] = ...,
+    errors: Optional[List[str]] = ...,
+    format: Optional[str] = ...,
+) -> Tuple[Calico, Iterator[Union[TestCase, CaseTable]]]: ...
+def spec_format(path: str) -> str: ...
+def parse_spec_file(path: str, errors: Optional[List[str]] = ...) -> Calico: ...
+def validate_spec(path: str) -> List[str]: ...
@@ -0,0 +1,174 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Recordings of the interactions in test cases.
+
+A recording keeps the input that was sent to a program and the output
+that it produced, along with when they happened. When only the expectations
+in a specification change, the cases can be checked again against
+their recordings without running the programs.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gzip
+import io
+import json
+import time
+
+
+RECORDING_FORMAT = 1  # sig: int
+"""Version of the format of recording files."""
+
+
+class Recording:
+    """The input and output of a run of a program."""
+
+    __slots__ = (
+        "command",
+        "inputs",
+        "events",
+        "exitstatus",
+        "signalstatus",
+        "complete",
+        "_start",
+    )
+
+    def __init__(self, command, inputs):
+        """Initialize this recording.
+
+        :sig: (str, Sequence[str]) -> None
+        :param command: Command that runs the program.
+        :param inputs: Data of the send actions in the script of the case.
+        """
+        self.command = command  # sig: str
+        """Command that runs the program."""
+
+        self.inputs = list(inputs)  # sig: List[str]
+        """Data of the send actions in the script of the case."""
+
+        self.events = []  # sig: List[Tuple[float, bool, bytes]]
+        """Time, direction (``True`` for output), and data of the transfers, in order."""
+
+        self.exitstatus = None  # sig: Optional[int]
+        """Exit status of the program, if it exited normally."""
+
+        self.signalstatus = None  # sig: Optional[int]
+        """Number of the signal that terminated the program, if any."""
+
+        self.complete = False  # sig: bool
+        """Whether all input was sent and all output was received."""
+
+        self._start = time.time()
+
+    def add_output(self, data):
+        """Record output received from the program.
+
+        :sig: (bytes) -> None
+        :param data: Received output.
+        """
+        if len(data) > 0:
+            self.events.append((time.time() - self._start, True, data))
+
+    def add_input(self, data):
+        """Record input sent to the program.
+
+        :sig: (bytes) -> None
+        :param data: Sent input.
+        """
+        self.events.append((time.time() - self._start, False, data))
+
+    def output_log(self):
+        """Get a file-like object that records the data written into it as output.
+
+        :sig: () -> OutputLog
+        :return: Log to attach to the process.
+        """
+        return OutputLog(self)
+
+    def replayable(self, command, inputs):
+        """Check whether this recording can stand in for a run of a case.
+
+        :sig: (str, Sequence[str]) -> bool
+        :param command: Command that runs the program.
+        :param inputs: Data of the send actions in the script of the case.
+        :return: Whether the recording is complete and the case would do the same.
+        """
+        return self.complete and (self.command == command) and (self.inputs == list(inputs))
+
+    def save(self, path):
+        """Write this recording into a compressed file.
+
+        :sig: (str) -> None
+        :param path: Path of the file to write.
+        """
+        content = {
+            "format": RECORDING_FORMAT,
+            "command": self.command,
+            "inputs": self.inputs,
+            "events": [[t, o, d.decode("latin-1")] for t, o, d in self.events],
+            "exitstatus": self.exitstatus,
+            "signalstatus": self.signalstatus,
+            "complete": self.complete,
+        }
+        with gzip.open(path, "wb") as f:
+            with io.TextIOWrapper(f, encoding="utf-8") as text:
+                text.write(json.dumps(content))
+
+    @staticmethod
+    def load(path):
+        """Read a recording from a compressed file.
+
+        :sig: (str) -> Optional[Recording]
+        :param path: Path of the file to read.
+        :return: Read recording, ``None`` if the file is in another format.
+        """
+        with gzip.open(path, "rb") as f:
+            with io.TextIOWrapper(f, encoding="utf-8") as text:
+                content = json.loads(text.read())
+        if content.get("format") != RECORDING_FORMAT:
+            return None
+        recording = Recording(content["command"], content["inputs"])
+        recording.events = [(t, o, d.encode("latin-1")) for t, o, d in content["events"]]
+        recording.exitstatus = content["exitstatus"]
+        recording.signalstatus = content["signalstatus"]
+        recording.complete = content["complete"]
+        return recording
+
+
+class OutputLog:
+    """A file-like object that records the data written into it as output."""
+
+    __slots__ = ("recording",)
+
+    def __init__(self, recording):
+        """Initialize this log.
+
+        :sig: (Recording) -> None
+        :param recording: Recording to add the output to.
+        """
+        self.recording = recording  # sig: Recording
+        """Recording to add the output to."""
+
+    def write(self, data):
+        """Record output received from the program.
+
+        :sig: (bytes) -> None
+        :param data: Received output.
+        """
+        self.recording.add_output(data)
+
+    def flush(self):
+        """Do nothing, the output is already recorded."""
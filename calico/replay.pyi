@@ -0,0 +1,27 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import List, Optional, Sequence, Tuple
+
+RECORDING_FORMAT = ...  # type: int
+
+class Recording:
+    command = ...  # type: str
+    inputs = ...  # type: List[str]
+    events = ...  # type: List[Tuple[float, bool, bytes]]
+    exitstatus = ...  # type: Optional[int]
+    signalstatus = ...  # type: Optional[int]
+    complete = ...  # type: bool
+    def __init__(self, command: str, inputs: Sequence[str]) -> None: ...
+    def add_output(self, data: bytes) -> None: ...
+    def add_input(self, data: bytes) -> None: ...
+    def output_log(self) -> OutputLog: ...
+    def replayable(self, command: str, inputs: Sequence[str]) -> bool: ...
+    def save(self, path: str) -> None: ...
+    @staticmethod
+    def load(path: str) -> Optional[Recording]: ...
+
+class OutputLog:
+    recording = ...  # type: Recording
+    def __init__(self, recording: Recording) -> None: ...
+    def write(self, data: bytes) -> None: ...
+    def flush(self) -> None: ...
@@ -0,0 +1,187 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Storage of test results for whole classes.
+
+Results are kept in an SQLite database with one row per case result.
+Submission names, case names and kinds of errors are interned into
+separate tables, so a row consists of only a few numbers. The details
+of an error that change from run to run, like the offset of a difference,
+are kept in the row.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import re
+import sqlite3
+from collections import OrderedDict
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS errors (
+    code INTEGER PRIMARY KEY,
+    message TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    submission INTEGER NOT NULL REFERENCES submissions(id),
+    case_ INTEGER NOT NULL REFERENCES cases(id),
+    passed INTEGER NOT NULL,
+    points REAL,
+    error INTEGER REFERENCES errors(code),
+    detail TEXT,
+    duration REAL
+);
+
+CREATE INDEX IF NOT EXISTS results_submission ON results(submission);
+
+CREATE INDEX IF NOT EXISTS results_case ON results(case_);
+"""
+
+
+_ERROR_DETAIL = re.compile(r"^(?P<kind>.+?) (?P<detail>(?:at offset|for input|for seed) .+)\.$")
+
+
+def split_error(message):
+    """Split an error message into its kind and its details.
+
+    :sig: (str) -> Tuple[str, Optional[str]]
+    :param message: Error message in a report.
+    :return: Message of the kind of error, and the details if any.
+    """
+    match = _ERROR_DETAIL.match(message)
+    if match is None:
+        return message, None
+    return match.group("kind") + ".", match.group("detail")
+
+
+class ResultStore:
+    """A store for the results of many submissions."""
+
+    def __init__(self, path=":memory:"):
+        """Initialize this store.
+
+        :sig: (Optional[str]) -> None
+        :param path: Path of the database file.
+        """
+        self.connection = sqlite3.connect(path)  # sig: sqlite3.Connection
+        """Connection to the database."""
+
+        self.connection.executescript(SCHEMA)
+
+        self._ids = {"submissions": {}, "cases": {}, "errors": {}}
+
+    def intern(self, table, value):
+        """Get the id of a name, adding it to its table if necessary.
+
+        :sig: (str, str) -> int
+        :param table: Table of the name, submissions, cases or errors.
+        :param value: Name to get the id of.
+        :return: Id of the name.
+        """
+        ids = self._ids[table]
+        id_ = ids.get(value)
+        if id_ is None:
+            column = "message" if table == "errors" else "name"
+            query = "SELECT * FROM %(t)s WHERE %(c)s = ?" % {"t": table, "c": column}
+            row = self.connection.execute(query, (value,)).fetchone()
+            if row is None:
+                query = "INSERT INTO %(t)s (%(c)s) VALUES (?)" % {"t": table, "c": column}
+                id_ = self.connection.execute(query, (value,)).lastrowid
+            else:
+                id_ = row[0]
+            ids[value] = id_
+        return id_
+
+    def add_report(self, submission, report):
+        """Record the report of a suite run for a submission.
+
+        Earlier results of the submission are replaced. Only the first error
+        of a case is recorded since it's the one that caused the failure.
+        Its kind is interned and its details are kept separately.
+
+        :sig: (str, Mapping[str, Any]) -> None
+        :param submission: Name of the submission.
+        :param report: Report produced by running the suite.
+        """
+        submission_id = self.intern("submissions", submission)
+        rows = []
+        for case, result in report.items():
+            if not isinstance(result, dict):
+                continue
+            errors = result["errors"]
+            kind, detail = split_error(errors[0]) if len(errors) > 0 else (None, None)
+            rows.append(
+                (
+                    submission_id,
+                    self.intern("cases", case),
+                    len(errors) == 0,
+                    result.get("points"),
+                    self.intern("errors", kind) if kind is not None else None,
+                    detail,
+                    result.get("duration"),
+                )
+            )
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM results WHERE submission = ?", (submission_id,)
+            )
+            self.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def pass_rates(self):
+        """Get the ratio of submissions that passed each case.
+
+        :sig: () -> Mapping[str, float]
+        :return: Pass rates, keyed by case name in order of first appearance.
+        """
+        query = """
+            SELECT cases.name, AVG(results.passed) FROM results
+            JOIN cases ON cases.id = results.case_
+            GROUP BY results.case_ ORDER BY results.case_
+        """
+        return OrderedDict(self.connection.execute(query))
+
+    def score_histogram(self, width=10):
+        """Get the distribution of total scores of submissions.
+
+        :sig: (Optional[Union[int, float]]) -> List[Tuple[Union[int, float], int]]
+        :param width: Width of the score ranges.
+        :return: Start of each score range and number of submissions in it.
+        """
+        query = """
+            SELECT CAST(total / ? AS INTEGER) AS bin, COUNT(*) FROM (
+                SELECT SUM(COALESCE(points, 0)) AS total FROM results GROUP BY submission
+            ) GROUP BY bin ORDER BY bin
+        """
+        return [(b * width, n) for b, n in self.connection.execute(query, (width,))]
+
+    def close(self):
+        """Close the database.
+
+        :sig: () -> None
+        """
+        self.connection.close()
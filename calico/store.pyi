@@ -0,0 +1,18 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, List, Mapping, Optional, Tuple, Union
+
+import sqlite3
+
+def split_error(message: str) -> Tuple[str, Optional[str]]: ...
+
+class ResultStore:
+    connection = ...  # type: sqlite3.Connection
+    def __init__(self, path: Optional[str] = ...) -> None: ...
+    def intern(self, table: str, value: str) -> int: ...
+    def add_report(self, submission: str, report: Mapping[str, Any]) -> None: ...
+    def pass_rates(self) -> Mapping[str, float]: ...
+    def score_histogram(
+        self, width: Optional[Union[int, float]] = ...
+    ) -> List[Tuple[Union[int, float], int]]: ...
+    def close(self) -> None: ...
@@ -0,0 +1,147 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Transcripts of the interactions in test cases.
+
+While a case runs, its log records are kept in memory in a bounded buffer.
+They are formatted and written to a file only if the case fails,
+so passing cases don't pay for the diagnostics.
+
+Keeping transcripts is turned on and off per thread, without changing
+the level or the handlers of the logger.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gzip
+import io
+import logging
+import threading
+from collections import deque
+
+
+TRANSCRIPT_LIMIT = 1000  # sig: int
+"""Maximum number of records to keep in a transcript, older ones are dropped."""
+
+_current = threading.local()
+
+_logger = logging.getLogger("calico")
+
+
+class Transcript:
+    """The most recent log records of a test case."""
+
+    __slots__ = ("records",)
+
+    def __init__(self, limit=TRANSCRIPT_LIMIT):
+        """Initialize this transcript.
+
+        :sig: (Optional[int]) -> None
+        :param limit: Maximum number of records to keep.
+        """
+        self.records = deque(maxlen=limit)  # sig: Deque[logging.LogRecord]
+        """Kept log records, in order."""
+
+    def write(self, path):
+        """Write this transcript into a compressed file.
+
+        :sig: (str) -> None
+        :param path: Path of the file to write.
+        """
+        formatter = logging.Formatter("%(asctime)s %(message)s")
+        with gzip.open(path, "wb") as f:
+            with io.TextIOWrapper(f, encoding="utf-8") as text:
+                for record in self.records:
+                    text.write(formatter.format(record) + "\n")
+
+
+class TranscriptHandler(logging.Handler):
+    """A handler that keeps records in the transcript of the running case.
+
+    Transcripts are specific to threads, so concurrently running cases
+    get only their own records.
+    """
+
+    def emit(self, record):
+        """Keep a record if a transcript has been started in this thread."""
+        transcript = getattr(_current, "transcript", None)
+        if transcript is not None:
+            transcript.records.append(record)
+
+
+class TranscriptLogger(logging.LoggerAdapter):
+    """A logger that also keeps the records it would drop if a transcript is running.
+
+    Records that pass the level of the logger reach the transcript
+    through the handler. The others are kept only in the transcript.
+    """
+
+    def __init__(self, logger):
+        """Initialize this logger.
+
+        :sig: (logging.Logger) -> None
+        :param logger: Logger to pass the records to.
+        """
+        logging.LoggerAdapter.__init__(self, logger, {})
+
+    def isEnabledFor(self, level):
+        """Check whether a record at a level would be logged or transcribed."""
+        return capturing() or self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        """Log a record, or keep it only in the transcript if its level is disabled."""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, **kwargs)
+            return
+        transcript = getattr(_current, "transcript", None)
+        if transcript is not None:
+            name = self.logger.name
+            record = self.logger.makeRecord(name, level, "(unknown file)", 0, msg, args, None)
+            transcript.records.append(record)
+
+    def debug(self, msg, *args, **kwargs):
+        """Log a record at debug level."""
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+
+_logger.addHandler(TranscriptHandler())
+
+
+def capturing():
+    """Check whether a transcript has been started in this thread.
+
+    :sig: () -> bool
+    :return: Whether the records in this thread are being kept.
+    """
+    return getattr(_current, "transcript", None) is not None
+
+
+def start_transcript(limit=TRANSCRIPT_LIMIT):
+    """Start keeping the records in this thread in a new transcript.
+
+    :sig: (Optional[int]) -> Transcript
+    :param limit: Maximum number of records to keep.
+    :return: Started transcript.
+    """
+    _current.transcript = Transcript(limit=limit)
+    return _current.transcript
+
+
+def stop_transcript():
+    """Stop keeping the records in this thread.
+
+    :sig: () -> None
+    """
+    _current.transcript = None
@@ -0,0 +1,21 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Deque, Optional
+
+import logging
+
+TRANSCRIPT_LIMIT = ...  # type: int
+
+class Transcript:
+    records = ...  # type: Deque[logging.LogRecord]
+    def __init__(self, limit: Optional[int] = ...) -> None: ...
+    def write(self, path: str) -> None: ...
+
+class TranscriptHandler(logging.Handler): ...
+
+class TranscriptLogger(logging.LoggerAdapter):
+    def __init__(self, logger: logging.Logger) -> None: ...
+
+def capturing() -> bool: ...
+def start_transcript(limit: Optional[int] = ...) -> Transcript: ...
+def stop_transcript() -> None: ...
@@ -0,0 +1,228 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Warm interpreters for running interpreted programs.
+
+A zygote is an interpreter that is started once per suite run, imports
+the modules that the programs will need, and then forks a fresh child
+for every program to run. This way the startup cost of the interpreter
+is paid once instead of once per case.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import json
+import os
+import pty
+import select
+import shlex
+import socket
+import subprocess
+import termios
+import threading
+
+import pexpect
+from pexpect.fdpexpect import fdspawn
+
+
+SERVER_PATH = os.path.join(os.path.dirname(__file__), "zygote_server.py")
+
+MAX_REPLY = 4096
+
+
+class ZygoteProcess(fdspawn):
+    """A program that was forked from a zygote, attached to a terminal."""
+
+    def __init__(self, fd, pid, channel, timeout=30):
+        """Initialize this process.
+
+        :sig: (int, int, socket.socket, Optional[int]) -> None
+        :param fd: Controlling side of the terminal of the program.
+        :param pid: Id of the program process.
+        :param channel: Socket the zygote reports the exit status through.
+        :param timeout: Default timeout for reads, in seconds.
+        """
+        fdspawn.__init__(self, fd, timeout=timeout)
+
+        self.pid = pid  # sig: int
+        """Id of the program process."""
+
+        self.status = None  # sig: Optional[int]
+        """Wait status of the program, ``None`` while it's running."""
+
+        self.exitstatus = None  # sig: Optional[int]
+        """Exit status of the program, if it exited normally."""
+
+        self.signalstatus = None  # sig: Optional[int]
+        """Number of the signal that terminated the program, if any."""
+
+        self._channel = channel
+
+    def setecho(self, state):
+        """Set whether the terminal echoes the input back.
+
+        :sig: (bool) -> None
+        :param state: Whether to echo.
+        """
+        attr = termios.tcgetattr(self.child_fd)
+        attr[3] = (attr[3] | termios.ECHO) if state else (attr[3] & ~termios.ECHO)
+        termios.tcsetattr(self.child_fd, termios.TCSANOW, attr)
+
+    def wait_exit(self, timeout):
+        """Wait for the program to exit.
+
+        :sig: (Optional[float]) -> bool
+        :param timeout: How long to wait, in seconds.
+        :return: Whether the program has exited.
+        """
+        if self.status is None:
+            if len(select.select([self._channel], [], [], timeout)[0]) == 0:
+                return False
+            reply = self._channel.recv(MAX_REPLY)
+            self._channel.close()
+            # the zygote closes the channel without a reply only if it dies
+            self.status = json.loads(reply.decode("utf-8"))["status"] if reply else -1
+            if os.WIFEXITED(self.status):
+                self.exitstatus = os.WEXITSTATUS(self.status)
+            elif os.WIFSIGNALED(self.status):
+                self.signalstatus = os.WTERMSIG(self.status)
+        return True
+
+    def isalive(self):
+        """Check whether the program is still running.
+
+        :sig: () -> bool
+        :return: Whether the program is running.
+        """
+        return not self.wait_exit(0)
+
+    def close(self, force=True):
+        """Close the terminal and wait for the program to exit.
+
+        :sig: (Optional[bool]) -> None
+        :param force: Unused, the program has to be terminated before closing.
+        """
+        fdspawn.close(self)
+        self.wait_exit(None)
+
+
+class Zygote:
+    """A warm interpreter that runs programs in forked children."""
+
+    def __init__(self, interpreter, preload=()):
+        """Initialize this zygote.
+
+        :sig: (str, Optional[Sequence[str]]) -> None
+        :param interpreter: Command of the interpreter.
+        :param preload: Modules to import before forking.
+        """
+        self.interpreter = interpreter  # sig: str
+        """Command of the interpreter."""
+
+        self.preload = tuple(preload)  # sig: Tuple[str, ...]
+        """Modules to import before forking."""
+
+        self._server = None
+        self._control = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the interpreter.
+
+        :sig: () -> None
+        """
+        self._control, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        command = [self.interpreter, SERVER_PATH, str(remote.fileno())] + list(self.preload)
+        try:
+            self._server = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, pass_fds=(remote.fileno(),)
+            )
+        finally:
+            remote.close()
+
+    def stop(self):
+        """Stop the interpreter.
+
+        The programs that are still running are not affected.
+
+        :sig: () -> None
+        """
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+        if self._server is not None:
+            self._server.wait()
+            self._server = None
+
+    def handles(self, command):
+        """Check whether a command can be run by this zygote.
+
+        The command has to run a script file with the same interpreter,
+        without any interpreter options.
+
+        :sig: (str) -> bool
+        :param command: Command to check.
+        :return: Whether the command can be run by this zygote.
+        """
+        argv = shlex.split(command)
+        return (len(argv) > 1) and (argv[0] == self.interpreter) and (argv[1][0] != "-")
+
+    def spawn(self, command, timeout=30, cpus=None, cwd=None, env=None):
+        """Run a command in a child of this zygote.
+
+        :sig:
+            (
+                str,
+                Optional[int],
+                Optional[Set[int]],
+                Optional[str],
+                Optional[Mapping[str, str]]
+            ) -> ZygoteProcess
+        :param command: Command to run.
+        :param timeout: Default timeout for reads, in seconds.
+        :param cpus: CPUs to pin the program to.
+        :param cwd: Directory to run the program in, the current directory if not given.
+        :param env: Environment of the program, the current environment if not given.
+        :return: Process of the program.
+        :raise pexpect.ExceptionPexpect: When the zygote is not running.
+        """
+        request = {
+            "argv": shlex.split(command)[1:],
+            "cwd": cwd if cwd is not None else os.getcwd(),
+            "env": dict(env if env is not None else os.environ),
+            "cpus": sorted(cpus) if cpus is not None else None,
+        }
+        master, slave = pty.openpty()
+        channel, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            fds = array.array("i", [slave, remote.fileno()])
+            ancdata = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())]
+            with self._lock:
+                self._control.sendmsg([json.dumps(request).encode("utf-8")], ancdata)
+        except (AttributeError, OSError):
+            os.close(master)
+            channel.close()
+            raise pexpect.ExceptionPexpect("Zygote is not running")
+        finally:
+            os.close(slave)
+            remote.close()
+        reply = channel.recv(MAX_REPLY)
+        if len(reply) == 0:
+            os.close(master)
+            channel.close()
+            raise pexpect.ExceptionPexpect("Zygote is not running")
+        pid = json.loads(reply.decode("utf-8"))["pid"]
+        return ZygoteProcess(master, pid, channel, timeout=timeout)
@@ -0,0 +1,38 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Mapping, Optional, Sequence, Set, Tuple
+
+import socket
+from pexpect.fdpexpect import fdspawn
+
+SERVER_PATH = ...  # type: str
+MAX_REPLY = ...  # type: int
+
+class ZygoteProcess(fdspawn):
+    pid = ...  # type: int
+    status = ...  # type: Optional[int]
+    exitstatus = ...  # type: Optional[int]
+    signalstatus = ...  # type: Optional[int]
+    def __init__(
+        self, fd: int, pid: int, channel: socket.socket, timeout: Optional[int] = ...
+    ) -> None: ...
+    def setecho(self, state: bool) -> None: ...
+    def wait_exit(self, timeout: Optional[float]) -> bool: ...
+    def isalive(self) -> bool: ...
+    def close(self, force: Optional[bool] = ...) -> None: ...
+
+class Zygote:
+    interpreter = ...  # type: str
+    preload = ...  # type: Tuple[str, ...]
+    def __init__(self, interpreter: str, preload: Optional[Sequence[str]] = ...) -> None: ...
+    def start(self) -> None: ...
+    def stop(self) -> None: ...
+    def handles(self, command: str) -> bool: ...
+    def spawn(
+        self,
+        command: str,
+        timeout: Optional[int] = ...,
+        cpus: Optional[Set[int]] = ...,
+        cwd: Optional[str] = ...,
+        env: Optional[Mapping[str, str]] = ...,
+    ) -> ZygoteProcess: ...
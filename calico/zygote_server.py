@@ -0,0 +1,176 @@
+# Copyright (C) 2019 H. Turgut Uyar <uyar@itu.edu.tr>
+#
+# Calico is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Calico is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Calico.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Fork server that runs in the interpreter of the tested programs.
+
+This script is executed by the interpreter that the tested programs
+are written for, so it can't import anything from Calico. It receives
+requests over a socket, each carrying the terminal to attach the program to
+and a channel to report back through. The program is run in a forked child
+so the interpreter and the preloaded modules are already initialized.
+"""
+
+import fcntl
+import json
+import os
+import runpy
+import select
+import signal
+import socket
+import struct
+import sys
+import termios
+import traceback
+
+
+MAX_REQUEST = 1 << 20
+
+FD_SIZE = struct.calcsize("i")
+
+
+def receive_request(control):
+    """Receive a request along with its file descriptors.
+
+    :sig: (socket.socket) -> Optional[Tuple[Mapping[str, Any], List[int]]]
+    :param control: Socket to receive the request from.
+    :return: Request and received file descriptors, ``None`` when closed.
+    """
+    message, ancdata, _, _ = control.recvmsg(MAX_REQUEST, socket.CMSG_SPACE(2 * FD_SIZE))
+    if len(message) == 0:
+        return None
+    fds = []
+    for level, type_, data in ancdata:
+        if (level == socket.SOL_SOCKET) and (type_ == socket.SCM_RIGHTS):
+            usable = len(data) - (len(data) % FD_SIZE)
+            fds.extend(struct.unpack("%di" % (usable // FD_SIZE), data[:usable]))
+    return json.loads(message.decode("utf-8")), fds
+
+
+def run_program(request, tty):
+    """Run a program in this process and exit.
+
+    :sig: (Mapping[str, Any], int) -> None
+    :param request: Program arguments, working directory and environment.
+    :param tty: Terminal to attach the program to.
+    """
+    code = 1
+    try:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+
+        os.setsid()
+        fcntl.ioctl(tty, termios.TIOCSCTTY, 0)
+        for fd in (0, 1, 2):
+            os.dup2(tty, fd)
+        os.close(tty)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        if request.get("cpus") is not None:
+            os.sched_setaffinity(0, request["cpus"])
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        path = request["argv"][0]
+        sys.argv = list(request["argv"])
+        sys.path[0] = os.path.dirname(os.path.abspath(path))
+        try:
+            runpy.run_path(path, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if (e.code is None) or isinstance(e.code, int):
+                code = e.code if e.code is not None else 0
+            else:
+                print(e.code, file=sys.stderr)
+        except KeyboardInterrupt:
+            sys.stdout.flush()
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGINT)
+        except BaseException:
+            traceback.print_exc()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code)
+
+
+def reap_children(children):
+    """Report the statuses of the children that have exited.
+
+    :sig: (MutableMapping[int, socket.socket]) -> None
+    :param children: Report channels of running children, keyed by process id.
+    """
+    while len(children) > 0:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            break
+        channel = children.pop(pid, None)
+        if channel is not None:
+            try:
+                channel.send(json.dumps({"status": status}).encode("utf-8"))
+            except OSError:  # client has gone away
+                pass
+            channel.close()
+
+
+def main(argv):
+    """Serve requests until the control socket is closed.
+
+    :sig: (List[str]) -> None
+    :param argv: Control socket descriptor followed by modules to preload.
+    """
+    control = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET, fileno=int(argv[1]))
+    for name in argv[2:]:
+        __import__(name)
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    wakeup_r, wakeup_w = os.pipe()
+    fcntl.fcntl(wakeup_w, fcntl.F_SETFL, os.O_NONBLOCK)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    children = {}
+    while True:
+        ready = select.select([control, wakeup_r], [], [])[0]
+        if wakeup_r in ready:
+            os.read(wakeup_r, 512)
+            reap_children(children)
+        if control not in ready:
+            continue
+        received = receive_request(control)
+        if received is None:
+            break
+        request, (tty, channel) = received
+        pid = os.fork()
+        if pid == 0:
+            control.close()
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+            os.close(channel)
+            for other in children.values():
+                other.close()
+            run_program(request, tty)
+        os.close(tty)
+        channel = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET, fileno=channel)
+        children[pid] = channel
+        channel.send(json.dumps({"pid": pid}).encode("utf-8"))
+        reap_children(children)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,15 @@
+# THIS FILE IS AUTOMATICALLY GENERATED, DO NOT EDIT MANUALLY.
+
+from typing import Any, List, Mapping, MutableMapping, Optional, Tuple
+
+import socket
+
+MAX_REQUEST = ...  # type: int
+FD_SIZE = ...  # type: int
+
+def receive_request(
+    control: socket.socket
+) -> Optional[Tuple[Mapping[str, Any], List[int]]]: ...
+def run_program(request: Mapping[str, Any], tty: int) -> None: ...
+def reap_children(children: MutableMapping[int, socket.socket]) -> None: ...
+def main(argv: List[str]) -> None: ...
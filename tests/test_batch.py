@@ -0,0 +1,65 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import fixture
+
+from calico.batch import smoke_tests, triage
+from calico.parse import parse_spec
+
+SPEC = """
+  - build:
+      run: test -f main
+      smoke: true
+      blocker: true
+  - case_1:
+      run: cat main
+      script:
+        - expect: "hello\\r\\n"
+      smoke: true
+      points: 1
+  - case_2:
+      run: cat extra
+      script:
+        - expect: "extra\\r\\n"
+      points: 2
+"""
+
+
+@fixture
+def submissions(tmpdir):
+    directories = []
+    for name, files in [
+        ("full", {"main": "hello\n", "extra": "extra\n"}),
+        ("partial", {"main": "hello\n"}),
+        ("missing", {}),
+        ("wrong", {"main": "bye\n"}),
+    ]:
+        directory = tmpdir.mkdir(name)
+        for file_name, content in files.items():
+            directory.join(file_name).write(content)
+        directories.append(str(directory))
+    return directories
+
+
+def test_smoke_tests_should_be_marked_cases():
+    runner = parse_spec(SPEC)
+    assert smoke_tests(runner) == ["build", "case_1"]
+
+
+def test_triage_should_run_full_suite_only_after_smoke_tests_pass(submissions):
+    runner = parse_spec(SPEC)
+    reports = triage(runner, submissions, workers=2)
+    assert list(reports.keys()) == submissions
+    full, partial, missing, wrong = [reports[d] for d in submissions]
+    assert full["smoke"]["points"] == 1
+    assert full["full"]["points"] == 3
+    assert partial["full"]["points"] == 1
+    assert missing["full"] is None
+    assert "case_1" not in missing["smoke"]
+    assert wrong["full"] is None
+    assert wrong["smoke"]["points"] == 0
+
+
+def test_triage_smoke_tier_should_not_run_other_cases(submissions):
+    runner = parse_spec(SPEC)
+    reports = triage(runner, submissions[1:2])
+    assert list(reports[submissions[1]]["smoke"].keys()) == ["build", "case_1", "points"]
@@ -13,6 +13,7 @@ if not PY2:
 from pkg_resources import get_distribution
 
 from calico import cli
+from calico.store import ResultStore
 
 base_dir = os.path.dirname(__file__)
 circle_spec_file = os.path.join(base_dir, "circle.yaml")
@@ -79,6 +80,15 @@ def test_validate_invalid_spec_file_should_exit_with_error(capsys):
         assert "No test specification" in err
 
 
+def test_store_should_record_results_for_submission(capsys, tmpdir):
+    path = str(tmpdir.join("results.db"))
+    cli.main(argv=["calico", "--store", path, "--submission", "s1", circle_spec_file])
+    store = ResultStore(path)
+    assert list(store.pass_rates().keys())[:2] == ["init", "compile"]
+    query = "SELECT name FROM submissions"
+    assert [r[0] for r in store.connection.execute(query)] == ["s1"]
+
+
 # TODO: add tests for --quiet option
 
 
@@ -89,3 +99,81 @@ def test_validate_invalid_spec_file_should_exit_with_error(capsys):
 
 
 # TODO: add tests for summary output
+
+
+def test_serve_help_should_print_usage_and_exit(capsys):
+    with raises(SystemExit):
+        cli.main(argv=["calico", "serve", "--help"])
+    out, err = capsys.readouterr()
+    assert out.startswith("usage: calico serve")
+
+
+def test_triage_should_print_grade_of_every_submission(capsys, tmpdir):
+    spec = tmpdir.join("spec.yaml")
+    spec.write(
+        """
+      - case_1:
+          run: test -f ok
+          smoke: true
+          points: 1
+      - case_2:
+          run: "true"
+          points: 2
+    """
+    )
+    good = tmpdir.mkdir("good")
+    good.join("ok").write("")
+    bad = tmpdir.mkdir("bad")
+    cli.main(argv=["calico", "triage", str(spec), str(good), str(bad)])
+    out, err = capsys.readouterr()
+    assert out == "good: 3 / 3\nbad: failed smoke tests\n"
+
+
+def test_validate_command_should_report_errors_of_all_files(capsys, tmpdir):
+    good = tmpdir.join("good.yaml")
+    good.write("- c1:\n    run: echo 1\n")
+    bad = tmpdir.join("bad.yaml")
+    bad.write("- c1:\n    points: 1\n- c2:\n    run: echo 2\n    exit: no\n")
+    with raises(SystemExit):
+        cli.main(argv=["calico", "validate", "-j", "2", str(good), str(bad)])
+    out, err = capsys.readouterr()
+    assert out.splitlines() == [
+        "%(f)s: c1: No run command" % {"f": str(bad)},
+        "%(f)s: c2: Exit status value must be an integer" % {"f": str(bad)},
+    ]
+
+
+def test_validate_command_should_not_print_output_for_valid_files(capsys):
+    cli.main(argv=["calico", "validate", circle_spec_file, circle_spec_file])
+    out, err = capsys.readouterr()
+    assert out == ""
+
+
+def test_convert_command_should_write_json_for_json_output(tmpdir):
+    output = tmpdir.join("circle.json")
+    cli.main(argv=["calico", "convert", circle_spec_file, "-o", str(output)])
+    assert output.read().startswith("[")
+
+
+def test_convert_command_should_print_to_standard_output(capsys):
+    cli.main(argv=["calico", "convert", "--to", "json", circle_spec_file])
+    out, err = capsys.readouterr()
+    assert '"run": "rm -f circle.o circle"' in out
+
+
+def test_stream_should_report_errors_of_later_cases(capsys, tmpdir):
+    spec = tmpdir.join("spec.yaml")
+    spec.write("- c1:\n    run: echo 1\n    points: 1\n- c2:\n    points: 2\n")
+    with raises(SystemExit):
+        cli.main(argv=["calico", "--stream", str(spec)])
+    out, err = capsys.readouterr()
+    assert "Grade: 1 / 1" in out
+    assert err == "c2: No run command\n"
+
+
+def test_digest_command_should_print_digest_of_output(capsys, tmpdir):
+    data = tmpdir.join("input.txt")
+    data.write("3\n")
+    cli.main(argv=["calico", "digest", "sh -c 'read n; seq $n'", "--input", str(data)])
+    out, err = capsys.readouterr()
+    assert out.startswith("sha256:") and out.endswith(":9\n")
@@ -0,0 +1,72 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import mark, raises
+
+import os
+
+from calico.convert import convert_spec
+from calico.parse import load_toml, parse_spec
+
+
+base_dir = os.path.dirname(__file__)
+circle_spec_file = os.path.join(base_dir, "circle.yaml")
+
+
+def describe(runner):
+    return [
+        (
+            c.name,
+            c.command,
+            c.timeout,
+            c.exits,
+            c.points,
+            c.blocker,
+            c.visible,
+            [(a.type_, a.data, a.timeout, a.match) for a in c.script],
+        )
+        for c in runner.cases()
+    ]
+
+
+def read_circle_spec():
+    with open(circle_spec_file) as f:
+        return f.read()
+
+
+def test_conversion_to_json_should_keep_suite():
+    content = read_circle_spec()
+    converted = convert_spec(content, "json", base_dir=base_dir)
+    expected = describe(parse_spec(content, base_dir=base_dir))
+    assert describe(parse_spec(converted, base_dir=base_dir, format="json")) == expected
+
+
+@mark.skipif(load_toml is None, reason="needs TOML support")
+def test_conversion_to_toml_should_keep_suite():
+    content = read_circle_spec()
+    converted = convert_spec(content, "toml", base_dir=base_dir)
+    expected = describe(parse_spec(content, base_dir=base_dir))
+    assert describe(parse_spec(converted, base_dir=base_dir, format="toml")) == expected
+
+
+def test_conversion_should_turn_timeout_comments_into_fields():
+    source = """
+      - c1:
+          run: echo 1   # timeout: 4
+          script:
+            - expect: "1"   # timeout: 2
+    """
+    converted = convert_spec(source, "json")
+    assert '"timeout": 4' in converted
+    assert '"timeout": 2' in converted
+
+
+def test_conversion_of_invalid_spec_should_raise_error():
+    with raises(AssertionError) as e:
+        convert_spec("- c1:\n    points: 1\n", "json")
+    assert "c1: No run command" in str(e)
+
+
+def test_conversion_to_unknown_format_should_raise_error():
+    with raises(AssertionError) as e:
+        convert_spec(read_circle_spec(), "xml")
+    assert "Unknown target format" in str(e)
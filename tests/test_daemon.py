@@ -0,0 +1,101 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import fixture
+
+import os
+import threading
+import time
+
+from calico.daemon import GradingServer, SpecCache, request_grading
+
+SPEC = """
+  - case_1:
+      run: echo 1
+      script:
+        - expect: "1"
+      points: 5
+"""
+
+SLOW_SPEC = """
+  - case_1:
+      run: sleep 1
+"""
+
+
+@fixture
+def server(tmpdir):
+    path = str(tmpdir.join("calico.sock"))
+    server = GradingServer(path, workers=1, backlog=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_cache_should_reuse_parsed_spec(tmpdir):
+    spec = tmpdir.join("spec.yaml")
+    spec.write(SPEC)
+    cache = SpecCache()
+    assert cache.get(str(spec)) is cache.get(str(spec))
+
+
+def test_cache_should_parse_modified_spec_again(tmpdir):
+    spec = tmpdir.join("spec.yaml")
+    spec.write(SPEC)
+    cache = SpecCache()
+    runner = cache.get(str(spec))
+    spec.write(SPEC.replace("points: 5", "points: 10"))
+    os.utime(str(spec), (time.time() + 10, time.time() + 10))
+    assert cache.get(str(spec)).points == 10
+    assert runner.points == 5
+
+
+def test_cache_should_evict_least_recently_used(tmpdir):
+    paths = []
+    for i in range(3):
+        spec = tmpdir.join("spec%d.yaml" % i)
+        spec.write(SPEC)
+        paths.append(str(spec))
+    cache = SpecCache(size=2)
+    first = cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert cache.get(paths[0]) is first
+    assert len(cache._entries) == 2
+
+
+def test_daemon_should_grade_submission(server, tmpdir):
+    tmpdir.join("spec.yaml").write(SPEC)
+    response = request_grading(
+        server.server_address, str(tmpdir.join("spec.yaml")), str(tmpdir)
+    )
+    assert response["status"] == "ok"
+    assert response["report"]["points"] == 5
+    assert response["total"] == 5
+
+
+def test_daemon_should_report_invalid_spec(server, tmpdir):
+    tmpdir.join("spec.yaml").write("")
+    response = request_grading(
+        server.server_address, str(tmpdir.join("spec.yaml")), str(tmpdir)
+    )
+    assert response == {"status": "error", "message": "No test specification"}
+
+
+def test_daemon_should_reject_requests_when_full(server, tmpdir):
+    tmpdir.join("spec.yaml").write(SLOW_SPEC)
+    spec = str(tmpdir.join("spec.yaml"))
+    responses = []
+    thread = threading.Thread(
+        target=lambda: responses.append(
+            request_grading(server.server_address, spec, str(tmpdir))
+        )
+    )
+    thread.start()
+    time.sleep(0.3)
+    assert request_grading(server.server_address, spec, str(tmpdir)) == {"status": "busy"}
+    thread.join()
+    assert responses[0]["status"] == "ok"
@@ -0,0 +1,144 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import mark, raises
+
+import os
+
+from calico import differential
+from calico.differential import ReferenceCache, run_batch, same_output
+from calico.metrics import metrics
+from calico.parse import parse_spec
+
+
+REFERENCE = 'read a b; echo "$((a + b))"\n'
+
+SUBMISSION = 'read a b; if [ "$a" -eq 7 ]; then echo 0; else echo "$((a + b))"; fi\n'
+
+GENERATOR = 'echo "$(($1 % 10)) $(($1 * 3))"\n'
+
+SPEC = """
+  - case_sum:
+      run: sh %(s)s
+      reference: sh ref.sh
+      generate: "sh gen.sh %%(seed)d"
+      count: %(c)d
+      points: 5
+"""
+
+
+def write_programs(tmpdir):
+    tmpdir.join("ref.sh").write(REFERENCE)
+    tmpdir.join("sub.sh").write(SUBMISSION)
+    tmpdir.join("gen.sh").write(GENERATOR)
+
+
+def test_batch_run_should_collect_output_and_status():
+    output, status, expired = run_batch("sh -c 'cat; exit 3'", b"hello\n")
+    assert (output, status, expired) == (b"hello\n", 3, False)
+
+
+def test_batch_run_should_kill_program_on_timeout():
+    output, status, expired = run_batch("sleep 5", b"", timeout=0.2)
+    assert expired
+
+
+@mark.parametrize("command, timeout", [("sh -c 'cat; exit 3'", None), ("sleep 1", 0.2)])
+def test_batch_run_should_kill_session_before_reaping_program(monkeypatch, command, timeout):
+    sessions = []
+
+    def kill_session(sid):
+        # an unreaped program keeps its id, so it can't be the leader of another session
+        sessions.append(os.path.exists("/proc/%(p)d" % {"p": sid}))
+        return 0
+
+    monkeypatch.setattr(differential, "kill_session", kill_session)
+    run_batch(command, b"hello\n", timeout=timeout)
+    assert (len(sessions) > 0) and all(sessions)
+
+
+def test_same_output_should_use_match_mode():
+    assert same_output(b"3.14\n", b"3.14\n")
+    assert not same_output(b"3.14\n", b"3.14\nextra\n")
+    assert not same_output(b"3.14\n", b"3.1\n")
+    assert same_output(b"3.14\n", b"3.1400", mode="numeric", tolerance=(0.001, 0))
+    assert same_output(b"a  b\n", b"a b", mode="whitespace")
+
+
+def test_reference_cache_should_keep_outputs_in_directory(tmpdir):
+    cache = ReferenceCache(str(tmpdir.join("cache")))
+    cache.put("k", b"out")
+    assert ReferenceCache(str(tmpdir.join("cache"))).get("k") == b"out"
+    assert cache.get("missing") is None
+
+
+def test_differential_case_should_pass_when_outputs_match(tmpdir):
+    write_programs(tmpdir)
+    runner = parse_spec(SPEC % {"s": "ref.sh", "c": 20}, base_dir=str(tmpdir))
+    report = runner.run(quiet=True, cwd=str(tmpdir))
+    assert report["case_sum"]["errors"] == []
+    assert report["case_sum"]["inputs"] == 20
+    assert report["points"] == 5
+
+
+def test_differential_case_should_report_first_failing_inputs(tmpdir):
+    write_programs(tmpdir)
+    runner = parse_spec(SPEC % {"s": "sub.sh", "c": 100}, base_dir=str(tmpdir))
+    report = runner.run(quiet=True, cwd=str(tmpdir))
+    assert report["case_sum"]["errors"] == [
+        "Output differs from reference for input seed 7.",
+        "Output differs from reference for input seed 17.",
+        "Output differs from reference for input seed 27.",
+    ]
+    assert report["points"] == 0
+
+
+def test_reference_outputs_should_be_computed_once(tmpdir):
+    write_programs(tmpdir)
+    runner = parse_spec(SPEC % {"s": "ref.sh", "c": 10}, base_dir=str(tmpdir))
+    runner.run(quiet=True, cwd=str(tmpdir))
+    runs = metrics.values["reference_runs_total"]
+    runner.run(quiet=True, cwd=str(tmpdir))
+    assert metrics.values["reference_runs_total"] == runs
+
+
+def test_differential_case_should_read_input_files(tmpdir):
+    tmpdir.join("ref.sh").write(REFERENCE)
+    tmpdir.mkdir("inputs")
+    for i in range(3):
+        tmpdir.join("inputs", "%d.in" % i).write("%d 1\n" % i)
+    source = """
+      - case_files:
+          run: sh ref.sh
+          reference: sh ref.sh
+          inputs: inputs/*.in
+    """
+    runner = parse_spec(source, base_dir=str(tmpdir))
+    names = [p.rsplit("/", 1)[1] for p in runner["case_files"].inputs]
+    assert names == ["0.in", "1.in", "2.in"]
+    report = runner.run(quiet=True, cwd=str(tmpdir))
+    assert report["case_files"]["errors"] == []
+    assert report["case_files"]["inputs"] == 3
+
+
+def test_differential_case_without_inputs_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          reference: echo 1
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Differential cases need either inputs or a generator" in str(e)
+
+
+def test_differential_case_with_regex_match_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          reference: echo 1
+          generate: echo 1
+          match: regex
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Reference outputs can't be matched as patterns" in str(e)
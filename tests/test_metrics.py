@@ -0,0 +1,75 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+
+from calico.base import Action, ActionType
+from calico.base import TestCase as Case
+from calico.metrics import Histogram, Metrics, metrics, serve_metrics, write_metrics
+
+
+if sys.version_info < (3,):
+    from urllib2 import urlopen
+else:
+    from urllib.request import urlopen
+
+
+def test_histogram_should_count_values_in_buckets():
+    histogram = Histogram(buckets=(1, 5))
+    for value in (0.5, 1, 3, 7):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.sum == 11.5
+
+
+def test_render_should_include_counters():
+    registry = Metrics()
+    registry.inc("cases_total", 3)
+    assert "\ncalico_cases_total 3\n" in registry.render()
+
+
+def test_render_should_include_cumulative_histogram_buckets():
+    registry = Metrics()
+    registry.observe("spawn_seconds", 0.002)
+    registry.observe("spawn_seconds", 0.2)
+    text = registry.render()
+    assert 'calico_spawn_seconds_bucket{le="0.001"} 0\n' in text
+    assert 'calico_spawn_seconds_bucket{le="0.005"} 1\n' in text
+    assert 'calico_spawn_seconds_bucket{le="+Inf"} 2\n' in text
+    assert "calico_spawn_seconds_count 2\n" in text
+
+
+def test_running_case_should_update_metrics():
+    metrics.reset()
+    Case("c1", "true", script=[Action(ActionType.EXPECT, "_EOF_")]).run()
+    Case("c2", "false", script=[Action(ActionType.EXPECT, "_EOF_")]).run()
+    assert metrics.values["cases_total"] == 2
+    assert metrics.values["cases_passed_total"] == 1
+    assert metrics.values["cases_failed_total"] == 1
+    assert metrics.values["cases_running"] == 0
+    assert metrics.values["spawn_seconds"].counts[-1] == 0
+
+
+def test_timeout_should_update_metrics():
+    metrics.reset()
+    Case("c1", "sleep 2", script=[Action(ActionType.EXPECT, "_EOF_", timeout=1)]).run()
+    assert metrics.values["timeouts_total"] == 1
+
+
+def test_metrics_should_be_written_to_file(tmpdir):
+    metrics.reset()
+    path = str(tmpdir.join("calico.prom"))
+    write_metrics(path)
+    with open(path) as f:
+        assert "calico_cases_total 0\n" in f.read()
+
+
+def test_metrics_should_be_served_over_http():
+    metrics.reset()
+    server = serve_metrics(0)
+    try:
+        url = "http://127.0.0.1:%(p)d/metrics" % {"p": server.server_address[1]}
+        text = urlopen(url).read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "calico_cases_total 0\n" in text
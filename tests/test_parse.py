@@ -1,8 +1,18 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from pytest import raises
+from pytest import mark, raises
 
-from calico.parse import parse_spec
+import threading
+
+from calico.parse import (
+    iter_stages,
+    load_toml,
+    parse_spec,
+    prefetch,
+    scan_comments,
+    stream_spec,
+    validate_spec,
+)
 
 
 def test_empty_spec_should_raise_error():
@@ -281,6 +291,36 @@ def test_case_visibility_shortcut_should_be_ok():
     assert runner["c1"].visible
 
 
+def test_case_default_smoke_value_should_be_false():
+    source = """
+      - c1:
+          run: echo 1
+    """
+    runner = parse_spec(source)
+    assert not runner["c1"].smoke
+
+
+def test_case_smoke_set_to_true_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          smoke: true
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].smoke
+
+
+def test_case_non_boolean_smoke_value_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          smoke: maybe
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "Smoke value must be true or false" in str(e)
+
+
 def test_case_with_no_script_should_expect_eof():
     source = """
       - c1:
@@ -491,4 +531,432 @@ def test_case_define_variable_should_be_ok():
             foo: bar
     """
     runner = parse_spec(source)
-    assert runner["_define_vars"]["foo"] == "bar"
+    assert runner.config.vars["foo"] == "bar"
+
+
+def test_case_script_action_default_match_mode_should_be_regex():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "1"
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].script[0].match == "regex"
+
+
+def test_case_script_action_with_literal_match_mode_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "1"
+              match: literal
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].script[0].match == "literal"
+
+
+def test_case_script_action_with_unknown_match_mode_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "1"
+              match: fuzzy
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "Unknown match mode" in str(e)
+
+
+def test_case_script_action_with_tolerance_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "1"
+              match: numeric
+              abs_tol: 0.5
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].script[0].tolerance == (0.5, 0)
+
+
+def test_case_script_action_with_non_numeric_tolerance_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "1"
+              match: numeric
+              rel_tol: "1%"
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "Tolerance value must be numeric" in str(e)
+
+
+def test_zygote_interpreter_should_be_ok():
+    source = """
+      - _define:
+          zygote: python3
+          preload: [math, json]
+    """
+    runner = parse_spec(source)
+    assert (runner.config.zygote, runner.config.preload) == ("python3", ["math", "json"])
+
+
+def test_non_string_zygote_interpreter_should_raise_error():
+    source = """
+      - _define:
+          zygote: 3
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "Zygote interpreter must be a string" in str(e)
+
+
+def test_encoding_should_apply_to_actions():
+    source = """
+      - case_1:
+          run: cat
+          script:
+            - send: "ç"
+            - expect: "ç"
+      - _define:
+          encoding: latin-1
+    """
+    runner = parse_spec(source)
+    assert runner.config.encoding == "latin-1"
+    send, expect = runner["case_1"].script
+    assert send.payload == b"\xe7\n"
+    assert expect.encoding == "latin-1"
+
+
+def test_unknown_encoding_should_raise_error():
+    source = """
+      - _define:
+          encoding: nosuchcodec
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "Unknown encoding: nosuchcodec" in str(e)
+
+
+def test_case_with_table_should_expand_to_rows():
+    source = """
+      - case_1:
+          run: echo %(n)s
+          points: 2
+          table:
+            - {n: 1}
+            - {n: 2}
+            - {n: 3}
+    """
+    runner = parse_spec(source)
+    assert [c.name for c in runner.cases()] == ["case_1_1", "case_1_2", "case_1_3"]
+    assert runner.points == 6
+
+
+def test_case_table_rows_should_share_script():
+    source = """
+      - case_1:
+          run: echo %(n)s
+          script:
+            - expect: "%(n)s"
+          table:
+            - {n: 1}
+            - {n: 2}
+    """
+    runner = parse_spec(source)
+    cases = list(runner.cases())
+    assert cases[0].script is cases[1].script
+    assert cases[1].defs == {"n": 2}
+
+
+def test_case_table_from_csv_file_should_be_ok(tmpdir):
+    tmpdir.join("squares.csv").write("n,square\n1,1\n2,4\n")
+    source = """
+      - case_1:
+          run: echo %(n)s
+          table: squares.csv
+    """
+    runner = parse_spec(source, base_dir=str(tmpdir))
+    assert [c.defs for c in runner.cases()] == [
+        {"n": "1", "square": "1"},
+        {"n": "2", "square": "4"},
+    ]
+
+
+def test_case_table_with_different_columns_should_raise_error():
+    source = """
+      - case_1:
+          run: echo %(n)s
+          table:
+            - {n: 1}
+            - {m: 2}
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "case_1: Table rows must have the same columns" in str(e)
+
+
+def test_comment_scanner_should_find_comments_at_ends_of_lines():
+    content = 'a: 1  # first\nb: "x # y"\nc: \'p\'\' # q\' # second\nd: e#f\n# whole\n'
+    assert scan_comments(content) == {0: "first", 2: "second", 4: "whole"}
+
+
+def test_timeout_comment_of_block_scalar_should_be_ok():
+    source = """
+      - c1:
+          run: |   # timeout: 5
+            echo 1
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].timeout == 5
+
+
+def test_duplicate_keys_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          run: echo 2
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "duplicate key" in str(e)
+
+
+def test_errors_should_be_collected_for_all_cases():
+    source = """
+      - c1:
+          run: echo 1
+          points: many
+      - c2:
+          run: echo 2
+      - c3:
+          run: echo 3
+          blocker: maybe
+    """
+    errors = []
+    runner = parse_spec(source, errors=errors)
+    assert errors == [
+        "c1: Points value must be numeric",
+        "c3: Blocker value must be true or false",
+    ]
+    assert list(runner.keys()) == ["c2"]
+
+
+def test_validate_spec_should_report_missing_file(tmpdir):
+    errors = validate_spec(str(tmpdir.join("missing.yaml")))
+    assert len(errors) == 1
+    assert "No such file or directory" in errors[0]
+
+
+def test_validate_spec_should_report_no_errors_for_valid_file(tmpdir):
+    spec = tmpdir.join("spec.yaml")
+    spec.write("- c1:\n    run: echo 1  # timeout: 3\n")
+    assert validate_spec(str(spec)) == []
+
+
+def test_timeout_fields_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          timeout: 4
+          script:
+            - expect: "1"
+              timeout: 2
+    """
+    runner = parse_spec(source)
+    assert runner["c1"].timeout == 4
+    assert runner["c1"].script[0].timeout == 2
+
+
+def test_non_integer_timeout_field_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          timeout: soon
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Timeout value must be an integer" in str(e)
+
+
+def test_json_spec_should_be_ok():
+    source = """
+      [
+        {"c1": {"run": "echo 1", "timeout": 3,
+                "script": [{"timeout": 2, "expect": "1"}]}}
+      ]
+    """
+    runner = parse_spec(source, format="json")
+    assert runner["c1"].command == "echo 1"
+    assert runner["c1"].timeout == 3
+    assert runner["c1"].script[0].data == "1"
+    assert runner["c1"].script[0].timeout == 2
+
+
+def test_invalid_json_spec_should_raise_error():
+    with raises(AssertionError):
+        parse_spec('[{"c1": ', format="json")
+
+
+@mark.skipif(load_toml is None, reason="needs TOML support")
+def test_toml_spec_should_be_ok():
+    source = """
+[[stages]]
+[stages.c1]
+run = "echo 1"
+timeout = 3
+
+[[stages.c1.script]]
+expect = "1"
+timeout = 2
+"""
+    runner = parse_spec(source, format="toml")
+    assert runner["c1"].command == "echo 1"
+    assert runner["c1"].timeout == 3
+    assert runner["c1"].script[0].timeout == 2
+
+
+def test_validate_spec_should_check_json_file(tmpdir):
+    spec = tmpdir.join("spec.json")
+    spec.write('[{"c1": {"points": 1}}]')
+    assert validate_spec(str(spec)) == ["c1: No run command"]
+
+
+def test_stages_should_be_loaded_one_at_a_time():
+    source = """
+      - c1:
+          run: echo 1   # timeout: 2
+      - c2:
+          run: echo 2
+      - c3: [
+    """
+    stages = iter_stages(source)
+    first = next(stages)
+    assert list(first.keys()) == ["c1"]
+    assert first["c1"].comments == {"run": "timeout: 2"}
+    assert list(next(stages).keys()) == ["c2"]
+    with raises(AssertionError):
+        next(stages)
+
+
+def test_streamed_spec_should_parse_settings_before_returning():
+    source = """
+      - _define:
+          vars:
+            v: "1"
+      - c1:
+          run: echo 1
+    """
+    runner, cases = stream_spec(source)
+    assert runner.config.vars == {"v": "1"}
+    assert [c.name for c in cases] == ["c1"]
+
+
+def test_streamed_spec_should_collect_errors_of_later_cases():
+    source = """
+      - c1:
+          run: echo 1
+          points: 1
+      - _define:
+          vars:
+            v: "1"
+      - c2:
+          points: 2
+      - c3:
+          run: echo 3
+          points: 4
+    """
+    errors = []
+    runner, cases = stream_spec(source, errors=errors)
+    assert [c.name for c in cases] == ["c1", "c3"]
+    assert errors == ["_define: Settings must come before the cases", "c2: No run command"]
+    assert runner.points == 5
+
+
+def test_streamed_spec_should_raise_errors_if_not_collected():
+    runner, cases = stream_spec("- c1:\n    points: 1\n")
+    with raises(AssertionError) as e:
+        list(cases)
+    assert "c1: No run command" in str(e)
+
+
+def test_prefetch_should_stop_producing_when_consumer_stops():
+    items = prefetch(iter(range(1000)), size=2)
+    assert next(items) == 0
+    items.close()
+    assert not any(t.name == "calico-prefetch" for t in threading.enumerate())
+
+
+def test_case_script_with_expect_alternatives_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: ["Hello", "Hi"]
+    """
+    runner = parse_spec(source)
+    action = runner["c1"].script[0]
+    assert action.data == ("Hello", "Hi")
+    assert action.branches is None
+
+
+def test_case_script_with_expect_branches_should_be_ok():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect:
+                "Again? ":
+                  - send: "n"   # timeout: 2
+                  - expect: "Bye"
+                "Done":
+    """
+    runner = parse_spec(source)
+    action = runner["c1"].script[0]
+    assert action.data == ("Again? ", "Done")
+    assert [tuple(a) for a in action.branches[0]] == [("s", "n", 2), ("e", "Bye", -1)]
+    assert action.branches[1] == ()
+
+
+def test_case_script_with_alternatives_in_other_mode_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: ["Hello", "Hi"]
+              match: nocase
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Alternatives can only be matched literally" in str(e)
+
+
+def test_case_script_with_empty_alternative_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: ["Hello", ""]
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Alternatives must be nonempty strings" in str(e)
+
+
+def test_case_script_with_invalid_digest_should_raise_error():
+    source = """
+      - c1:
+          run: echo 1
+          script:
+            - expect: "sha256:1234:5"
+              match: digest
+    """
+    with raises(AssertionError) as e:
+        parse_spec(source)
+    assert "c1: Invalid digest" in str(e)
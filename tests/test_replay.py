@@ -0,0 +1,212 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from calico.base import Action, ActionType, replay_script, run_script
+from calico.parse import parse_spec
+from calico.replay import Recording
+
+COMMAND = """sh -c 'echo run >> runs.log; printf "Name? "; read n; echo "Hello, $n"'"""
+
+GREET = """echo run >> runs.log
+printf "Name? "
+read n
+echo "Hello, $n"
+"""
+
+SPEC = """
+  - case_1:
+      run: sh greet.sh
+      script:
+        - expect: "Name\\\\? "
+        - send: "%(n)s"
+        - expect: "%(e)s\\r\\n"
+      points: 1
+"""
+
+
+def record(script):
+    recording = Recording(COMMAND, [a.data for a in script if a.type_ == ActionType.SEND])
+    result = run_script(COMMAND, script, recording=recording)
+    return recording, result
+
+
+def test_recording_should_keep_input_and_output(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    script = [
+        Action(ActionType.EXPECT, "Name\\? "),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hello, Ann\r\n"),
+    ]
+    recording, result = record(script)
+    assert result == (0, None, [])
+    assert recording.complete
+    assert b"".join(d for t, o, d in recording.events if o) == b"Name? Hello, Ann\r\n"
+    assert [d for t, o, d in recording.events if not o] == [b"Ann\n"]
+
+
+def test_recording_should_continue_after_unexpected_output(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    script = [
+        Action(ActionType.EXPECT, "Surname? ", match="literal"),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hello, Ann\r\n"),
+    ]
+    recording, result = record(script)
+    assert result[2] == ["Output differs from expected at offset 0."]
+    assert recording.complete
+    assert recording.exitstatus == 0
+    assert b"".join(d for t, o, d in recording.events if o) == b"Name? Hello, Ann\r\n"
+
+
+def test_replay_should_check_changed_expectations(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    script = [
+        Action(ActionType.EXPECT, "Surname\\? "),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hello, Ann\r\n"),
+    ]
+    recording, _ = record(script)
+    script[0] = Action(ActionType.EXPECT, "Name\\? ")
+    assert replay_script(recording, script) == (0, None, [])
+    assert tmpdir.join("runs.log").read() == "run\n"
+
+
+def test_replay_should_report_failures_like_live_runs(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    script = [
+        Action(ActionType.EXPECT, "Name\\? "),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hello, Ann\r\n"),
+    ]
+    recording, _ = record(script)
+    script[2] = Action(ActionType.EXPECT, "Hello, Bob\r\n", match="literal")
+    assert replay_script(recording, script) == (
+        None,
+        None,
+        ["Output differs from expected at offset 7."],
+    )
+    script[2] = Action(ActionType.EXPECT, "Bye")
+    assert replay_script(recording, script)[2] == ["Expected output not received."]
+
+
+def test_replay_should_time_out_on_late_output():
+    recording = Recording("prog", ["Ann"])
+    recording.events = [(0.0, True, b"Name? "), (0.1, False, b"Ann\n"), (3.5, True, b"Hi\r\n")]
+    recording.exitstatus = 0
+    recording.complete = True
+    script = [
+        Action(ActionType.EXPECT, "Name\\? "),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hi", timeout=2),
+    ]
+    assert replay_script(recording, script)[2] == ["Timeout exceeded."]
+    script[2] = Action(ActionType.EXPECT, "Hi", timeout=5)
+    assert replay_script(recording, script) == (0, None, [])
+
+
+def test_replay_should_time_out_on_late_first_prompt():
+    recording = Recording("prog", ["Ann"])
+    recording.events = [(5.0, True, b"Name? "), (5.1, False, b"Ann\n"), (5.2, True, b"Hi\r\n")]
+    recording.exitstatus = 0
+    recording.complete = True
+    script = [
+        Action(ActionType.EXPECT, "Name\\? ", timeout=1),
+        Action(ActionType.SEND, "Ann"),
+        Action(ActionType.EXPECT, "Hi", timeout=1),
+    ]
+    assert replay_script(recording, script)[2] == ["Timeout exceeded."]
+    script[0] = Action(ActionType.EXPECT, "Name\\? ", timeout=6)
+    assert replay_script(recording, script) == (0, None, [])
+
+
+def test_recording_should_be_saved_and_loaded(tmpdir):
+    recording = Recording("prog", ["Ann"])
+    recording.events = [(0.0, True, b"\xff\x00"), (0.1, False, b"Ann\n")]
+    recording.exitstatus = 3
+    recording.complete = True
+    path = str(tmpdir.join("case.rec.gz"))
+    recording.save(path)
+    loaded = Recording.load(path)
+    assert loaded.events == recording.events
+    assert loaded.replayable("prog", ["Ann"])
+    assert not loaded.replayable("prog", ["Bob"])
+    assert loaded.exitstatus == 3
+
+
+def test_suite_should_run_only_cases_with_changed_input(tmpdir):
+    recordings = str(tmpdir.mkdir("recordings"))
+    work = tmpdir.mkdir("work")
+    work.join("greet.sh").write(GREET)
+    runs = work.join("runs.log")
+
+    runner = parse_spec(SPEC % {"n": "Ann", "e": "Hi, Ann"})
+    report = runner.run(quiet=True, cwd=str(work), recordings=recordings, replay=True)
+    assert report["points"] == 0
+    assert not report["case_1"]["replayed"]
+    assert runs.read() == "run\n"
+
+    runner = parse_spec(SPEC % {"n": "Ann", "e": "Hello, Ann"})
+    report = runner.run(quiet=True, cwd=str(work), recordings=recordings, replay=True)
+    assert report["points"] == 1
+    assert report["case_1"]["replayed"]
+    assert runs.read() == "run\n"
+
+    runner = parse_spec(SPEC % {"n": "Bob", "e": "Hello, Bob"})
+    report = runner.run(quiet=True, cwd=str(work), recordings=recordings, replay=True)
+    assert report["points"] == 1
+    assert not report["case_1"]["replayed"]
+    assert runs.read() == "run\nrun\n"
+
+
+BUILD_SPEC = """
+  - init:
+      run: rm -f greet.sh
+  - build:
+      run: cp greet.src greet.sh
+  - case_1:
+      run: sh greet.sh
+      script:
+        - expect: "Name\\\\? "
+        - send: "Ann"
+        - expect: "Hello, Ann\\r\\n"
+      points: 1
+  - case_2:
+      run: sh greet.sh
+      script:
+        - expect: "Name\\\\? "
+        - send: "%(n)s"
+        - expect: "Hello, %(n)s\\r\\n"
+      points: 1
+  - cleanup:
+      run: rm -f greet.sh
+"""
+
+
+def test_replay_should_run_stages_without_interaction(tmpdir):
+    recordings = str(tmpdir.mkdir("recordings"))
+    work = tmpdir.mkdir("work")
+    work.join("greet.src").write(GREET)
+    runs = work.join("runs.log")
+
+    runner = parse_spec(BUILD_SPEC % {"n": "Ann"})
+    report = runner.run(quiet=True, cwd=str(work), recordings=recordings, replay=True)
+    assert report["points"] == 2
+    assert runs.read() == "run\nrun\n"
+
+    runner = parse_spec(BUILD_SPEC % {"n": "Bob"})
+    report = runner.run(quiet=True, cwd=str(work), recordings=recordings, replay=True)
+    assert report["points"] == 2
+    assert not report["build"]["replayed"]
+    assert not work.join("greet.sh").exists()
+    assert report["case_1"]["replayed"]
+    assert not report["case_2"]["replayed"]
+    assert runs.read() == "run\nrun\nrun\n"
+
+
+def test_replay_should_follow_branch_of_matched_alternative():
+    recording = Recording("prog", ["y"])
+    recording.events = [(0.0, True, b"Again? "), (0.1, False, b"y\n"), (0.2, True, b"ok\r\n")]
+    recording.exitstatus = 0
+    recording.complete = True
+    branches = ((Action(ActionType.SEND, "y"), Action(ActionType.EXPECT, "ok")), ())
+    script = [Action(ActionType.EXPECT, ("Again? ", "Bye"), branches=branches)]
+    assert replay_script(recording, script) == (0, None, [])
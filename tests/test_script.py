@@ -1,6 +1,15 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from calico.base import Action, ActionType, run_script
+from pytest import mark, raises
+
+import hashlib
+import logging
+import os
+import subprocess
+import time
+
+from calico.base import Action, ActionType, has_exited, output_digest, run_script, wait_exit
+from calico.match import AlternativesMatcher, Mismatch, format_digest, parse_digest
 
 
 def test_script_expect_eof_should_be_ok():
@@ -53,6 +62,322 @@ def test_script_send_input_should_be_ok():
     assert result == (0, None, [])
 
 
+def test_send_without_substitutions_should_be_encoded_once():
+    assert Action(ActionType.SEND, "ç").payload == "ç\n".encode("utf-8")
+    assert Action(ActionType.SEND, "%(x)s").payload is None
+    assert Action(ActionType.SEND, "%(x)s").get_input({"x": "ç"}) == "ç\n".encode("utf-8")
+
+
+def test_script_with_encoding_should_send_encoded_input():
+    script = [
+        Action(ActionType.SEND, "ç", encoding="latin-1"),
+        Action(ActionType.EXPECT, "e7 0a"),
+    ]
+    result = run_script("sh -c 'head -c 2 | od -An -tx1'", script)
+    assert result == (0, None, [])
+
+
+def test_script_with_encoding_should_match_encoded_output():
+    script = [Action(ActionType.EXPECT, "ç", match="literal", encoding="latin-1")]
+    result = run_script("printf '\\347\\n'", script)
+    assert result == (0, None, [])
+
+
+def test_logging_undecodable_output_should_not_fail(caplog):
+    caplog.set_level(logging.DEBUG, logger="calico")
+    result = run_script("printf '\\377\\n'", [Action(ActionType.EXPECT, "x")])
+    assert result[2] == ["Expected output not received."]
+    assert '  received: "\ufffd\r\n"' in caplog.messages
+
+
+@mark.parametrize("waitid", [True, False])
+def test_exited_child_should_be_detected_without_reaping(monkeypatch, waitid):
+    if not waitid:  # like on Python 2
+        monkeypatch.delattr(os, "waitid")
+    process = subprocess.Popen(["sleep", "0.2"])
+    assert not has_exited(process.pid)
+    assert wait_exit(process.pid, 5)
+    assert has_exited(process.pid)
+    assert os.path.exists("/proc/%(p)d" % {"p": process.pid})
+    assert process.wait() == 0
+
+
 def test_timeout_should_kill_infinite_program():
     result = run_script("yes", [Action(ActionType.EXPECT, "_EOF_", timeout=1)])
     assert result == (None, 1, ["Timeout exceeded."])
+
+
+def test_script_expect_literal_output_should_be_ok():
+    result = run_script("echo 1.5", [Action(ActionType.EXPECT, "1.5\r\n", match="literal")])
+    assert result == (0, None, [])
+
+
+def test_script_expect_literal_should_not_interpret_special_characters():
+    result = run_script("echo 1.5", [Action(ActionType.EXPECT, "1\\.5", match="literal")])
+    assert result[2] == ["Output differs from expected at offset 1."]
+
+
+def test_script_expect_literal_with_different_output_should_report_offset():
+    result = run_script("echo 12345", [Action(ActionType.EXPECT, "12x45", match="literal")])
+    assert result[2] == ["Output differs from expected at offset 2."]
+
+
+def test_script_expect_literal_large_output_should_be_ok():
+    result = run_script(
+        "seq 100000",
+        [
+            Action(
+                ActionType.EXPECT,
+                "".join("%d\r\n" % i for i in range(1, 100001)),
+                match="literal",
+            )
+        ],
+    )
+    assert result == (0, None, [])
+
+
+def test_script_expect_whitespace_should_ignore_whitespace_differences():
+    result = run_script(
+        "printf '  Area:\\t3.14  \\n'",
+        [Action(ActionType.EXPECT, "Area: 3.14\n", match="whitespace")],
+    )
+    assert result == (0, None, [])
+
+
+def test_script_expect_whitespace_with_missing_space_should_report_offset():
+    result = run_script(
+        "echo Area:3.14", [Action(ActionType.EXPECT, "Area: 3.14", match="whitespace")]
+    )
+    assert result[2] == ["Output differs from expected at offset 5."]
+
+
+def test_script_expect_nocase_should_ignore_letter_case():
+    result = run_script("echo YES", [Action(ActionType.EXPECT, "yes", match="nocase")])
+    assert result == (0, None, [])
+
+
+def test_script_expect_tokens_should_be_ok():
+    result = run_script("echo '1  2\t3'", [Action(ActionType.EXPECT, "1 2 3", match="tokens")])
+    assert result == (0, None, [])
+
+
+def test_script_expect_tokens_with_longer_token_should_report_error():
+    result = run_script("echo 1 23", [Action(ActionType.EXPECT, "1 2", match="tokens")])
+    assert result[2] == ["Output differs from expected at offset 2."]
+
+
+def test_script_expect_numeric_should_ignore_formatting():
+    result = run_script(
+        "echo Area: 3.140000", [Action(ActionType.EXPECT, "Area: 3.14", match="numeric")]
+    )
+    assert result == (0, None, [])
+
+
+def test_script_expect_numeric_within_tolerance_should_be_ok():
+    result = run_script(
+        "echo 3.14159",
+        [Action(ActionType.EXPECT, "3.14", match="numeric", tolerance=(0.01, 0))],
+    )
+    assert result == (0, None, [])
+
+
+def test_script_expect_numeric_outside_tolerance_should_report_error():
+    result = run_script(
+        "echo 3.2", [Action(ActionType.EXPECT, "3.14", match="numeric", tolerance=(0.01, 0))]
+    )
+    assert result[2] == ["Output differs from expected at offset 0."]
+
+
+def test_script_expect_numeric_with_relative_tolerance_should_be_ok():
+    result = run_script(
+        "echo 1001", [Action(ActionType.EXPECT, "1000", match="numeric", tolerance=(0, 0.01))]
+    )
+    assert result == (0, None, [])
+
+
+def test_timeout_should_kill_program_ignoring_hangup():
+    result = run_script(
+        "bash -c 'trap \"\" HUP INT; sleep 5'", [Action(ActionType.EXPECT, "_EOF_", timeout=1)]
+    )
+    assert result == (None, 9, ["Timeout exceeded."])
+
+
+def test_sends_should_not_be_delayed():
+    script = []
+    for n in range(20):
+        script.append(Action(ActionType.SEND, str(n)))
+        script.append(Action(ActionType.EXPECT, str(n)))
+    start_time = time.time()
+    result = run_script("bash -c 'for i in $(seq 20); do read x; echo $x; done'", script)
+    assert result == (0, None, [])
+    assert time.time() - start_time < 0.5
+
+
+def test_leftover_background_process_should_be_killed_and_counted():
+    stats = {}
+    result = run_script(
+        "bash -c 'trap \"\" HUP; sleep 30 > /dev/null 2>&1 & echo 1'",
+        [Action(ActionType.EXPECT, "1")],
+        stats=stats,
+    )
+    assert result == (0, None, [])
+    assert stats["leaked"] == 1
+
+
+def test_timeout_should_kill_descendant_processes():
+    stats = {}
+    result = run_script(
+        "bash -c 'trap \"\" HUP; yes > /dev/null & yes > /dev/null & wait'",
+        [Action(ActionType.EXPECT, "_EOF_", timeout=1)],
+        stats=stats,
+    )
+    assert result[2] == ["Timeout exceeded."]
+    assert stats["leaked"] == 2
+
+
+def test_script_without_leftover_processes_should_count_none():
+    stats = {}
+    run_script("echo 1", [Action(ActionType.EXPECT, "1")], stats=stats)
+    assert stats["leaked"] == 0
+
+
+def test_cpu_timeout_should_kill_busy_program():
+    result = run_script(
+        "bash -c 'yes > /dev/null'",
+        [Action(ActionType.EXPECT, "_EOF_", timeout=1)],
+        cpu_time=True,
+    )
+    assert result == (None, 1, ["Timeout exceeded."])
+
+
+def test_cpu_timeout_should_kill_busy_program_that_writes_output():
+    start_time = time.time()
+    result = run_script("yes", [Action(ActionType.EXPECT, "_EOF_", timeout=1)], cpu_time=True)
+    assert result[2] == ["Timeout exceeded."]
+    assert time.time() - start_time < 5
+
+
+def test_timeout_should_kill_program_that_writes_output():
+    start_time = time.time()
+    result = run_script("yes", [Action(ActionType.EXPECT, "_EOF_", timeout=1)])
+    assert result[2] == ["Timeout exceeded."]
+    assert time.time() - start_time < 5
+
+
+def test_cpu_timeout_should_not_count_idle_time():
+    result = run_script(
+        "sleep 1.5", [Action(ActionType.EXPECT, "_EOF_", timeout=1)], cpu_time=True
+    )
+    assert result == (0, None, [])
+
+
+def test_pinned_program_should_run_on_given_cpus():
+    result = run_script(
+        "grep Cpus_allowed_list /proc/self/status",
+        [Action(ActionType.EXPECT, "Cpus_allowed_list:\\s+0\r\n")],
+        cpus={0},
+    )
+    assert result == (0, None, [])
+
+
+def test_sending_while_program_writes_should_not_block():
+    command = "head -c 1000000 /dev/zero | tr \"\\\\0\" x; head -n 20000 > /dev/null; echo done"
+    script = [Action(ActionType.SEND, "abcdefghij")] * 20000
+    script.append(Action(ActionType.EXPECT, "done", timeout=5))
+    result = run_script("bash -c '%(c)s'" % {"c": command}, script)
+    assert result == (0, None, [])
+
+
+def test_consecutive_sends_should_arrive_in_order():
+    result = run_script(
+        "bash -c 'read x; read y; echo $y$x'",
+        [
+            Action(ActionType.SEND, "1"),
+            Action(ActionType.SEND, "2"),
+            Action(ActionType.EXPECT, "21"),
+        ],
+    )
+    assert result == (0, None, [])
+
+
+def test_alternatives_should_match_earliest_ending_text():
+    matcher = AlternativesMatcher([b"she", b"he", b"hers"]).start()
+    assert matcher.feed(b"us") is None
+    assert matcher.feed(b"hers") == b"rs"
+    assert matcher.index == 0
+    assert matcher.received == b"she"
+
+
+def test_alternatives_should_prefer_longest_text_ending_at_same_position():
+    matcher = AlternativesMatcher([b"b", b"ab"]).start()
+    assert matcher.feed(b"xab!") == b"!"
+    assert matcher.index == 1
+
+
+def test_alternatives_should_match_across_chunks():
+    matcher = AlternativesMatcher([b"Enter radius: ", b"Radius? "]).start()
+    assert matcher.feed(b"Rad") is None
+    assert matcher.feed(b"ius") is None
+    assert matcher.feed(b"? 5") == b"5"
+    assert matcher.index == 1
+
+
+def test_script_expect_alternatives_should_be_ok():
+    result = run_script("echo Hi there", [Action(ActionType.EXPECT, ("Hello", "Hi"))])
+    assert result == (0, None, [])
+
+
+def test_script_expect_alternatives_should_fail_if_none_received():
+    result = run_script("echo Hey", [Action(ActionType.EXPECT, ("Hello", "Hi"))])
+    assert result[2] == ["Expected output not received."]
+
+
+def test_script_should_continue_with_branch_of_matched_alternative():
+    branches = (
+        (Action(ActionType.SEND, "y"), Action(ActionType.EXPECT, "got y")),
+        (Action(ActionType.EXPECT, "unreachable"),),
+    )
+    script = [
+        Action(ActionType.EXPECT, ("Again? ", "Bye"), branches=branches),
+        Action(ActionType.EXPECT, "done"),
+    ]
+    command = """sh -c 'printf "Again? "; read a; echo "got $a"; echo done'"""
+    assert run_script(command, script) == (0, None, [])
+
+
+def test_digest_matcher_should_hash_output_across_chunks():
+    digest = format_digest("sha256", hashlib.sha256(b"hello world").hexdigest(), 11)
+    matcher = Action(ActionType.EXPECT, digest, match="digest").get_matcher({})
+    assert matcher.feed(b"hello ") is None
+    assert matcher.feed(b"world!") == b"!"
+
+
+def test_digest_matcher_should_raise_mismatch_for_different_output():
+    digest = format_digest("sha256", hashlib.sha256(b"hello").hexdigest(), 5)
+    matcher = Action(ActionType.EXPECT, digest, match="digest").get_matcher({})
+    with raises(Mismatch) as e:
+        matcher.feed(b"world")
+    assert e.value.offset is None
+
+
+def test_invalid_digest_should_raise_error():
+    for data in ["sha256:abc:1", "nohash:00:1", "sha256:%s" % ("0" * 64)]:
+        with raises(ValueError):
+            parse_digest(data)
+
+
+def test_script_expect_digest_should_be_ok():
+    digest = output_digest("seq 100000")
+    result = run_script("seq 100000", [Action(ActionType.EXPECT, digest, match="digest")])
+    assert result == (0, None, [])
+
+
+def test_script_expect_digest_with_different_output_should_fail():
+    digest = output_digest("seq 100000")
+    result = run_script("seq 2 100001", [Action(ActionType.EXPECT, digest, match="digest")])
+    assert result[2] == ["Output differs from expected."]
+
+
+def test_digest_of_output_should_follow_input():
+    digest = output_digest("sh -c 'read n; seq $n'", data=b"3\n")
+    assert digest == format_digest("sha256", hashlib.sha256(b"1\r\n2\r\n3\r\n").hexdigest(), 9)
@@ -0,0 +1,81 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from calico.store import ResultStore, split_error
+
+
+def make_report(*results):
+    report = {}
+    for case, errors, points in results:
+        report[case] = {"errors": errors, "points": points, "duration": 0.1}
+    report["points"] = sum(p for _, _, p in results)
+    return report
+
+
+def test_pass_rates_should_be_calculated_per_case():
+    store = ResultStore()
+    store.add_report("s1", make_report(("c1", [], 10), ("c2", [], 20)))
+    store.add_report("s2", make_report(("c1", [], 10), ("c2", ["Timeout exceeded."], 0)))
+    assert store.pass_rates() == {"c1": 1.0, "c2": 0.5}
+
+
+def test_pass_rates_should_keep_case_order():
+    store = ResultStore()
+    store.add_report("s1", make_report(("c2", [], 10), ("c1", [], 20)))
+    assert list(store.pass_rates().keys()) == ["c2", "c1"]
+
+
+def test_readding_submission_should_replace_results():
+    store = ResultStore()
+    store.add_report("s1", make_report(("c1", ["Timeout exceeded."], 0)))
+    store.add_report("s1", make_report(("c1", [], 10)))
+    assert store.pass_rates() == {"c1": 1.0}
+
+
+def test_error_messages_should_be_interned():
+    store = ResultStore()
+    store.add_report("s1", make_report(("c1", ["Timeout exceeded."], 0)))
+    store.add_report("s2", make_report(("c1", ["Timeout exceeded."], 0)))
+    query = "SELECT COUNT(*) FROM errors"
+    assert store.connection.execute(query).fetchone()[0] == 1
+
+
+def test_error_details_should_be_kept_out_of_interned_kinds():
+    store = ResultStore()
+    store.add_report(
+        "s1", make_report(("c1", ["Output differs from expected at offset 3."], 0))
+    )
+    store.add_report(
+        "s2", make_report(("c1", ["Output differs from expected at offset 7."], 0))
+    )
+    query = "SELECT message FROM errors"
+    assert store.connection.execute(query).fetchall() == [("Output differs from expected.",)]
+    query = "SELECT detail FROM results ORDER BY submission"
+    assert store.connection.execute(query).fetchall() == [("at offset 3",), ("at offset 7",)]
+
+
+def test_error_messages_should_be_split_into_kind_and_details():
+    assert split_error("Timeout exceeded.") == ("Timeout exceeded.", None)
+    assert split_error("Output differs from reference for input a.txt.") == (
+        "Output differs from reference.",
+        "for input a.txt",
+    )
+    assert split_error("Input generator failed for seed 2.") == (
+        "Input generator failed.",
+        "for seed 2",
+    )
+
+
+def test_score_histogram_should_count_submissions_per_range():
+    store = ResultStore()
+    store.add_report("s1", make_report(("c1", [], 10), ("c2", [], 20)))
+    store.add_report("s2", make_report(("c1", [], 10), ("c2", ["Timeout exceeded."], 0)))
+    store.add_report("s3", make_report(("c1", [], 10), ("c2", ["Timeout exceeded."], 0)))
+    assert store.score_histogram(width=10) == [(10, 2), (30, 1)]
+
+
+def test_store_should_persist_to_file(tmpdir):
+    path = str(tmpdir.join("results.db"))
+    store = ResultStore(path)
+    store.add_report("s1", make_report(("c1", [], 10)))
+    store.close()
+    assert ResultStore(path).pass_rates() == {"c1": 1.0}
@@ -0,0 +1,313 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+from calico.base import cpu_slots, group_cases
+from calico.parse import parse_spec, stream_spec
+
+
+def test_consecutive_cases_should_be_grouped():
+    source = """
+      - build:
+          run: "true"
+      - case_1:
+          run: "true"
+      - case_2:
+          run: "true"
+          blocker: true
+      - case_3:
+          run: "true"
+    """
+    runner = parse_spec(source)
+    groups = [[t.name for t in g] for g in group_cases(runner.cases())]
+    assert groups == [["build"], ["case_1", "case_2"], ["case_3"]]
+
+
+def test_cpu_slots_should_match_job_count():
+    slots = cpu_slots(3)
+    assert len(slots) == 3
+
+
+def test_concurrent_cases_should_overlap():
+    source = """
+      - case_1:
+          run: sleep 1
+      - case_2:
+          run: sleep 1
+    """
+    runner = parse_spec(source)
+    start_time = time.time()
+    report = runner.run(quiet=True, jobs=2)
+    assert time.time() - start_time < 1.8
+    assert list(report.keys()) == ["case_1", "case_2", "points"]
+
+
+def test_concurrent_progress_should_be_printed_in_order(capsys):
+    source = """
+      - case_1:
+          run: sleep 0.5
+          points: 1
+      - case_2:
+          run: "true"
+          points: 2
+    """
+    runner = parse_spec(source)
+    runner.run(jobs=2)
+    out, err = capsys.readouterr()
+    assert [line.split()[0] for line in out.splitlines()] == ["case_1", "case_2"]
+
+
+def test_failed_blocker_should_stop_concurrent_run():
+    source = """
+      - case_1:
+          run: "false"
+          blocker: true
+      - case_2:
+          run: "true"
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, jobs=2)
+    assert "case_2" not in report
+
+
+def test_table_rows_should_run_as_separate_cases():
+    source = """
+      - case_double:
+          run: echo %(n)s
+          script:
+            - expect: "%(n)s\\r\\n"
+          points: 1
+          table:
+            - {n: 1}
+            - {n: 2}
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True)
+    assert list(report.keys()) == ["case_double_1", "case_double_2", "points"]
+    assert report["points"] == 2
+
+
+def test_table_row_command_should_keep_other_percent_signs():
+    source = """
+      - case_format:
+          run: printf '%d-%s-%(n)s\\n' 4 x
+          script:
+            - expect: "4-x-%(n)s\\r\\n"
+          points: 1
+          table:
+            - {n: 1}
+            - {n: 2}
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True)
+    assert report["points"] == 2
+
+
+def test_table_row_should_be_selectable_by_name():
+    source = """
+      - case_double:
+          run: echo %(n)s
+          table:
+            - {n: 1}
+            - {n: 2}
+    """
+    runner = parse_spec(source)
+    report = runner.run(tests=["case_double_2"], quiet=True)
+    assert list(report.keys()) == ["case_double_2", "points"]
+
+
+def test_suite_should_run_programs_in_given_directory(tmpdir):
+    tmpdir.join("data.txt").write("hello\n")
+    source = """
+      - case_1:
+          run: cat data.txt
+          script:
+            - expect: "hello\\r\\n"
+    """
+    runner = parse_spec(source)
+    current_dir = os.getcwd()
+    report = runner.run(quiet=True, cwd=str(tmpdir))
+    assert report["case_1"]["errors"] == []
+    assert os.getcwd() == current_dir
+
+
+def test_suite_should_run_programs_with_given_environment():
+    source = """
+      - case_1:
+          run: sh -c 'echo $GREETING $TERM'
+          script:
+            - expect: "hello dumb\\r\\n"
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, env={"PATH": os.environ["PATH"], "GREETING": "hello"})
+    assert report["case_1"]["errors"] == []
+    assert "GREETING" not in os.environ
+
+
+def test_suites_should_run_in_different_directories_concurrently(tmpdir):
+    source = """
+      - case_1:
+          run: cat data.txt
+          script:
+            - expect: "%(n)s\\r\\n"
+    """
+    directories = []
+    for n in range(4):
+        directory = tmpdir.mkdir("sub%d" % n)
+        directory.join("data.txt").write("%d\n" % n)
+        directories.append(str(directory))
+    runners = [parse_spec(source) for n in range(4)]
+    for n, runner in enumerate(runners):
+        runner.config.vars["n"] = str(n)
+    pool = ThreadPool(4)
+    reports = pool.map(lambda i: runners[i].run(quiet=True, cwd=directories[i]), range(4))
+    pool.close()
+    assert all(report["case_1"]["errors"] == [] for report in reports)
+
+
+def test_suite_should_stop_when_threshold_is_reached():
+    source = """
+      - case_1:
+          run: "true"
+          points: 5
+      - case_2:
+          run: "true"
+          points: 5
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, threshold=5)
+    assert list(report.keys()) == ["case_1", "points"]
+    assert report["points"] == 5
+
+
+def test_suite_should_stop_when_threshold_is_unreachable():
+    source = """
+      - case_1:
+          run: "false"
+          points: 5
+      - case_2:
+          run: "true"
+          points: 3
+      - case_3:
+          run: "true"
+          points: 2
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, threshold=6)
+    assert list(report.keys()) == ["case_1", "points"]
+    assert report["points"] == 0
+
+
+def test_suite_should_run_stages_without_points_after_threshold_is_decided(tmpdir):
+    source = """
+      - build:
+          run: touch built
+      - case_1:
+          run: "true"
+          points: 5
+      - case_2:
+          run: touch case_2
+          points: 5
+      - cleanup:
+          run: rm built
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, threshold=5, cwd=str(tmpdir))
+    assert list(report.keys()) == ["build", "case_1", "cleanup", "points"]
+    assert tmpdir.listdir() == []
+
+
+def test_suite_should_not_start_cases_after_threshold_is_decided(tmpdir):
+    source = """
+      - case_1:
+          run: "true"
+          points: 5
+      - case_2:
+          run: touch case_2
+          points: 5
+      - case_3:
+          run: touch case_3
+          points: 5
+      - case_4:
+          run: touch case_4
+          points: 5
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, jobs=2, threshold=5, cwd=str(tmpdir))
+    assert list(report.keys()) == ["case_1", "points"]
+    assert not tmpdir.join("case_3").exists()
+    assert not tmpdir.join("case_4").exists()
+
+
+def test_suite_should_run_all_cases_while_threshold_is_undecided():
+    source = """
+      - case_1:
+          run: "false"
+          points: 5
+      - case_2:
+          run: "true"
+          points: 5
+    """
+    runner = parse_spec(source)
+    report = runner.run(quiet=True, threshold=5)
+    assert list(report.keys()) == ["case_1", "case_2", "points"]
+    assert report["points"] == 5
+
+
+def test_suite_threshold_should_only_count_selected_tests():
+    source = """
+      - case_1:
+          run: "false"
+          points: 5
+      - case_2:
+          run: "true"
+          points: 5
+      - case_3:
+          run: "true"
+          points: 5
+    """
+    runner = parse_spec(source)
+    report = runner.run(tests=["case_1", "case_2"], quiet=True, threshold=6)
+    assert list(report.keys()) == ["case_1", "points"]
+
+
+def test_suite_should_run_streamed_cases():
+    source = """
+      - _define:
+          vars:
+            greeting: hello
+      - case_1:
+          run: echo hello
+          points: 2
+          script:
+            - expect: "%(greeting)s"
+      - case_2:
+          run: "false"
+          exit: 0
+          points: 3
+    """
+    runner, cases = stream_spec(source)
+    report = runner.run(quiet=True, cases=cases)
+    assert list(report.keys()) == ["case_1", "case_2", "points"]
+    assert report["points"] == 2
+    assert runner.points == 5
+
+
+def test_suite_should_stop_streamed_cases_when_threshold_is_reached():
+    source = """
+      - case_1:
+          run: "true"
+          points: 5
+      - case_2:
+          run: "false"
+          exit: 0
+          points: 5
+      - case_3:
+          run: "true"
+          points: 5
+    """
+    runner, cases = stream_spec(source)
+    report = runner.run(quiet=True, threshold=5, cases=cases)
+    assert list(report.keys()) == ["case_1", "points"]
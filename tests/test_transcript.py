@@ -0,0 +1,102 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import raises
+
+import gzip
+import logging
+import threading
+
+from calico import base
+from calico.parse import parse_spec
+from calico.transcript import TranscriptLogger, capturing, start_transcript, stop_transcript
+
+
+SPEC = """
+  - case_pass:
+      run: echo 1
+      script:
+        - expect: "1"
+  - case_fail:
+      run: echo 2
+      script:
+        - expect: "1"
+"""
+
+
+def test_transcript_should_drop_oldest_records():
+    logger = TranscriptLogger(logging.getLogger("calico"))
+    transcript = start_transcript(limit=2)
+    for i in range(3):
+        logger.debug("message %d", i)
+    stop_transcript()
+    logger.debug("message 3")
+    assert [r.getMessage() for r in transcript.records] == ["message 1", "message 2"]
+
+
+def test_transcript_should_keep_records_once_at_any_logger_level():
+    logger = logging.getLogger("calico")
+    level = logger.level
+    for logger_level in (logging.DEBUG, logging.WARNING):
+        logger.setLevel(logger_level)
+        transcript = start_transcript()
+        TranscriptLogger(logger).debug("message")
+        stop_transcript()
+        assert [r.getMessage() for r in transcript.records] == ["message"]
+    logger.setLevel(level)
+
+
+def test_transcript_of_failed_case_should_be_written(tmpdir):
+    runner = parse_spec(SPEC)
+    report = runner.run(quiet=True, transcripts=str(tmpdir))
+    assert report["case_fail"]["transcript"] == str(tmpdir.join("case_fail.log.gz"))
+    with gzip.open(report["case_fail"]["transcript"], "rb") as f:
+        content = f.read().decode("utf-8")
+    assert "running command: echo 2" in content
+    assert "FAILED: Expected output not received." in content
+
+
+def test_transcript_of_passed_case_should_not_be_written(tmpdir):
+    runner = parse_spec(SPEC)
+    report = runner.run(quiet=True, transcripts=str(tmpdir))
+    assert "transcript" not in report["case_pass"]
+    assert not tmpdir.join("case_pass.log.gz").exists()
+
+
+def test_transcripts_of_concurrent_cases_should_be_separate(tmpdir):
+    runner = parse_spec(SPEC)
+    report = runner.run(quiet=True, jobs=2, transcripts=str(tmpdir))
+    with gzip.open(report["case_fail"]["transcript"], "rb") as f:
+        content = f.read().decode("utf-8")
+    assert "echo 1" not in content
+
+
+def test_concurrent_runs_should_not_duplicate_records_or_change_logger_level(tmpdir):
+    logger = logging.getLogger("calico")
+    level, handlers = logger.level, list(logger.handlers)
+    reports = {}
+
+    def run(name):
+        directory = str(tmpdir.mkdir(name))
+        reports[name] = parse_spec(SPEC).run(quiet=True, transcripts=directory)
+
+    threads = [threading.Thread(target=run, args=("run%d" % i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for report in reports.values():
+        with gzip.open(report["case_fail"]["transcript"], "rb") as f:
+            content = f.read().decode("utf-8")
+        assert content.count("expecting") == 1
+    assert (logger.level, logger.handlers) == (level, handlers)
+
+
+def test_transcript_should_stop_when_script_raises_error(tmpdir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(base, "run_script", fail)
+    case = parse_spec(SPEC)["case_pass"]
+    with raises(RuntimeError):
+        case.run(transcripts=str(tmpdir))
+    assert not capturing()
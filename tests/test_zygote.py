@@ -0,0 +1,116 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pytest import fixture, mark
+
+import sys
+
+from calico import SUPPORTS_ZYGOTE
+from calico.base import Action, ActionType, run_script
+from calico.parse import parse_spec
+from calico.zygote import Zygote
+
+pytestmark = mark.skipif(not SUPPORTS_ZYGOTE, reason="warm interpreters not supported")
+
+PROGRAM = """
+import sys
+name = input("Name? ")
+print("Hello, %s %s" % (name, " ".join(sys.argv[1:])))
+sys.exit(int(sys.argv[1]))
+"""
+
+
+@fixture
+def zygote(tmpdir, monkeypatch):
+    tmpdir.join("hello.py").write(PROGRAM)
+    monkeypatch.chdir(tmpdir)
+    zygote = Zygote(sys.executable)
+    zygote.start()
+    yield zygote
+    zygote.stop()
+
+
+def test_zygote_should_handle_script_commands(zygote):
+    assert zygote.handles(sys.executable + " hello.py 0")
+
+
+def test_zygote_should_not_handle_interpreter_options(zygote):
+    assert not zygote.handles(sys.executable + " -c 'print(1)'")
+
+
+def test_zygote_should_not_handle_other_commands(zygote):
+    assert not zygote.handles("echo 1")
+
+
+def test_zygote_program_should_interact_through_terminal(zygote):
+    result = run_script(
+        sys.executable + " hello.py 0 x",
+        [
+            Action(ActionType.EXPECT, "Name\\? "),
+            Action(ActionType.SEND, "Ann"),
+            Action(ActionType.EXPECT, "Hello, Ann 0 x\r\n"),
+        ],
+        zygote=zygote,
+    )
+    assert result == (0, None, [])
+
+
+def test_zygote_program_should_report_exit_status(zygote):
+    result = run_script(
+        sys.executable + " hello.py 3", [Action(ActionType.SEND, "Ann")], zygote=zygote
+    )
+    assert result == (3, None, [])
+
+
+def test_zygote_program_with_error_should_print_traceback(zygote):
+    result = run_script(
+        sys.executable + " hello.py x",
+        [Action(ActionType.SEND, "Ann"), Action(ActionType.EXPECT, "ValueError")],
+        zygote=zygote,
+    )
+    assert result == (1, None, [])
+
+
+def test_zygote_program_should_be_killed_on_timeout(zygote):
+    result = run_script(
+        sys.executable + " hello.py 0",
+        [Action(ActionType.EXPECT, "_EOF_", timeout=1)],
+        zygote=zygote,
+    )
+    assert result == (None, 1, ["Timeout exceeded."])
+
+
+def test_suite_with_zygote_should_run_cases(tmpdir, monkeypatch):
+    tmpdir.join("hello.py").write(PROGRAM)
+    monkeypatch.chdir(tmpdir)
+    source = """
+      - _define:
+          zygote: %(p)s
+          preload: [json]
+      - case_1:
+          run: %(p)s hello.py 0
+          script:
+            - send: "Ann"
+            - expect: "Hello, Ann 0"
+      - case_2:
+          run: %(p)s hello.py 1
+          script:
+            - send: "Ann"
+          exit: 1
+    """ % {"p": sys.executable}
+    runner = parse_spec(source)
+    report = runner.run(quiet=True)
+    assert report["case_1"]["errors"] == []
+    assert report["case_2"]["errors"] == []
+
+
+def test_zygote_program_should_run_in_given_directory(zygote, tmpdir):
+    other = tmpdir.mkdir("other")
+    other.join("hello.py").write("import os\nprint(os.environ['GREETING'])\n")
+    result = run_script(
+        sys.executable + " hello.py",
+        [Action(ActionType.EXPECT, "hi\r\n")],
+        zygote=zygote,
+        cwd=str(other),
+        env={"GREETING": "hi"},
+    )
+    assert result == (0, None, [])